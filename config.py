@@ -68,3 +68,33 @@ MAX_RECONNECT_ATTEMPTS = 10
 # Web server settings
 WEB_HOST = "0.0.0.0"
 WEB_PORT = 8000
+
+# ML prediction scheduler
+ML_PREDICTION_INTERVAL = 0.5  # Seconds between batched predictions for all active pairs
+ML_ACTIVE_PAIR_MAX_AGE = 10.0  # Pairs without a quote for this long are skipped
+ML_INTRA_OP_THREADS = 4  # ONNX Runtime threads within an operator
+ML_INTER_OP_THREADS = 1  # ONNX Runtime threads across operators
+
+# ML inference service (runs off the event loop)
+ML_INFERENCE_WORKERS = 1  # Worker threads for feature extraction and scoring
+ML_INFERENCE_QUEUE_SIZE = 256  # Queued requests before new ones are shed
+ML_LATENCY_BUDGET_MS = 20.0  # Per-request budget before the rule-based fallback answers
+
+# In-memory tick storage
+TICK_RETENTION_HOURS = 1  # Ticks older than this are evicted by compaction
+TICK_MEMORY_BUDGET_MB = 256  # Stored tick bytes across all keys, shared fairly
+TICK_COMPACTION_SECONDS = 10.0  # Seconds between compaction passes
+TICK_COMPRESS_BLOCK_TICKS = 4096  # Oldest ticks sealed into a compressed block when a key's buffer fills (0: off)
+
+# Persistent tick archive, written alongside the in-memory storage: TimescaleDB
+# when reachable, otherwise append-only segment files that survive restarts
+TICK_ARCHIVE_ENABLED = True
+TICK_SEGMENT_DIR = "data/ticks"  # Segment store directory (None: in-memory fallback instead)
+
+# Feed staleness sweep (anomaly detector)
+ANOMALY_SWEEP_SECONDS = 1.0  # Seconds between sweeps for feeds with no recent quote
+
+# ML model hot reload: newest *.onnx in the directory is served, <dir>/shadow/ holds a candidate
+ML_MODEL_DIR = "models"
+ML_MODEL_POLL_SECONDS = 5.0  # Seconds between model directory scans
+ML_SHADOW_FRACTION = 0.1  # Share of predictions also scored by the shadow candidate
@@ -5,7 +5,7 @@ import logging
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -43,6 +43,7 @@ class DashboardManager:
         self.statistical_engine = None
         self.ml_engine = None
         self.tick_storage = None
+        self.tick_archive = None
         # New arbitrage engines
         self.cross_triangular_engine = None
         self.futures_spot_engine = None
@@ -60,12 +61,13 @@ class DashboardManager:
         self.triangular_engine = engine
         engine.on_opportunity(self._on_triangular_opportunity)
     
-    def set_advanced_engines(self, orderbook=None, statistical=None, ml=None, storage=None):
+    def set_advanced_engines(self, orderbook=None, statistical=None, ml=None, storage=None, archive=None):
         """Set advanced engines"""
         self.orderbook_engine = orderbook
         self.statistical_engine = statistical
         self.ml_engine = ml
         self.tick_storage = storage
+        self.tick_archive = archive
         
         # Register callbacks for advanced engines
         if statistical:
@@ -210,7 +212,7 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "version": "1.0.0",
         "engine_ready": manager.engine is not None,
-        "exchanges_connected": len(manager.engine.prices) if manager.engine else 0,
+        "exchanges_connected": len(manager.engine.quotes) if manager.engine else 0,
     }
 
 
@@ -285,6 +287,9 @@ async def get_state():
     if manager.tick_storage:
         state["storage"] = manager.tick_storage.get_state()
     
+    if manager.tick_archive is not None:
+        state["tick_archive"] = manager.tick_archive.get_state()
+    
     # Add new arbitrage engine data
     if manager.cross_triangular_engine:
         state["cross_triangular"] = manager.cross_triangular_engine.get_state()
@@ -326,6 +331,18 @@ async def get_storage_stats():
     return manager.tick_storage.get_statistics()
 
 
+@app.get("/api/storage/candles/{exchange}/{pair}")
+async def get_storage_candles(exchange: str, pair: str, interval: int = 60, limit: int = 200):
+    """Get OHLCV candles (any interval in seconds) built from stored ticks"""
+    if not manager.tick_storage:
+        return {"error": "Storage not initialized"}
+    if interval <= 0:
+        raise HTTPException(status_code=400, detail="interval must be a positive number of seconds")
+    pair = pair.replace("-", "/")
+    candles = manager.tick_storage.get_candles(exchange, pair, interval_seconds=interval, limit=limit)
+    return [c.to_dict() for c in candles]
+
+
 @app.get("/api/cross-triangular")
 async def get_cross_triangular():
     """Get cross-exchange triangular arbitrage opportunities"""
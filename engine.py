@@ -7,6 +7,7 @@ from collections import defaultdict
 
 from exchanges.base import PriceUpdate
 from config import MIN_PROFIT_THRESHOLD, TRADING_PAIRS
+from engine_symbols import symbols
 
 logger = logging.getLogger(__name__)
 
@@ -69,8 +70,8 @@ class ArbitrageEngine:
     
     def __init__(self, min_profit_threshold: float = MIN_PROFIT_THRESHOLD):
         self.min_profit_threshold = min_profit_threshold
-        # prices[pair][exchange] = ExchangePrice
-        self.prices: dict[str, dict[str, ExchangePrice]] = defaultdict(dict)
+        # quotes[pair_id][exchange_id] = ExchangePrice (ids from engine_symbols)
+        self.quotes: dict[int, dict[int, ExchangePrice]] = defaultdict(dict)
         # Current opportunities
         self.opportunities: list[ArbitrageOpportunity] = []
         # Historical opportunities (last 100)
@@ -87,10 +88,18 @@ class ArbitrageEngine:
         """Register callback for price updates"""
         self._on_price_update_callbacks.append(callback)
     
+    @property
+    def prices(self) -> dict[str, dict[str, ExchangePrice]]:
+        """Latest prices as prices[pair][exchange], by name"""
+        return {
+            symbols.pairs[pair_id]: {symbols.exchanges[exchange_id]: price for exchange_id, price in exchanges.items()}
+            for pair_id, exchanges in self.quotes.items()
+        }
+    
     def process_price_update(self, update: PriceUpdate):
         """Process incoming price update and check for arbitrage"""
         # Store the new price
-        self.prices[update.pair][update.exchange] = ExchangePrice(
+        self.quotes[update.pair_id][update.exchange_id] = ExchangePrice(
             exchange=update.exchange,
             pair=update.pair,
             bid=update.bid,
@@ -106,25 +115,23 @@ class ArbitrageEngine:
                 logger.error(f"Price callback error: {e}")
         
         # Check for arbitrage on this pair
-        self._check_arbitrage(update.pair)
+        self._check_arbitrage(update.pair_id)
     
-    def _check_arbitrage(self, pair: str):
+    def _check_arbitrage(self, pair_id: int):
         """Check for arbitrage opportunities across all exchanges for a pair"""
-        if pair not in self.prices:
+        if pair_id not in self.quotes:
             return
         
-        exchanges = list(self.prices[pair].keys())
-        if len(exchanges) < 2:
+        prices = list(self.quotes[pair_id].values())
+        if len(prices) < 2:
             return
         
+        pair = symbols.pairs[pair_id]
         new_opportunities = []
         
         # Compare all exchange pairs
-        for i, ex1 in enumerate(exchanges):
-            for ex2 in exchanges[i+1:]:
-                price1 = self.prices[pair][ex1]
-                price2 = self.prices[pair][ex2]
-                
+        for i, price1 in enumerate(prices):
+            for price2 in prices[i+1:]:
                 # Check ex1 buy -> ex2 sell
                 opp1 = self._calculate_opportunity(pair, price1, price2)
                 if opp1:
@@ -22,6 +22,8 @@ from typing import Optional, List, Dict, Tuple, Set
 from collections import defaultdict
 import itertools
 
+from engine_symbols import symbols
+
 logger = logging.getLogger(__name__)
 
 
@@ -129,6 +131,10 @@ class CrossExchangeTriangularEngine:
         
         # Pre-computed paths (generated dynamically)
         self.cross_exchange_paths: List[CrossExchangePath] = []
+        self._paths_current = False
+        
+        # pair -> interned pair id (engine_symbols), for precomputed base/quote
+        self.pair_ids: Dict[str, int] = {}
         
         # Callbacks
         self._on_opportunity_callbacks: List = []
@@ -137,13 +143,31 @@ class CrossExchangeTriangularEngine:
         """Register callback for new opportunities"""
         self._on_opportunity_callbacks.append(callback)
     
-    def update_price(self, exchange: str, pair: str, bid: float, ask: float):
-        """Update price and check for cross-exchange triangular opportunities"""
-        self.prices[exchange][pair] = (bid, ask, datetime.now())
+    def update_price(
+        self,
+        exchange: str,
+        pair: str,
+        bid: float,
+        ask: float,
+        pair_id: Optional[int] = None
+    ):
+        """
+        Update price and check for cross-exchange triangular opportunities.
+        
+        Pass the PriceUpdate's interned pair id to skip resolving the name.
+        """
+        quotes = self.prices[exchange]
+        new_pair = pair not in quotes
+        quotes[pair] = (bid, ask, datetime.now())
+        if new_pair:
+            # Base/quote ids are looked up once per (exchange, pair), never split per tick
+            self.pair_ids[pair] = pair_id if pair_id is not None else symbols.pair_id(pair)
         
-        # Recompute paths if we have enough exchanges
+        # Paths depend only on which pairs each exchange lists; recompute when one is added
         if len(self.prices) >= 2:
-            self._compute_cross_exchange_paths()
+            if new_pair or not self._paths_current:
+                self._compute_cross_exchange_paths()
+                self._paths_current = True
             self._check_opportunities()
     
     def _compute_cross_exchange_paths(self):
@@ -166,9 +190,10 @@ class CrossExchangeTriangularEngine:
         
         for exchange, pairs in self.prices.items():
             for pair in pairs.keys():
-                if '/' not in pair:
+                currencies = symbols.split(self.pair_ids[pair])
+                if currencies is None:
                     continue
-                base, quote = pair.split('/')
+                base, quote = currencies
                 all_currencies.add(base)
                 all_currencies.add(quote)
                 
@@ -196,7 +221,7 @@ class CrossExchangeTriangularEngine:
             for start_exchange in self.prices.keys():
                 # Check if this exchange has any pair with the starting currency
                 has_start_currency = any(
-                    start_currency in pair.split('/')
+                    start_currency in (symbols.split(self.pair_ids[pair]) or ())
                     for pair in self.prices[start_exchange].keys()
                 )
                 if not has_start_currency:
@@ -0,0 +1,443 @@
+"""
+Offline Training Dataset Builder
+
+Turns recorded ticks into labelled feature matrices for the ONNX model:
+- Sources: TickStorage exports (engine_export directories, or legacy
+  JSON files) or TimescaleDB (`query_ticks`, paged forward by time window)
+- Ticks are replayed through AdvancedFeatureExtractor, so training rows
+  are computed by exactly the code that serves predictions live
+- Each pair is sampled at a fixed cadence. A row is labelled 1 when a
+  cross-exchange opportunity (best bid above best ask by at least
+  MIN_PROFIT_THRESHOLD percent) appears for the pair within
+  `time_horizon_ms` after it
+- Rows are written in fixed-size chunks (.npz, or Parquet when pyarrow
+  is installed) and labelled with vectorized searches once the stream
+  has moved past their horizon, so memory stays bounded however long
+  the time range is
+
+Usage:
+    python engine_dataset.py --export exports/2024-01-* --out datasets/jan
+    python engine_dataset.py --timescale --start 2024-01-01 --end 2024-02-01 --out datasets/jan
+"""
+
+import argparse
+import glob
+import gzip
+import heapq
+import json
+import logging
+import os
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import MIN_PROFIT_THRESHOLD
+from engine_export import iter_key, read_manifest
+from engine_ml_advanced import AdvancedFeatureExtractor, FEATURE_COUNT
+from engine_leadlag import LeadLagAnalyzer
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# (epoch seconds, exchange, pair, bid, ask, bid_size, ask_size)
+RawTick = Tuple[float, str, str, float, float, float, float]
+
+
+def _row_tick(row: dict) -> RawTick:
+    """Normalize an exported or queried tick row"""
+    timestamp = row.get("time") or row.get("timestamp")
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    return (
+        timestamp.timestamp(),
+        row["exchange"],
+        row["pair"],
+        float(row["bid"]),
+        float(row["ask"]),
+        float(row.get("bid_size") or 1.0),
+        float(row.get("ask_size") or 1.0),
+    )
+
+
+def _export_series(directory: str, entry: dict) -> Iterator[RawTick]:
+    """One key of an export directory, streamed chunk by chunk"""
+    exchange, pair = entry["exchange"], entry["pair"]
+    for chunk in iter_key(directory, entry):
+        columns = zip(
+            (chunk["time_ns"] / 1e9).tolist(),
+            chunk["bid"].tolist(),
+            chunk["ask"].tolist(),
+            chunk["bid_size"].tolist(),
+            chunk["ask_size"].tolist(),
+        )
+        for epoch, bid, ask, bid_size, ask_size in columns:
+            yield epoch, exchange, pair, bid, ask, bid_size or 1.0, ask_size or 1.0
+
+
+def iter_export_ticks(paths: Iterable[str]) -> Iterator[RawTick]:
+    """
+    Ticks from TickStorage exports, oldest first.
+    
+    Each path is an export directory (engine_export) or a legacy JSON
+    export file. Exports are read one at a time and must be given in
+    chronological order; directories are streamed chunk by chunk.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            series = [_export_series(path, entry) for entry in read_manifest(path)["keys"]]
+        else:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            series = [(_row_tick(row) for row in rows) for rows in data.get("ticks", {}).values()]
+        
+        # Each series is already in time order; merge them
+        yield from heapq.merge(*series, key=lambda tick: tick[0])
+        logger.info(f"Replayed {path}")
+
+
+def iter_timescale_ticks(
+    storage,
+    start: datetime,
+    end: datetime,
+    pair: Optional[str] = None,
+    exchange: Optional[str] = None,
+    window: timedelta = timedelta(hours=1),
+    page_limit: int = 200000
+) -> Iterator[RawTick]:
+    """
+    Ticks in [start, end) from a TimescaleDBStorage, oldest first.
+    
+    Pages forward one time window at a time. A window that fills the
+    page limit is halved and re-queried, so no ticks are dropped; after
+    a page under half the limit it doubles again, up to `window`.
+    """
+    max_window = window
+    cursor = start
+    while cursor < end:
+        window_end = min(cursor + window, end)
+        rows = storage.query_ticks(
+            exchange=exchange,
+            pair=pair,
+            start=cursor,
+            end=window_end - timedelta(microseconds=1),
+            limit=page_limit,
+            ascending=True
+        )
+        
+        if len(rows) >= page_limit:
+            if window > timedelta(seconds=1):
+                window /= 2
+                continue
+            logger.warning(f"⚠️ More than {page_limit} ticks in one second at {cursor}, truncating")
+        
+        for row in rows:
+            yield _row_tick(row)
+        cursor = window_end
+        
+        # A burst shouldn't leave the rest of the export on tiny windows
+        if len(rows) < page_limit // 2 and window < max_window:
+            window = min(window * 2, max_window)
+
+
+class DatasetBuilder:
+    """
+    Replays ticks into labelled feature chunks.
+    
+    Output directory layout:
+        part-00000.npz ...   features (rows, FEATURE_COUNT) float32,
+                             labels uint8, times float64, pairs int32
+        manifest.json        parameters, pair names, row counts
+    """
+    
+    def __init__(
+        self,
+        out_dir: str,
+        time_horizon_ms: int = 500,
+        sample_ms: int = 100,
+        chunk_rows: int = 100000,
+        min_profit_percent: float = MIN_PROFIT_THRESHOLD,
+        max_quote_age_seconds: float = 10.0,
+        pairs: Optional[List[str]] = None,
+        fmt: str = "npz"
+    ):
+        """
+        Args:
+            out_dir: Directory for chunk files and the manifest
+            time_horizon_ms: Label window after each row
+            sample_ms: Minimum spacing between rows of one pair
+            chunk_rows: Rows per output file
+            min_profit_percent: Cross-exchange edge that counts as an opportunity
+            max_quote_age_seconds: Quotes older than this don't form opportunities
+            pairs: Only these pairs (all if None)
+            fmt: "npz" or "parquet"
+        """
+        if fmt == "parquet" and not HAS_PYARROW:
+            logger.warning("pyarrow not available, writing .npz chunks")
+            fmt = "npz"
+        
+        self.out_dir = out_dir
+        self.horizon = time_horizon_ms / 1000
+        self.sample_interval = sample_ms / 1000
+        self.chunk_rows = chunk_rows
+        self.min_profit_percent = min_profit_percent
+        self.max_quote_age = max_quote_age_seconds
+        self.pairs = set(pairs) if pairs else None
+        self.format = fmt
+        self.params = {
+            "time_horizon_ms": time_horizon_ms,
+            "sample_ms": sample_ms,
+            "min_profit_percent": min_profit_percent,
+            "feature_count": FEATURE_COUNT,
+            "format": fmt,
+        }
+        
+        # Lead-lag runs inline on stream time so replays are reproducible
+        self.extractor = AdvancedFeatureExtractor(lead_lag=LeadLagAnalyzer(background=False))
+        
+        # Latest quote per pair and exchange: (bid, ask, epoch)
+        self.quotes: Dict[str, Dict[str, Tuple[float, float, float]]] = defaultdict(dict)
+        self.next_sample: Dict[str, float] = {}
+        self.opportunities: Dict[str, deque] = defaultdict(deque)
+        self.pair_codes: Dict[str, int] = {}
+        
+        # Rows waiting for their label horizon to pass
+        capacity = chunk_rows + max(1, chunk_rows // 4)
+        self._features = np.zeros((capacity, FEATURE_COUNT), dtype=np.float32)
+        self._times = np.zeros(capacity)
+        self._codes = np.zeros(capacity, dtype=np.int32)
+        self._size = 0
+        
+        # Stats
+        self.ticks_seen = 0
+        self.rows_written = 0
+        self.positives = 0
+        self.chunks_written = 0
+        
+        os.makedirs(out_dir, exist_ok=True)
+    
+    def build(self, ticks: Iterable[RawTick]) -> dict:
+        """Consume a tick stream and write the dataset; returns the manifest"""
+        for tick in ticks:
+            self.add_tick(*tick)
+        return self.finish()
+    
+    def add_tick(
+        self,
+        epoch: float,
+        exchange: str,
+        pair: str,
+        bid: float,
+        ask: float,
+        bid_size: float = 1.0,
+        ask_size: float = 1.0
+    ):
+        self.ticks_seen += 1
+        if self.pairs is not None and pair not in self.pairs:
+            return
+        
+        timestamp = datetime.fromtimestamp(epoch)
+        self.extractor.update(exchange, pair, bid, ask, timestamp, bid_size, ask_size)
+        
+        if self._is_opportunity(pair, exchange, bid, ask, epoch):
+            self.opportunities[pair].append(epoch)
+        
+        due = self.next_sample.get(pair)
+        if due is None or epoch >= due:
+            self.next_sample[pair] = epoch + self.sample_interval
+            self._add_row(pair, epoch, timestamp)
+        
+        if self._size >= self.chunk_rows:
+            self._flush(epoch)
+    
+    def _is_opportunity(self, pair: str, exchange: str, bid: float, ask: float, epoch: float) -> bool:
+        """Same rule as ArbitrageEngine: buy at the best ask, sell at the best bid"""
+        quotes = self.quotes[pair]
+        quotes[exchange] = (bid, ask, epoch)
+        if len(quotes) < 2:
+            return False
+        
+        cutoff = epoch - self.max_quote_age
+        live = [q for q in quotes.values() if q[2] >= cutoff]
+        if len(live) < 2:
+            return False
+        
+        best_bid = max(q[0] for q in live)
+        best_ask = min(q[1] for q in live)
+        return best_ask > 0 and (best_bid - best_ask) / best_ask * 100 >= self.min_profit_percent
+    
+    def _add_row(self, pair: str, epoch: float, timestamp: datetime):
+        if self._size == len(self._times):
+            self._grow()
+        
+        code = self.pair_codes.setdefault(pair, len(self.pair_codes))
+        row = self._size
+        self._features[row] = self.extractor.extract(pair, now=timestamp).to_vector()
+        self._times[row] = epoch
+        self._codes[row] = code
+        self._size += 1
+    
+    def _grow(self):
+        """Only when a whole buffer is still inside the label horizon"""
+        capacity = 2 * len(self._times)
+        self._features = np.resize(self._features, (capacity, FEATURE_COUNT))
+        self._times = np.resize(self._times, capacity)
+        self._codes = np.resize(self._codes, capacity)
+    
+    def _flush(self, stream_time: Optional[float] = None):
+        """Label and write every row whose horizon has passed (all rows at the end)"""
+        size = self._size
+        if stream_time is None:
+            ready = size
+        else:
+            ready = int(np.searchsorted(self._times[:size], stream_time - self.horizon, side="right"))
+        if ready == 0:
+            return
+        
+        labels = self._label(ready)
+        self._write_chunk(self._features[:ready], labels, self._times[:ready], self._codes[:ready])
+        
+        # Keep the unlabelled tail at the front of the buffers
+        remaining = size - ready
+        self._features[:remaining] = self._features[ready:size]
+        self._times[:remaining] = self._times[ready:size]
+        self._codes[:remaining] = self._codes[ready:size]
+        self._size = remaining
+        
+        # Opportunities before the oldest pending row can't label anything
+        oldest = self._times[0] if remaining else stream_time or 0.0
+        for times in self.opportunities.values():
+            while times and times[0] <= oldest:
+                times.popleft()
+    
+    def _label(self, n: int) -> np.ndarray:
+        """1 where the row's pair has an opportunity in (t, t + horizon]"""
+        times = self._times[:n]
+        codes = self._codes[:n]
+        labels = np.zeros(n, dtype=np.uint8)
+        
+        for pair, code in self.pair_codes.items():
+            opportunities = self.opportunities.get(pair)
+            if not opportunities:
+                continue
+            mask = codes == code
+            if not mask.any():
+                continue
+            
+            opportunity_times = np.fromiter(opportunities, dtype=np.float64, count=len(opportunities))
+            row_times = times[mask]
+            nxt = np.searchsorted(opportunity_times, row_times, side="right")
+            found = nxt < len(opportunity_times)
+            hit = np.zeros(len(row_times), dtype=bool)
+            hit[found] = opportunity_times[nxt[found]] <= row_times[found] + self.horizon
+            labels[mask] = hit
+        
+        return labels
+    
+    def _write_chunk(self, features: np.ndarray, labels: np.ndarray, times: np.ndarray, codes: np.ndarray):
+        name = f"part-{self.chunks_written:05d}"
+        
+        if self.format == "parquet":
+            names = np.array(list(self.pair_codes), dtype=object)
+            columns = {f"f{i}": features[:, i] for i in range(FEATURE_COUNT)}
+            columns.update(label=labels, time=times, pair=names[codes])
+            pq.write_table(pa.table(columns), os.path.join(self.out_dir, name + ".parquet"))
+        else:
+            np.savez_compressed(
+                os.path.join(self.out_dir, name + ".npz"),
+                features=features,
+                labels=labels,
+                times=times,
+                pairs=codes,
+            )
+        
+        self.chunks_written += 1
+        self.rows_written += len(labels)
+        self.positives += int(labels.sum())
+        logger.info(f"💾 Wrote {name} ({len(labels)} rows, {int(labels.sum())} positive)")
+    
+    def finish(self) -> dict:
+        """Flush the remaining rows and write manifest.json"""
+        self._flush()
+        
+        manifest = {
+            **self.params,
+            "pairs": list(self.pair_codes),
+            "ticks_seen": self.ticks_seen,
+            "rows": self.rows_written,
+            "positives": self.positives,
+            "positive_rate": round(self.positives / self.rows_written, 6) if self.rows_written else 0.0,
+            "chunks": self.chunks_written,
+            "created_at": datetime.now().isoformat(),
+        }
+        with open(os.path.join(self.out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build ML training datasets from recorded ticks")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--export", nargs="+", help="TickStorage export directories or JSON files (globs allowed, chronological)")
+    source.add_argument("--timescale", action="store_true", help="Read from TimescaleDB")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="TimescaleDB range start")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="TimescaleDB range end (exclusive)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--database", default="arbitrage")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default=os.environ.get("PGPASSWORD", ""))
+    parser.add_argument("--pair", action="append", help="Restrict to a pair (repeatable)")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--horizon-ms", type=int, default=500)
+    parser.add_argument("--sample-ms", type=int, default=100)
+    parser.add_argument("--chunk-rows", type=int, default=100000)
+    parser.add_argument("--min-profit", type=float, default=MIN_PROFIT_THRESHOLD, help="Percent")
+    parser.add_argument("--format", choices=["npz", "parquet"], default="npz")
+    args = parser.parse_args(argv)
+    
+    if args.timescale:
+        if args.start is None or args.end is None:
+            parser.error("--timescale needs --start and --end")
+        
+        from engine_timescale import TimescaleDBStorage
+        storage = TimescaleDBStorage(
+            host=args.host, port=args.port, database=args.database,
+            user=args.user, password=args.password, max_connections=2
+        )
+        if not storage.connected:
+            parser.error("could not connect to TimescaleDB")
+        
+        pair = args.pair[0] if args.pair and len(args.pair) == 1 else None
+        ticks = iter_timescale_ticks(storage, args.start, args.end, pair=pair)
+    else:
+        paths = [path for pattern in args.export for path in sorted(glob.glob(pattern)) or [pattern]]
+        ticks = iter_export_ticks(paths)
+    
+    builder = DatasetBuilder(
+        args.out,
+        time_horizon_ms=args.horizon_ms,
+        sample_ms=args.sample_ms,
+        chunk_rows=args.chunk_rows,
+        min_profit_percent=args.min_profit,
+        pairs=args.pair,
+        fmt=args.format
+    )
+    manifest = builder.build(ticks)
+    logger.info(
+        f"✅ {manifest['rows']} rows from {manifest['ticks_seen']} ticks in {manifest['chunks']} chunks "
+        f"({manifest['positive_rate']:.2%} positive)"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)-8s | %(message)s')
+    main()
@@ -0,0 +1,332 @@
+"""
+Streaming Tick Export and Import
+
+Writes TickStorage to disk column-wise without building the whole dataset
+in memory:
+- One (exchange, pair) is exported at a time: its columns are copied out
+  of the ring buffer (and its compressed cold blocks) and written in `chunk_rows` chunks, so peak memory is
+  one key's columns rather than every tick as a dict
+- Parquet (one file per key, one row group per chunk) when pyarrow is
+  installed, otherwise compressed `.npz` chunks, or gzipped CSV on request
+- Runs on a background thread; progress is in `get_state()` and in the
+  storage's own `get_state()["export"]`. Each key is copied on the event
+  loop that stores ticks (the copy is not safe against concurrent
+  appends) and decoded and written on the export thread
+- `manifest.json` is written last, listing every file, so a directory
+  with a manifest is a complete export
+
+`iter_export` and `import_export` read an export back chunk by chunk, e.g.
+into a fresh TickStorage for ReplayEngine.
+
+Layout:
+    exports/2024-01-15/
+        manifest.json
+        binance/BTC%2FUSDT.parquet          (parquet)
+        binance/BTC%2FUSDT/00000.npz        (npz)
+        binance/BTC%2FUSDT.csv.gz           (csv)
+"""
+
+import asyncio
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from engine_storage import TickBuffer, TickStorage
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+FORMATS = ("parquet", "npz", "csv")
+MANIFEST = "manifest.json"
+
+Columns = Dict[str, np.ndarray]
+
+
+class TickExporter:
+    """
+    Exports a TickStorage to a directory, one key at a time.
+    
+    `start()` runs the export on a thread and returns immediately;
+    `export()` runs it inline. Either way the storage keeps accepting
+    ticks: each key is exported as it was when its columns were copied.
+    Copies are taken on `loop` (by default the loop `start()` is called
+    on); without a running loop they are taken inline.
+    """
+    
+    def __init__(
+        self,
+        storage: TickStorage,
+        fmt: str = "parquet",
+        chunk_rows: int = 65536,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
+        """
+        Args:
+            storage: Storage to export
+            fmt: "parquet", "npz" or "csv" (parquet falls back to npz without pyarrow)
+            chunk_rows: Rows per written chunk
+            loop: Event loop that stores ticks into `storage`
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        if fmt == "parquet" and not HAS_PYARROW:
+            logger.warning("pyarrow not available, exporting .npz chunks")
+            fmt = "npz"
+        
+        self.storage = storage
+        self.fmt = fmt
+        self.chunk_rows = chunk_rows
+        self.loop = loop
+        
+        self.directory: Optional[str] = None
+        self.keys_total = 0
+        self.keys_done = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.current_key: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        
+        storage.exporter = self
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, directory: str) -> 'TickExporter':
+        """Export on a background thread"""
+        if self.running:
+            raise RuntimeError("Export already running")
+        if self.loop is None:
+            try:
+                self.loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        self._thread = threading.Thread(target=self._run, args=(directory,), name="tick-export", daemon=True)
+        self._thread.start()
+        return self
+    
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+    
+    def _on_loop(self, fn: Callable[..., Any], *args) -> Any:
+        """Call `fn` on the storage's loop and wait for it (inline when already on it, or without one)"""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if not on_loop:
+                future: Future = Future()
+                
+                def call():
+                    try:
+                        future.set_result(fn(*args))
+                    except Exception as e:
+                        future.set_exception(e)
+                
+                loop.call_soon_threadsafe(call)
+                return future.result()
+        return fn(*args)
+    
+    def _run(self, directory: str):
+        try:
+            self.export(directory)
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"❌ Tick export to {directory} failed: {e}")
+    
+    def export(self, directory: str) -> dict:
+        """Export every key and write the manifest; returns the manifest"""
+        self.directory = directory
+        self.started_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self.keys_done = self.rows_written = self.bytes_written = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        buffers = self._on_loop(lambda: list(self.storage.ticks.values()))
+        self.keys_total = len(buffers)
+        
+        entries = []
+        for buffer in buffers:
+            self.current_key = f"{buffer.exchange}/{buffer.pair}"
+            entries.append(self._export_key(directory, buffer))
+            self.keys_done += 1
+        self.current_key = None
+        
+        manifest = {
+            "format": self.fmt,
+            "exported_at": datetime.now().isoformat(),
+            "rows": self.rows_written,
+            "columns": list(TickBuffer.COLUMNS),
+            "keys": entries,
+        }
+        with open(os.path.join(directory, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        
+        self.finished_at = time.time()
+        logger.info(f"📦 Exported {self.rows_written} ticks ({self.keys_total} keys) to {directory}")
+        return manifest
+    
+    def _export_key(self, directory: str, buffer: TickBuffer) -> dict:
+        columns = TickStorage.assemble(*self._on_loop(self.storage.capture, buffer.exchange, buffer.pair))
+        rows = len(columns["time_ns"])
+        base = os.path.join(quote(buffer.exchange, safe=""), quote(buffer.pair, safe=""))
+        os.makedirs(os.path.join(directory, os.path.dirname(base)), exist_ok=True)
+        
+        chunks = (
+            {name: column[i:i + self.chunk_rows] for name, column in columns.items()}
+            for i in range(0, rows, self.chunk_rows)
+        )
+        if self.fmt == "parquet":
+            files = [self._write_parquet(directory, base + ".parquet", chunks)]
+        elif self.fmt == "csv":
+            files = [self._write_csv(directory, base + ".csv.gz", chunks)]
+        else:
+            os.makedirs(os.path.join(directory, base), exist_ok=True)
+            files = []
+            for i, chunk in enumerate(chunks):
+                path = os.path.join(base, f"{i:05d}.npz")
+                np.savez_compressed(os.path.join(directory, path), **chunk)
+                self._wrote(directory, path, len(chunk["time_ns"]))
+                files.append(path)
+        
+        return {
+            "exchange": buffer.exchange,
+            "pair": buffer.pair,
+            "rows": rows,
+            "first_ns": int(columns["time_ns"][0]) if rows else None,
+            "last_ns": int(columns["time_ns"][-1]) if rows else None,
+            "files": files,
+        }
+    
+    def _wrote(self, directory: str, path: str, rows: int):
+        self.rows_written += rows
+        self.bytes_written += os.path.getsize(os.path.join(directory, path))
+    
+    def _write_parquet(self, directory: str, path: str, chunks: Iterator[Columns]) -> str:
+        schema = pa.schema([("time_ns", pa.int64())] + [(name, pa.float64()) for name in TickBuffer.COLUMNS[1:]])
+        rows = 0
+        with pq.ParquetWriter(os.path.join(directory, path), schema, compression="zstd") as writer:
+            for chunk in chunks:
+                writer.write_table(pa.table(chunk, schema=schema))
+                rows += len(chunk["time_ns"])
+        self._wrote(directory, path, rows)
+        return path
+    
+    def _write_csv(self, directory: str, path: str, chunks: Iterator[Columns]) -> str:
+        rows = 0
+        with gzip.open(os.path.join(directory, path), "wt", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(TickBuffer.COLUMNS)
+            for chunk in chunks:
+                # tolist() gives Python ints and floats, whose str() round-trips exactly
+                writer.writerows(zip(*(chunk[name].tolist() for name in TickBuffer.COLUMNS)))
+                rows += len(chunk["time_ns"])
+        self._wrote(directory, path, rows)
+        return path
+    
+    def get_state(self) -> dict:
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        return {
+            "running": self.running,
+            "directory": self.directory,
+            "format": self.fmt,
+            "keys_total": self.keys_total,
+            "keys_done": self.keys_done,
+            "current_key": self.current_key,
+            "rows_written": self.rows_written,
+            "bytes_written": self.bytes_written,
+            "elapsed_seconds": round(elapsed, 2),
+            "finished": self.finished_at is not None,
+            "error": self.error,
+        }
+
+
+def _read_csv(path: str, chunk_rows: int) -> Iterator[Columns]:
+    with gzip.open(path, "rt", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            table = np.array(rows)
+            yield {
+                name: table[:, i].astype(np.int64 if name == "time_ns" else np.float64)
+                for i, name in enumerate(header)
+            }
+
+
+def _read_file(path: str, chunk_rows: int) -> Iterator[Columns]:
+    if path.endswith(".parquet"):
+        if not HAS_PYARROW:
+            raise RuntimeError(f"pyarrow is required to read {path}")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield {name: batch.column(name).to_numpy() for name in batch.schema.names}
+    elif path.endswith(".csv.gz"):
+        yield from _read_csv(path, chunk_rows)
+    else:
+        with np.load(path) as data:
+            yield {name: data[name] for name in data.files}
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def iter_key(directory: str, entry: dict, chunk_rows: int = 65536) -> Iterator[Columns]:
+    """Column chunks of one manifest entry, in time order"""
+    for path in entry["files"]:
+        yield from _read_file(os.path.join(directory, path), chunk_rows)
+
+
+def iter_export(directory: str, chunk_rows: int = 65536) -> Iterator[Tuple[str, str, Columns]]:
+    """(exchange, pair, columns) chunks of an export, one key after another"""
+    for entry in read_manifest(directory)["keys"]:
+        for chunk in iter_key(directory, entry, chunk_rows):
+            yield entry["exchange"], entry["pair"], chunk
+
+
+def import_export(directory: str, storage: Optional[TickStorage] = None, pairs: Optional[List[str]] = None) -> TickStorage:
+    """
+    Load an export into a TickStorage (a new one sized to hold every key
+    unless given), e.g. for ReplayEngine.
+    """
+    if storage is None:
+        manifest = read_manifest(directory)
+        largest = max((entry["rows"] for entry in manifest["keys"]), default=0)
+        storage = TickStorage(max_ticks_per_key=max(1, largest))
+    
+    rows = 0
+    for exchange, pair, chunk in iter_export(directory):
+        if pairs and pair not in pairs:
+            continue
+        storage.store_batch(exchange, pair, chunk)
+        rows += len(chunk["time_ns"])
+    
+    logger.info(f"📥 Imported {rows} ticks from {directory}")
+    return storage
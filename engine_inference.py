@@ -0,0 +1,335 @@
+"""
+Off-Event-Loop ML Inference Service
+
+Feature extraction and model scoring run on dedicated worker threads
+instead of the asyncio thread that handles exchange feeds:
+- Requests enter through a bounded queue; when it is full the request is
+  shed and answered by the rule-based predictor
+- Each request carries a latency budget. If the model has not answered
+  when it expires, the caller gets the rule-based result and the miss is
+  counted. Fallbacks score the pair's last extracted (possibly stale)
+  features, or neutral ones, and never wait on the engine lock
+- Per-tick jobs (e.g. MLEngine's opportunity predictor) are coalesced per
+  key, so a burst of ticks queues at most one prediction per pair
+- Served latencies feed the `ml_prediction_latency` histogram
+- Prediction callbacks are handed back to the event loop
+
+ONNX Runtime and NumPy release the GIL for the heavy parts, so a thread
+pool keeps the loop responsive without pickling features to a process.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from engine_metrics import metrics_engine
+from engine_ml_advanced import AdvancedMLEngine, AdvancedFeatures, PredictionResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InferenceRequest:
+    """One queued prediction for a pair"""
+    pair: str
+    budget_ms: float
+    submitted: float = field(default_factory=time.perf_counter)
+    future: Future = field(default_factory=Future)
+    features: Optional[AdvancedFeatures] = None  # Set by the worker before scoring
+    
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.submitted) * 1000
+
+
+class InferenceService:
+    """
+    Worker pool in front of an AdvancedMLEngine.
+    
+    `predict` / `predict_async` wait at most the latency budget for the
+    model. Results are finished (stored, callbacks fired) on the calling
+    side, so a late model answer is simply discarded.
+    """
+    
+    def __init__(
+        self,
+        engine: AdvancedMLEngine,
+        workers: int = 1,
+        max_queue: int = 256,
+        latency_budget_ms: float = 20.0,
+        loop: Optional[asyncio.AbstractEventLoop] = None
+    ):
+        """
+        Args:
+            engine: Engine whose extractor and predictors are used
+            workers: Worker threads
+            max_queue: Queued jobs before new requests are shed
+            latency_budget_ms: Default per-request budget (queue wait included)
+            loop: Event loop that callbacks are delivered on (set later by the bot)
+        """
+        self.engine = engine
+        self.latency_budget_ms = latency_budget_ms
+        self.loop = loop
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._scheduled: set = set()
+        self._scheduled_lock = threading.Lock()
+        
+        # Stats
+        self.submitted = 0
+        self.served = 0
+        self.budget_misses = 0
+        self.shed = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.latencies: deque = deque(maxlen=1000)
+        
+        # Engine callbacks fire from whichever thread finishes a prediction
+        engine.dispatch = self.deliver
+        
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"ml-inference-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._workers:
+            thread.start()
+    
+    # ===== WORKERS =====
+    
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                job()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Inference job error: {e}")
+    
+    def _enqueue(self, job: Callable[[], None]) -> bool:
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            self.shed += 1
+            return False
+    
+    def deliver(self, callback: Callable, *args):
+        """Run a callback on the event loop (directly when already on it, or without a loop)"""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            try:
+                on_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                on_loop = False
+            if not on_loop:
+                loop.call_soon_threadsafe(self._safe_call, callback, args)
+                return
+        self._safe_call(callback, args)
+    
+    @staticmethod
+    def _safe_call(callback: Callable, args: Tuple):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Inference callback error: {e}")
+    
+    # ===== BUDGETED PREDICTIONS =====
+    
+    def submit(self, pair: str, budget_ms: Optional[float] = None) -> Optional[InferenceRequest]:
+        """Queue a prediction; None if the queue is full"""
+        request = InferenceRequest(pair, self.latency_budget_ms if budget_ms is None else budget_ms)
+        self.submitted += 1
+        if not self._enqueue(lambda: self._score(request)):
+            return None
+        return request
+    
+    def _score(self, request: InferenceRequest):
+        """Worker side: extract and score, unless the caller has already given up"""
+        if not request.future.set_running_or_notify_cancel():
+            return
+        if request.elapsed_ms() >= request.budget_ms:
+            request.future.set_result(None)  # Waited out its budget in the queue
+            return
+        
+        try:
+            request.features = self.engine.extract(request.pair)
+            start = time.perf_counter()
+            probability, model_name = self.engine.score(request.features)
+            request.future.set_result((probability, model_name, (time.perf_counter() - start) * 1000))
+        except Exception as e:
+            request.future.set_exception(e)
+    
+    def predict(self, pair: str, budget_ms: Optional[float] = None) -> PredictionResult:
+        """Blocking prediction for threads other than the event loop"""
+        cached = self.engine.cached_prediction(pair)
+        if cached is not None:
+            return cached
+        
+        request = self.submit(pair, budget_ms)
+        if request is None:
+            return self._fallback(pair, None, "shed")
+        
+        try:
+            outcome = request.future.result(timeout=max(0.0, request.budget_ms - request.elapsed_ms()) / 1000)
+        except FutureTimeout:
+            return self._fallback(pair, request, "timeout")
+        except Exception as e:
+            logger.error(f"Inference error for {pair}: {e}")
+            return self._fallback(pair, request, "error")
+        
+        return self._serve(request, outcome)
+    
+    async def predict_async(self, pair: str, budget_ms: Optional[float] = None) -> PredictionResult:
+        """Prediction awaited from the event loop"""
+        cached = self.engine.cached_prediction(pair)
+        if cached is not None:
+            return cached  # Nothing new since the last answer; skip the queue
+        
+        request = self.submit(pair, budget_ms)
+        if request is None:
+            return self._fallback(pair, None, "shed")
+        
+        try:
+            outcome = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(request.future)),
+                max(0.0, request.budget_ms - request.elapsed_ms()) / 1000
+            )
+        except asyncio.TimeoutError:
+            return self._fallback(pair, request, "timeout")
+        except Exception as e:
+            logger.error(f"Inference error for {pair}: {e}")
+            return self._fallback(pair, request, "error")
+        
+        return self._serve(request, outcome)
+    
+    def _serve(self, request: InferenceRequest, outcome: Optional[Tuple[float, str, float]]) -> PredictionResult:
+        if outcome is None:
+            return self._fallback(request.pair, request, "timeout")
+        
+        probability, model_name, inference_ms = outcome
+        result = self.engine.finish_prediction(request.pair, request.features, probability, model_name, inference_ms)
+        return self._record(result, request.elapsed_ms(), request.budget_ms, budget_miss=False)
+    
+    def _fallback(self, pair: str, request: Optional[InferenceRequest], reason: str) -> PredictionResult:
+        """Rule-based answer for a request the model could not serve in time"""
+        self.budget_misses += 1
+        if reason == "error":
+            self.errors += 1
+        metrics_engine.record_ml_budget_miss(reason)
+        
+        start = time.perf_counter()
+        features = request.features if request is not None else None
+        if features is None:
+            # Extracting here would wait on the engine lock behind the busy worker
+            features = self.engine.cached_features(pair)
+        if features is None:
+            features = AdvancedFeatures()  # Never extracted: neutral features
+        probability = self.engine.rule_predictor.predict(features)
+        inference_ms = (time.perf_counter() - start) * 1000
+        
+        result = self.engine.finish_prediction(pair, features, probability, "rule_based", inference_ms, memoize=False)
+        result.details["fallback_reason"] = reason
+        
+        latency_ms = request.elapsed_ms() if request is not None else inference_ms
+        budget_ms = request.budget_ms if request is not None else self.latency_budget_ms
+        return self._record(result, latency_ms, budget_ms, budget_miss=True)
+    
+    def _record(self, result: PredictionResult, latency_ms: float, budget_ms: float, budget_miss: bool) -> PredictionResult:
+        self.served += 1
+        self.latencies.append(latency_ms)
+        metrics_engine.record_ml_prediction(result.model_name, result.signal, latency_ms)
+        
+        result.details["latency_ms"] = round(latency_ms, 3)
+        result.details["latency_budget_ms"] = budget_ms
+        result.details["budget_miss"] = budget_miss
+        return result
+    
+    # ===== BACKGROUND JOBS =====
+    
+    async def run_cycle(self, max_age_seconds: Optional[float] = 10.0) -> Dict[str, PredictionResult]:
+        """Run the engine's batched prediction cycle on a worker and await it"""
+        future: Future = Future()
+        
+        def job():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(self.engine.run_cycle(max_age_seconds))
+            except Exception as e:
+                future.set_exception(e)
+        
+        if not self._enqueue(job):
+            logger.warning("⚠️ ML inference queue full, skipping prediction cycle")
+            return {}
+        
+        results = await asyncio.wrap_future(future)
+        for result in results.values():
+            metrics_engine.record_ml_prediction(result.model_name, result.signal, result.inference_time_ms)
+        return results
+    
+    def schedule(self, key: Hashable, fn: Callable[[], Any], on_result: Optional[Callable[[Any], None]] = None) -> bool:
+        """
+        Fire-and-forget job, coalesced by key.
+        
+        While a job for `key` is queued, further requests for it are
+        dropped; the queued one runs on the newest data anyway. The key is
+        released as the job starts, so ticks arriving mid-run schedule a
+        fresh one. `on_result` is delivered on the event loop.
+        """
+        with self._scheduled_lock:
+            if key in self._scheduled:
+                self.coalesced += 1
+                return False
+            self._scheduled.add(key)
+        
+        def job():
+            with self._scheduled_lock:
+                self._scheduled.discard(key)
+            result = fn()
+            if on_result is not None:
+                self.deliver(on_result, result)
+        
+        if not self._enqueue(job):
+            with self._scheduled_lock:
+                self._scheduled.discard(key)
+            return False
+        return True
+    
+    # ===== LIFECYCLE / STATE =====
+    
+    def stop(self, timeout: float = 1.0):
+        """Stop workers after the jobs already queued"""
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for thread in self._workers:
+            thread.join(timeout)
+    
+    def get_state(self) -> dict:
+        latencies = np.array(self.latencies) if self.latencies else None
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "latency_budget_ms": self.latency_budget_ms,
+            "submitted": self.submitted,
+            "served": self.served,
+            "budget_misses": self.budget_misses,
+            "miss_rate": round(self.budget_misses / self.served, 4) if self.served else 0.0,
+            "shed": self.shed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies is not None else None,
+            "latency_p99_ms": round(float(np.percentile(latencies, 99)), 3) if latencies is not None else None,
+        }
@@ -0,0 +1,64 @@
+"""
+Background Jobs
+
+Periodic analysis off the event loop:
+- One worker thread per job, started on first use
+- The loop submits a snapshot of its data when the job is due
+- Results are harvested on a later tick, so the loop never blocks
+
+Shared by the statistical arbitrage (pair discovery, cointegration) and
+lead-lag engines.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundJob:
+    """
+    Periodic job run on a single worker thread.
+    
+    The event loop snapshots its data and calls `_submit()` when `due()`;
+    the finished result is harvested on a later tick with `collect()`, so
+    the loop never blocks on the computation.
+    """
+    
+    name = "background-job"
+    
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._last_submit = 0.0
+        self._future: Optional[Future] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def due(self, now: float) -> bool:
+        """Whether a new run should be submitted"""
+        return self._future is None and now - self._last_submit >= self.interval_seconds
+    
+    def _submit(self, now: float, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        
+        self._last_submit = now
+        self._future = self._executor.submit(fn, *args)
+    
+    def collect(self):
+        """Return the finished run's result, if any"""
+        if self._future is None or not self._future.done():
+            return None
+        
+        future, self._future = self._future, None
+        try:
+            return future.result()
+        except Exception as e:
+            logger.error(f"{self.name} error: {e}")
+            return None
+    
+    def stop(self):
+        """Shut down the worker thread"""
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
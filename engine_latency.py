@@ -31,6 +31,8 @@ from collections import defaultdict, deque
 import math
 import statistics
 
+from engine_leadlag import LeadLagAnalyzer
+
 logger = logging.getLogger(__name__)
 
 
@@ -122,6 +124,7 @@ class LatencyOpportunity:
     risk_score: float
     feed_metrics: Dict[str, ExchangeFeedMetrics]
     timestamp: datetime
+    lead_lag_ms: Optional[float] = None  # Measured lead of the fast exchange over the stale one
     
     def to_dict(self) -> dict:
         return {
@@ -140,6 +143,7 @@ class LatencyOpportunity:
             "time_window_ms": self.time_window_ms,
             "risk_score": round(self.risk_score, 2),
             "feed_metrics": {ex: m.to_dict() for ex, m in self.feed_metrics.items()},
+            "lead_lag_ms": round(self.lead_lag_ms, 1) if self.lead_lag_ms is not None else None,
             "timestamp": self.timestamp.isoformat(),
         }
     
@@ -160,6 +164,10 @@ class LatencyArbitrageEngine:
     3. Use consensus price from faster exchanges as true price
     4. Calculate expected profit from trading against stale quote
     
+    With a LeadLagAnalyzer attached, the reference exchange is the one
+    measured to lead the pair, and its lead over the stale venue is
+    reported with the opportunity. Estimates are read from its cache.
+    
     Real-world considerations:
     - HFT firms use co-location for microsecond advantages
     - This engine works at millisecond level (more accessible)
@@ -185,6 +193,7 @@ class LatencyArbitrageEngine:
         min_staleness_ms: int = 500,
         min_price_diff_percent: float = 0.05,  # 0.05% minimum
         max_time_window_ms: int = 2000,
+        lead_lag: Optional[LeadLagAnalyzer] = None,
     ):
         self.min_staleness_ms = min_staleness_ms
         self.min_price_diff_percent = min_price_diff_percent
@@ -205,6 +214,9 @@ class LatencyArbitrageEngine:
         # Feed metrics cache
         self.feed_metrics: Dict[Tuple[str, str], ExchangeFeedMetrics] = {}
         
+        # Shared lead-lag estimates (optional)
+        self.lead_lag = lead_lag
+        
         # Callbacks
         self._on_opportunity_callbacks: List = []
     
@@ -304,6 +316,14 @@ class LatencyArbitrageEngine:
         fast_prices = [exchange_metrics[ex].price for ex in fast_exchanges]
         consensus_price = sum(fast_prices) / len(fast_prices)
         
+        # Reference exchange: the measured leader if known, else the freshest feed
+        estimate = self.lead_lag.estimate(pair) if self.lead_lag is not None else None
+        if estimate is not None:
+            ranked = [ex for ex, _ in estimate.ranking if ex in fast_exchanges]
+        else:
+            ranked = []
+        best_fast_ex = ranked[0] if ranked else min(fast_exchanges, key=lambda x: exchange_metrics[x].staleness_score)
+        
         new_opportunities = []
         
         for stale_ex in stale_exchanges:
@@ -339,9 +359,6 @@ class LatencyArbitrageEngine:
                 stale_metrics, time_window, price_diff_percent
             )
             
-            # Choose best fast exchange as reference
-            best_fast_ex = min(fast_exchanges, key=lambda x: exchange_metrics[x].staleness_score)
-            
             opportunity = LatencyOpportunity(
                 stale_exchange=stale_ex,
                 fast_exchange=best_fast_ex,
@@ -356,7 +373,8 @@ class LatencyArbitrageEngine:
                 time_window_ms=time_window,
                 risk_score=risk_score,
                 feed_metrics={ex: m for ex, m in exchange_metrics.items()},
-                timestamp=datetime.now()
+                timestamp=datetime.now(),
+                lead_lag_ms=estimate.lag_between(best_fast_ex, stale_ex) if estimate is not None else None
             )
             
             new_opportunities.append(opportunity)
@@ -496,6 +514,9 @@ class LatencyArbitrageEngine:
             "stale_feed_count": len(stale_feeds),
             "total_feeds_monitored": len(self.feed_metrics),
             "exchanges_monitored": list(set(m.exchange for m in self.feed_metrics.values())),
+            "leaders": {
+                pair: estimate.leader for pair, estimate in self.lead_lag.estimates.items()
+            } if self.lead_lag is not None else {},
             "config": {
                 "min_staleness_ms": self.min_staleness_ms,
                 "min_price_diff_percent": self.min_price_diff_percent,
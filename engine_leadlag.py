@@ -0,0 +1,239 @@
+"""
+Cross-Exchange Lead-Lag Estimation
+
+Measures which exchange moves first for each pair:
+- Mid prices are resampled onto a fine grid (MidPriceResampler), so every
+  exchange is observed at the same instants
+- Grid log returns are cross-correlated over a range of lags with an FFT,
+  O(n log n) per series instead of O(n * lags)
+- The peak lag between every two exchanges (refined to sub-sample
+  precision) is published with a leader ranking per pair
+
+Estimates are recomputed every `interval_seconds` of sample time on a
+worker thread and cached, so the latency engine and the ML features read
+them without recomputing anything on the tick path.
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from engine_jobs import BackgroundJob
+from engine_resampler import MidPriceResampler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LeadLagEstimate:
+    """Lead-lag structure of one pair across exchanges"""
+    pair: str
+    ranking: List[Tuple[str, float]]  # (exchange, mean lead over the others in ms), leader first
+    lags: Dict[Tuple[str, str], Tuple[float, float]]  # (a, b) -> (ms a leads b, peak correlation)
+    samples: int
+    computed_at: float = field(default_factory=time.time)
+    
+    @property
+    def leader(self) -> Optional[str]:
+        return self.ranking[0][0] if self.ranking else None
+    
+    def lead_ms(self, exchange: str) -> Optional[float]:
+        """Mean lead of an exchange over the others (negative if it lags)"""
+        for ex, lead in self.ranking:
+            if ex == exchange:
+                return lead
+        return None
+    
+    def lag_between(self, leader: str, follower: str) -> Optional[float]:
+        """Milliseconds `leader` moves ahead of `follower` (negative if behind)"""
+        if (leader, follower) in self.lags:
+            return self.lags[(leader, follower)][0]
+        if (follower, leader) in self.lags:
+            return -self.lags[(follower, leader)][0]
+        return None
+    
+    def to_dict(self) -> dict:
+        return {
+            "pair": self.pair,
+            "leader": self.leader,
+            "ranking": [{"exchange": ex, "lead_ms": round(lead, 2)} for ex, lead in self.ranking],
+            "lags": [
+                {"a": a, "b": b, "a_leads_ms": round(lag, 2), "correlation": round(corr, 4)}
+                for (a, b), (lag, corr) in self.lags.items()
+            ],
+            "samples": self.samples,
+            "computed_at": datetime.fromtimestamp(self.computed_at).isoformat(),
+        }
+
+
+class LeadLagAnalyzer(BackgroundJob):
+    """
+    Periodic FFT cross-correlation of per-exchange mid returns.
+    
+    `update()` only records the latest mid in the resampler. When the
+    sample clock passes `interval_seconds` since the last run, a snapshot
+    is correlated on the worker thread and the result replaces
+    `estimates` on a later sample. With `background=False` the run happens
+    inline, which keeps offline replay deterministic.
+    """
+    
+    name = "lead-lag"
+    
+    def __init__(
+        self,
+        interval_ms: int = 50,
+        window_seconds: float = 60.0,
+        max_lag_ms: int = 2000,
+        min_points: int = 200,
+        interval_seconds: float = 5.0,
+        background: bool = True
+    ):
+        """
+        Args:
+            interval_ms: Resampling grid spacing
+            window_seconds: Trailing window correlated on each run
+            max_lag_ms: Largest lead searched in either direction
+            min_points: Aligned returns required before a pair is estimated
+            interval_seconds: Sample time between runs
+            background: Run on a worker thread (False: inline on the sample clock)
+        """
+        super().__init__(interval_seconds)
+        self.window_rows = max(2, int(window_seconds * 1000 / interval_ms))
+        self.max_lag = max(1, int(max_lag_ms / interval_ms))
+        self.min_points = min_points
+        self.background = background
+        
+        self.resampler = MidPriceResampler(interval_ms=interval_ms, capacity=self.window_rows)
+        self.resampler.on_sample(self._on_sample)
+        
+        # Latest estimates, replaced wholesale after each run
+        self.estimates: Dict[str, LeadLagEstimate] = {}
+        
+        self.runs = 0
+        self.last_run_ms = 0.0
+    
+    def update(self, exchange: str, pair: str, mid: float, timestamp: Union[datetime, float, None] = None):
+        self.resampler.update(exchange, pair, mid, timestamp)
+    
+    def estimate(self, pair: str) -> Optional[LeadLagEstimate]:
+        """Cached estimate for a pair (None until enough aligned data)"""
+        return self.estimates.get(pair)
+    
+    def _on_sample(self, sample_time: float):
+        if not self.background:
+            if sample_time - self._last_submit >= self.interval_seconds:
+                self._last_submit = sample_time
+                self.estimates = self.compute(self.resampler.snapshot(), self.resampler.interval_ms, sample_time)
+            return
+        
+        results = self.collect()
+        if results is not None:
+            self.estimates = results
+        
+        if self.due(sample_time):
+            self._submit(sample_time, self.compute, self.resampler.snapshot(), self.resampler.interval_ms, sample_time)
+    
+    def compute(
+        self,
+        snapshot: Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray],
+        interval_ms: int,
+        computed_at: Optional[float] = None
+    ) -> Dict[str, LeadLagEstimate]:
+        """Estimate lead-lag for every pair quoted on two or more exchanges"""
+        start = time.perf_counter()
+        keys, _, values = snapshot
+        
+        by_pair: Dict[str, List[Tuple[str, int]]] = {}
+        for col, (exchange, pair) in enumerate(keys):
+            by_pair.setdefault(pair, []).append((exchange, col))
+        
+        estimates = {}
+        for pair, columns in by_pair.items():
+            if len(columns) < 2:
+                continue
+            estimate = self._estimate_pair(pair, columns, values, interval_ms)
+            if estimate is not None:
+                if computed_at is not None:
+                    estimate.computed_at = computed_at
+                estimates[pair] = estimate
+        
+        self.runs += 1
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        return estimates
+    
+    def _estimate_pair(
+        self,
+        pair: str,
+        columns: List[Tuple[str, int]],
+        values: np.ndarray,
+        interval_ms: int
+    ) -> Optional[LeadLagEstimate]:
+        block = values[:, [col for _, col in columns]]
+        
+        # Forward-filled grid: NaNs only precede an exchange's first quote
+        block = block[np.isfinite(block).all(axis=1) & (block > 0).all(axis=1)]
+        if len(block) <= self.min_points:
+            return None
+        
+        returns = np.diff(np.log(block), axis=0)
+        returns -= returns.mean(axis=0)
+        std = returns.std(axis=0)
+        moving = std > 0
+        if moving.sum() < 2:
+            return None
+        exchanges = [ex for (ex, _), keep in zip(columns, moving) if keep]
+        z = returns[:, moving] / std[moving]
+        
+        n = len(z)
+        max_lag = min(self.max_lag, n - 1)
+        size = 1 << (n + max_lag - 1).bit_length()  # Zero padding avoids circular wrap-around
+        spectra = np.fft.rfft(z, size, axis=0)
+        
+        first, second = np.triu_indices(len(exchanges), k=1)
+        # corr[k] = sum_t z_a[t] * z_b[t + k]: a peak at k > 0 means b follows a
+        corr = np.fft.irfft(np.conj(spectra[:, first]) * spectra[:, second], size, axis=0) / n
+        corr = np.concatenate([corr[-max_lag:], corr[:max_lag + 1]], axis=0)  # Lags -max_lag..max_lag
+        
+        lags: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        leads: Dict[str, List[float]] = {ex: [] for ex in exchanges}
+        for i, (a, b) in enumerate(zip(first, second)):
+            series = corr[:, i]
+            peak = int(np.argmax(series))
+            lag = float(peak - max_lag) + self._refine(series, peak)
+            lag_ms = lag * interval_ms
+            
+            lags[(exchanges[a], exchanges[b])] = (lag_ms, float(series[peak]))
+            leads[exchanges[a]].append(lag_ms)
+            leads[exchanges[b]].append(-lag_ms)
+        
+        ranking = sorted(
+            ((ex, sum(v) / len(v)) for ex, v in leads.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        return LeadLagEstimate(pair=pair, ranking=ranking, lags=lags, samples=n)
+    
+    @staticmethod
+    def _refine(series: np.ndarray, peak: int) -> float:
+        """Sub-sample offset of a peak from a parabola through its neighbours"""
+        if peak == 0 or peak == len(series) - 1:
+            return 0.0
+        left, centre, right = series[peak - 1], series[peak], series[peak + 1]
+        curvature = left - 2 * centre + right
+        if curvature >= 0 or not math.isfinite(curvature):
+            return 0.0
+        return float(0.5 * (left - right) / curvature)
+    
+    def get_state(self) -> dict:
+        return {
+            "pairs": {pair: estimate.to_dict() for pair, estimate in self.estimates.items()},
+            "runs": self.runs,
+            "last_run_ms": round(self.last_run_ms, 3),
+            "max_lag_ms": self.max_lag * self.resampler.interval_ms,
+            "resampler": self.resampler.get_state(),
+        }
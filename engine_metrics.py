@@ -189,6 +189,36 @@ class MetricsEngine:
             ['model']
         )
         
+        self.ml_budget_misses_total = Counter(
+            'arb_ml_budget_misses_total',
+            'ML requests served by the rule-based fallback',
+            ['reason']  # reason: timeout, shed, error
+        )
+        
+        self.ml_feature_cache_hits_total = Counter(
+            'arb_ml_feature_cache_hits_total',
+            'Feature extractions answered from the per-pair snapshot cache',
+            ['engine']  # engine: ml, advanced
+        )
+        
+        self.ml_feature_cache_misses_total = Counter(
+            'arb_ml_feature_cache_misses_total',
+            'Feature extractions recomputed because the pair had new data',
+            ['engine']
+        )
+        
+        self.ml_prediction_cache_hits_total = Counter(
+            'arb_ml_prediction_cache_hits_total',
+            'Predictions answered from the memo for unchanged features',
+            ['engine']
+        )
+        
+        self.ml_prediction_cache_misses_total = Counter(
+            'arb_ml_prediction_cache_misses_total',
+            'Predictions computed because features or the model changed',
+            ['engine']
+        )
+        
         # ===== SYSTEM METRICS =====
         self.websocket_connections = Gauge(
             'arb_websocket_connections',
@@ -201,6 +231,43 @@ class MetricsEngine:
             'Total ticks stored'
         )
         
+        self.tick_evictions_total = Counter(
+            'arb_tick_evictions_total',
+            'Ticks evicted by storage compaction',
+            ['storage', 'reason']  # reason: age, budget
+        )
+        
+        self.tick_storage_bytes = Gauge(
+            'arb_tick_storage_bytes',
+            'Bytes allocated for in-memory tick columns',
+            ['storage']
+        )
+        
+        self.tick_db_flush_latency = Histogram(
+            'arb_tick_db_flush_seconds',
+            'Time to write one batch of ticks to the database',
+            ['storage'],
+            buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+        )
+        
+        self.tick_db_rows_written_total = Counter(
+            'arb_tick_db_rows_written_total',
+            'Tick rows written to the database',
+            ['storage']
+        )
+        
+        self.tick_db_queue_depth = Gauge(
+            'arb_tick_db_queue_depth',
+            'Tick rows queued for the database writer',
+            ['storage']
+        )
+        
+        self.tick_db_dropped_total = Counter(
+            'arb_tick_db_dropped_total',
+            'Queued tick rows dropped because the database writer fell behind',
+            ['storage']
+        )
+        
         self.memory_usage_bytes = Gauge(
             'arb_memory_usage_bytes',
             'Memory usage in bytes'
@@ -339,6 +406,25 @@ class MetricsEngine:
             if accuracy is not None:
                 self.ml_model_accuracy.labels(model=model).set(accuracy)
     
+    def record_ml_accuracy(self, model: str, accuracy: Optional[float]):
+        """Update a model's rolling accuracy from labelled outcomes"""
+        if self.enable_prometheus and accuracy is not None:
+            self.ml_model_accuracy.labels(model=model).set(accuracy)
+    
+    def record_ml_budget_miss(self, reason: str):
+        """Record an ML request that fell back to the rule-based predictor"""
+        if self.enable_prometheus:
+            self.ml_budget_misses_total.labels(reason=reason).inc()
+    
+    def record_ml_cache(self, engine: str, cache: str, hit: bool):
+        """Record one feature ("features") or prediction ("predictions") cache lookup"""
+        if self.enable_prometheus:
+            if cache == "features":
+                counter = self.ml_feature_cache_hits_total if hit else self.ml_feature_cache_misses_total
+            else:
+                counter = self.ml_prediction_cache_hits_total if hit else self.ml_prediction_cache_misses_total
+            counter.labels(engine=engine).inc()
+    
     def record_websocket_connection(self, conn_type: str, count: int):
         """Update WebSocket connection count"""
         if self.enable_prometheus:
@@ -349,6 +435,28 @@ class MetricsEngine:
         if self.enable_prometheus:
             self.tick_storage_total.set(total_ticks)
     
+    def record_tick_compaction(self, storage: str, evicted_age: int, evicted_budget: int, memory_bytes: int):
+        """Record one compaction pass of an in-memory tick store"""
+        if self.enable_prometheus:
+            if evicted_age:
+                self.tick_evictions_total.labels(storage=storage, reason="age").inc(evicted_age)
+            if evicted_budget:
+                self.tick_evictions_total.labels(storage=storage, reason="budget").inc(evicted_budget)
+            self.tick_storage_bytes.labels(storage=storage).set(memory_bytes)
+    
+    def record_tick_db_flush(self, storage: str, seconds: float, rows: int):
+        """Record one batch written by a database tick writer"""
+        if self.enable_prometheus:
+            self.tick_db_flush_latency.labels(storage=storage).observe(seconds)
+            self.tick_db_rows_written_total.labels(storage=storage).inc(rows)
+    
+    def record_tick_db_queue(self, storage: str, depth: int, dropped: int = 0):
+        """Update a database tick writer's queue depth and newly dropped rows"""
+        if self.enable_prometheus:
+            self.tick_db_queue_depth.labels(storage=storage).set(depth)
+            if dropped:
+                self.tick_db_dropped_total.labels(storage=storage).inc(dropped)
+    
     # ===== METRIC EXPORT =====
     
     def get_prometheus_metrics(self) -> bytes:
@@ -11,14 +11,22 @@ This module uses lightweight ML that can run without GPU,
 suitable for real-time prediction at <10ms latency.
 """
 
+import asyncio
 import logging
 import math
+import threading
+from bisect import bisect_left, insort
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import deque
 import random
 
+import numpy as np
+
+from engine_metrics import metrics_engine
+from engine_ringbuffer import RingBuffer, PairRingBuffers
+
 logger = logging.getLogger(__name__)
 
 
@@ -148,17 +156,26 @@ class FeatureExtractor:
     
     Maintains rolling windows of price/spread data and
     computes features suitable for prediction models.
+    Windows are preallocated NumPy ring buffers indexed by pair, so
+    extraction cost doesn't grow with the number of tracked pairs.
+    Snapshots are cached per pair and reused until its next tick.
     """
     
     def __init__(self):
-        # Price history: (exchange, pair) -> deque of (price, timestamp)
-        self.prices: Dict[Tuple[str, str], deque] = {}
+        # Price history: (exchange, pair) -> ring buffer of (mid, epoch seconds)
+        self.prices = PairRingBuffers(WINDOW_LONG)
         
-        # Spread history: pair -> deque of (spread, timestamp)
-        self.spreads: Dict[str, deque] = {}
+        # Spread history: pair -> ring buffer of (spread, epoch seconds)
+        self.spreads: Dict[str, RingBuffer] = {}
         
         # Update timestamps: (exchange, pair) -> last update time
         self.last_updates: Dict[Tuple[str, str], datetime] = {}
+        
+        # Data version per pair and the snapshot extracted at it
+        self.versions: Dict[str, int] = {}
+        self._snapshots: Dict[str, Tuple[int, Features]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
     
     def update(
         self, 
@@ -172,50 +189,59 @@ class FeatureExtractor:
         timestamp = timestamp or datetime.now()
         mid = (bid + ask) / 2
         spread = ask - bid
+        epoch = timestamp.timestamp()
         
-        key = (exchange, pair)
-        
-        # Initialize if needed
-        if key not in self.prices:
-            self.prices[key] = deque(maxlen=WINDOW_LONG)
         if pair not in self.spreads:
-            self.spreads[pair] = deque(maxlen=WINDOW_LONG)
+            self.spreads[pair] = RingBuffer(WINDOW_LONG)
         
         # Store data
-        self.prices[key].append((mid, timestamp))
-        self.spreads[pair].append((spread, timestamp))
-        self.last_updates[key] = timestamp
+        self.prices.append(exchange, pair, mid, epoch)
+        self.spreads[pair].append(spread, epoch)
+        self.last_updates[(exchange, pair)] = timestamp
+        self.versions[pair] = self.versions.get(pair, 0) + 1
     
     def extract(self, pair: str) -> Features:
+        """
+        Feature vector for a pair, reused until its next tick.
+        
+        The snapshot is shared between callers; treat it as read-only.
+        """
+        version = self.versions.get(pair)
+        cached = self._snapshots.get(pair)
+        if cached is not None and cached[0] == version:
+            self.cache_hits += 1
+            metrics_engine.record_ml_cache("ml", "features", hit=True)
+            return cached[1]
+        
+        self.cache_misses += 1
+        metrics_engine.record_ml_cache("ml", "features", hit=False)
+        features = self._extract(pair)
+        if version is not None:
+            self._snapshots[pair] = (version, features)
+        return features
+    
+    def _extract(self, pair: str) -> Features:
         """Extract feature vector for a pair"""
         features = Features()
         
-        # Get all prices across exchanges for this pair
-        all_prices = []
-        exchange_prices = {}
-        
-        for (ex, p), prices in self.prices.items():
-            if p == pair and prices:
-                latest = prices[-1][0]
-                all_prices.append(latest)
-                exchange_prices[ex] = list(prices)
+        # Only the exchanges quoting this pair
+        exchange_prices = {ex: buf for ex, buf in self.prices.for_pair(pair).items() if len(buf)}
         
-        if not all_prices:
+        if not exchange_prices:
             return features
         
         features.exchange_count = len(exchange_prices)
         
         # Price dispersion across exchanges
-        if len(all_prices) > 1:
-            mean_price = sum(all_prices) / len(all_prices)
-            features.price_dispersion = math.sqrt(
-                sum((p - mean_price) ** 2 for p in all_prices) / len(all_prices)
-            ) / mean_price if mean_price > 0 else 0
+        if len(exchange_prices) > 1:
+            latest = np.array([buf.latest for buf in exchange_prices.values()])
+            mean_price = latest.mean()
+            features.price_dispersion = float(latest.std() / mean_price) if mean_price > 0 else 0
         
         # Use first exchange with enough data for price features
         for ex, prices in exchange_prices.items():
             if len(prices) >= WINDOW_SHORT:
-                features = self._extract_price_features(features, prices)
+                features = self._extract_price_features(features, prices.values())
                 break
         
         # Spread features
@@ -223,52 +249,44 @@ class FeatureExtractor:
             features = self._extract_spread_features(features, pair)
         
         # Time features
-        for (ex, p), last_update in self.last_updates.items():
-            if p == pair:
-                age = (datetime.now() - last_update).total_seconds()
-                features.seconds_since_update = min(features.seconds_since_update, age) if features.seconds_since_update > 0 else age
-                
-                # Estimate update rate
-                if (ex, p) in self.prices:
-                    prices = self.prices[(ex, p)]
-                    if len(prices) >= 2:
-                        time_span = (prices[-1][1] - prices[0][1]).total_seconds()
-                        if time_span > 0:
-                            features.updates_per_second = max(
-                                features.updates_per_second,
-                                len(prices) / time_span
-                            )
+        now = datetime.now()
+        for ex, prices in exchange_prices.items():
+            age = (now - self.last_updates[(ex, pair)]).total_seconds()
+            features.seconds_since_update = min(features.seconds_since_update, age) if features.seconds_since_update > 0 else age
+            
+            # Estimate update rate
+            if len(prices) >= 2:
+                time_span = prices.time_span()
+                if time_span > 0:
+                    features.updates_per_second = max(
+                        features.updates_per_second,
+                        len(prices) / time_span
+                    )
         
         return features
     
-    def _extract_price_features(self, features: Features, prices: List) -> Features:
-        """Extract price-based features"""
-        price_values = [p[0] for p in prices]
-        
+    def _extract_price_features(self, features: Features, price_values: np.ndarray) -> Features:
+        """Extract price-based features from a window of mid prices"""
         # Velocity (price change rate)
         if len(price_values) >= 2:
-            features.price_velocity = (price_values[-1] - price_values[-2]) / price_values[-2] if price_values[-2] != 0 else 0
+            features.price_velocity = float((price_values[-1] - price_values[-2]) / price_values[-2]) if price_values[-2] != 0 else 0
         
         # Acceleration (velocity change)
         if len(price_values) >= 3:
-            v1 = (price_values[-2] - price_values[-3]) / price_values[-3] if price_values[-3] != 0 else 0
+            v1 = float((price_values[-2] - price_values[-3]) / price_values[-3]) if price_values[-3] != 0 else 0
             v2 = features.price_velocity
             features.price_acceleration = v2 - v1
         
         # Short-term volatility
         if len(price_values) >= WINDOW_SHORT:
             recent = price_values[-WINDOW_SHORT:]
-            mean_recent = sum(recent) / len(recent)
-            features.volatility_short = math.sqrt(
-                sum((p - mean_recent) ** 2 for p in recent) / len(recent)
-            ) / mean_recent if mean_recent > 0 else 0
+            mean_recent = recent.mean()
+            features.volatility_short = float(recent.std() / mean_recent) if mean_recent > 0 else 0
         
         # Long-term volatility
         if len(price_values) >= WINDOW_MEDIUM:
-            mean_all = sum(price_values) / len(price_values)
-            features.volatility_long = math.sqrt(
-                sum((p - mean_all) ** 2 for p in price_values) / len(price_values)
-            ) / mean_all if mean_all > 0 else 0
+            mean_all = price_values.mean()
+            features.volatility_long = float(price_values.std() / mean_all) if mean_all > 0 else 0
         
         # Volatility ratio (regime indicator)
         if features.volatility_long > 0:
@@ -278,18 +296,16 @@ class FeatureExtractor:
     
     def _extract_spread_features(self, features: Features, pair: str) -> Features:
         """Extract spread-based features"""
-        spread_values = [s[0] for s in self.spreads[pair]]
+        spread_values = self.spreads[pair].values()
         
-        if not spread_values:
+        if not len(spread_values):
             return features
         
-        features.spread_current = spread_values[-1]
-        features.spread_mean = sum(spread_values) / len(spread_values)
+        features.spread_current = float(spread_values[-1])
+        features.spread_mean = float(spread_values.mean())
         
         if len(spread_values) >= 10:
-            std = math.sqrt(
-                sum((s - features.spread_mean) ** 2 for s in spread_values) / len(spread_values)
-            )
+            std = float(spread_values.std())
             if std > 0:
                 features.spread_z_score = (features.spread_current - features.spread_mean) / std
         
@@ -327,6 +343,11 @@ class OpportunityPredictor:
         
         # Recent predictions for tracking
         self.recent_predictions: deque = deque(maxlen=100)
+        
+        # Last prediction per pair with the feature snapshot it was made from
+        self._memo: Dict[str, Tuple[Features, Prediction]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
     
     def update(self, exchange: str, pair: str, bid: float, ask: float, timestamp: Optional[datetime] = None):
         """Update model with new data"""
@@ -336,10 +357,19 @@ class OpportunityPredictor:
         """
         Predict probability of arbitrage opportunity in next 500ms.
         
-        Returns probability between 0-1 and confidence score.
+        Returns probability between 0-1 and confidence score. Repeated
+        calls without a new tick for the pair return the same prediction.
         """
         features = self.feature_extractor.extract(pair)
         
+        memo = self._memo.get(pair)
+        if memo is not None and memo[0] is features:
+            self.cache_hits += 1
+            metrics_engine.record_ml_cache("ml", "predictions", hit=True)
+            return memo[1]
+        self.cache_misses += 1
+        metrics_engine.record_ml_cache("ml", "predictions", hit=False)
+        
         # Calculate prediction score using weighted features
         score = 0.0
         
@@ -387,10 +417,80 @@ class OpportunityPredictor:
         )
         
         self.recent_predictions.append(prediction)
+        self._memo[pair] = (features, prediction)
         
         return prediction
 
 
+class VenueConsensus:
+    """
+    Median and MAD of one pair's price across exchanges.
+    
+    Prices are kept sorted, so a venue update is a bisect removal plus an
+    insort and the median is an index lookup. The MAD walks outward from
+    the median over half the venues without allocating.
+    """
+    
+    __slots__ = ("prices", "_sorted")
+    
+    def __init__(self):
+        self.prices: Dict[str, float] = {}  # exchange -> latest price
+        self._sorted: List[float] = []
+    
+    def update(self, exchange: str, price: float):
+        previous = self.prices.get(exchange)
+        if previous is not None:
+            del self._sorted[bisect_left(self._sorted, previous)]
+        self.prices[exchange] = price
+        insort(self._sorted, price)
+    
+    def remove(self, exchange: str) -> bool:
+        previous = self.prices.pop(exchange, None)
+        if previous is None:
+            return False
+        del self._sorted[bisect_left(self._sorted, previous)]
+        return True
+    
+    def __len__(self) -> int:
+        return len(self._sorted)
+    
+    def __contains__(self, exchange: str) -> bool:
+        return exchange in self.prices
+    
+    def median(self) -> float:
+        values = self._sorted
+        n = len(values)
+        if not n:
+            return 0.0
+        mid = n // 2
+        return values[mid] if n % 2 else (values[mid - 1] + values[mid]) / 2
+    
+    def mad(self) -> float:
+        """Median absolute deviation from the median"""
+        values = self._sorted
+        n = len(values)
+        if n < 2:
+            return 0.0
+        median = self.median()
+        
+        # Deviations grow walking away from the median on either side, so
+        # merge the two runs up to the middle rank(s)
+        right = bisect_left(values, median)
+        left = right - 1
+        low = high = 0.0
+        for rank in range(n // 2 + 1):
+            if right >= n or (left >= 0 and median - values[left] <= values[right] - median):
+                deviation = median - values[left]
+                left -= 1
+            else:
+                deviation = values[right] - median
+                right += 1
+            if rank == (n - 1) // 2:
+                low = deviation
+            high = deviation
+        return (low + high) / 2
+
+
 class AnomalyDetector:
     """
     Detects anomalies in price feeds.
@@ -400,21 +500,33 @@ class AnomalyDetector:
     2. Price spikes - Sudden large price movements
     3. Manipulation - Prices that deviate significantly from consensus
     4. Desync - Exchange out of sync with others
+    
+    Consensus is the median across live venues, so one bad venue can't
+    drag it. With three or more venues a desync must also be an outlier
+    against the venues' own dispersion (robust z-score from the MAD).
+    Feeds found stale by `sweep_stale` leave the consensus until they
+    quote again.
     """
     
+    # Scales MAD to a standard deviation for normally distributed prices
+    MAD_SCALE = 1.4826
+    
     def __init__(
         self,
         stale_threshold_seconds: float = 3.0,
         spike_threshold_percent: float = 1.0,
-        desync_threshold_percent: float = 0.5
+        desync_threshold_percent: float = 0.5,
+        desync_z_threshold: float = 3.0
     ):
         self.stale_threshold = stale_threshold_seconds
         self.spike_threshold = spike_threshold_percent
         self.desync_threshold = desync_threshold_percent
+        self.desync_z_threshold = desync_z_threshold
         
         # Price tracking
         self.last_prices: Dict[Tuple[str, str], Tuple[float, datetime]] = {}
-        self.all_prices: Dict[str, Dict[str, float]] = {}  # pair -> exchange -> price
+        self.consensus: Dict[str, VenueConsensus] = {}  # pair -> live venues
+        self.stale: set = set()  # (exchange, pair) feeds reported stale and not yet recovered
         
         # Anomaly history
         self.anomalies: List[Anomaly] = []
@@ -454,45 +566,83 @@ class AnomalyDetector:
         
         # Update tracking
         self.last_prices[key] = (price, timestamp)
+        self.stale.discard(key)
         
-        if pair not in self.all_prices:
-            self.all_prices[pair] = {}
-        self.all_prices[pair][exchange] = price
+        consensus = self.consensus.get(pair)
+        if consensus is None:
+            consensus = self.consensus[pair] = VenueConsensus()
+        consensus.update(exchange, price)
         
         # Check for desync (after updating)
-        if not anomaly and len(self.all_prices.get(pair, {})) > 1:
-            prices = list(self.all_prices[pair].values())
-            mean_price = sum(prices) / len(prices)
-            
-            if mean_price > 0:
-                deviation_percent = abs(price - mean_price) / mean_price * 100
-                
-                if deviation_percent > self.desync_threshold:
-                    anomaly = Anomaly(
-                        exchange=exchange,
-                        pair=pair,
-                        anomaly_type="desync",
-                        severity=min(1.0, deviation_percent / 2),
-                        details={
-                            "exchange_price": price,
-                            "consensus_price": mean_price,
-                            "deviation_percent": round(deviation_percent, 2),
-                        },
-                        timestamp=timestamp
-                    )
+        if not anomaly and len(consensus) > 1:
+            anomaly = self._check_desync(exchange, pair, price, consensus, timestamp)
         
         if anomaly:
-            self.anomalies.append(anomaly)
-            if len(self.anomalies) > 100:
-                self.anomalies.pop(0)
-            
-            logger.warning(
-                f"⚠️ ANOMALY: {exchange} {pair} | {anomaly.anomaly_type} | "
-                f"Severity: {anomaly.severity:.0%}"
-            )
+            self._record(anomaly)
         
         return anomaly
     
+    def _check_desync(
+        self,
+        exchange: str,
+        pair: str,
+        price: float,
+        consensus: VenueConsensus,
+        timestamp: datetime
+    ) -> Optional[Anomaly]:
+        median = consensus.median()
+        if median <= 0:
+            return None
+        
+        deviation_percent = abs(price - median) / median * 100
+        if deviation_percent <= self.desync_threshold:
+            return None
+        
+        robust_z = None
+        if len(consensus) >= 3:
+            spread = self.MAD_SCALE * consensus.mad()
+            robust_z = abs(price - median) / spread if spread > 0 else math.inf
+            if robust_z <= self.desync_z_threshold:
+                return None  # Venues disagree broadly; this one isn't the outlier
+        
+        return Anomaly(
+            exchange=exchange,
+            pair=pair,
+            anomaly_type="desync",
+            severity=min(1.0, deviation_percent / 2),
+            details={
+                "exchange_price": price,
+                "consensus_price": median,
+                "deviation_percent": round(deviation_percent, 2),
+                "robust_z": round(robust_z, 2) if robust_z is not None and math.isfinite(robust_z) else None,
+                "venues": len(consensus),
+            },
+            timestamp=timestamp
+        )
+    
+    def _record(self, anomaly: Anomaly):
+        self.anomalies.append(anomaly)
+        if len(self.anomalies) > 100:
+            self.anomalies.pop(0)
+        
+        logger.warning(
+            f"⚠️ ANOMALY: {anomaly.exchange} {anomaly.pair} | {anomaly.anomaly_type} | "
+            f"Severity: {anomaly.severity:.0%}"
+        )
+    
+    def _stale_anomaly(self, exchange: str, pair: str, price: float, age: float, now: datetime) -> Anomaly:
+        return Anomaly(
+            exchange=exchange,
+            pair=pair,
+            anomaly_type="stale",
+            severity=min(1.0, age / 10),
+            details={
+                "last_price": price,
+                "age_seconds": round(age, 1),
+            },
+            timestamp=now
+        )
+    
     def check_stale(self) -> List[Anomaly]:
         """Check all feeds for staleness"""
         now = datetime.now()
@@ -502,20 +652,38 @@ class AnomalyDetector:
             age = (now - last_update).total_seconds()
             
             if age > self.stale_threshold:
-                anomaly = Anomaly(
-                    exchange=exchange,
-                    pair=pair,
-                    anomaly_type="stale",
-                    severity=min(1.0, age / 10),
-                    details={
-                        "last_price": price,
-                        "age_seconds": round(age, 1),
-                    },
-                    timestamp=now
-                )
-                stale_anomalies.append(anomaly)
+                stale_anomalies.append(self._stale_anomaly(exchange, pair, price, age, now))
         
         return stale_anomalies
+    
+    def sweep_stale(self, now: Optional[datetime] = None) -> List[Anomaly]:
+        """
+        Report feeds that went stale since the last sweep.
+        
+        Each stale episode is reported once and the venue leaves its pair's
+        consensus, so a frozen price can't flag live venues as desynced.
+        """
+        now = now or datetime.now()
+        newly_stale = []
+        
+        for key, (price, last_update) in self.last_prices.items():
+            if key in self.stale:
+                continue
+            age = (now - last_update).total_seconds()
+            if age <= self.stale_threshold:
+                continue
+            
+            exchange, pair = key
+            self.stale.add(key)
+            consensus = self.consensus.get(pair)
+            if consensus is not None:
+                consensus.remove(exchange)
+            
+            anomaly = self._stale_anomaly(exchange, pair, price, age, now)
+            self._record(anomaly)
+            newly_stale.append(anomaly)
+        
+        return newly_stale
 
 
 class MarketRegimeClassifier:
@@ -598,10 +766,19 @@ class MLEngine:
     Combined ML engine with all prediction capabilities.
     """
     
-    def __init__(self):
+    def __init__(self, inference=None):
+        """
+        Args:
+            inference: Optional InferenceService; when set, opportunity
+                predictions run on its workers instead of inline per tick
+        """
         self.opportunity_predictor = OpportunityPredictor()
         self.anomaly_detector = AnomalyDetector()
         self.regime_classifier = MarketRegimeClassifier()
+        self.inference = inference
+        
+        # Guards the predictor's feature windows against worker-thread reads
+        self._lock = threading.Lock()
         
         # Callbacks
         self._on_prediction_callbacks: List = []
@@ -628,21 +805,50 @@ class MLEngine:
         mid = (bid + ask) / 2
         
         # Update all components
-        self.opportunity_predictor.update(exchange, pair, bid, ask, timestamp)
+        with self._lock:
+            self.opportunity_predictor.update(exchange, pair, bid, ask, timestamp)
         self.regime_classifier.update(pair, mid, timestamp)
         
         # Check for anomalies
         anomaly = self.anomaly_detector.check(exchange, pair, mid, timestamp)
         if anomaly:
-            for callback in self._on_anomaly_callbacks:
-                try:
-                    callback(anomaly)
-                except Exception as e:
-                    logger.error(f"Anomaly callback error: {e}")
-        
-        # Generate predictions
-        prediction = self.opportunity_predictor.predict(pair)
+            self._notify_anomaly(anomaly)
         
+        # Generate predictions (coalesced per pair when off-loaded)
+        if self.inference is not None:
+            self.inference.schedule(("opportunity", pair), lambda: self.predict(pair), self._notify_prediction)
+        else:
+            self._notify_prediction(self.predict(pair))
+    
+    def sweep_stale(self, now: Optional[datetime] = None) -> List[Anomaly]:
+        """Timer-driven staleness check; notifies for newly stale feeds"""
+        anomalies = self.anomaly_detector.sweep_stale(now)
+        for anomaly in anomalies:
+            self._notify_anomaly(anomaly)
+        return anomalies
+    
+    async def run_stale_sweep(self, interval_seconds: float = 1.0):
+        """Sweep for stale feeds every interval until cancelled"""
+        while True:
+            try:
+                self.sweep_stale()
+            except Exception as e:
+                logger.error(f"Stale sweep error: {e}")
+            await asyncio.sleep(interval_seconds)
+    
+    def _notify_anomaly(self, anomaly: Anomaly):
+        for callback in self._on_anomaly_callbacks:
+            try:
+                callback(anomaly)
+            except Exception as e:
+                logger.error(f"Anomaly callback error: {e}")
+    
+    def predict(self, pair: str) -> Prediction:
+        """Opportunity prediction for a pair (safe to call from worker threads)"""
+        with self._lock:
+            return self.opportunity_predictor.predict(pair)
+    
+    def _notify_prediction(self, prediction: Prediction):
         # Only notify for high-probability predictions
         if prediction.probability > 0.5:
             for callback in self._on_prediction_callbacks:
@@ -671,10 +877,27 @@ class MLEngine:
                 "anomaly_detector": {
                     "stale_threshold_s": self.anomaly_detector.stale_threshold,
                     "spike_threshold_pct": self.anomaly_detector.spike_threshold,
+                    "desync_threshold_pct": self.anomaly_detector.desync_threshold,
+                    "desync_z_threshold": self.anomaly_detector.desync_z_threshold,
+                    "consensus": "median/MAD",
+                    "stale_feeds": len(self.anomaly_detector.stale),
                 },
                 "regime_classifier": {
                     "window": self.regime_classifier.window,
                     "regimes": ["stable", "volatile", "trending_up", "trending_down"],
                 },
-            }
+            },
+            "cache": {
+                "features": self._cache_stats(self.opportunity_predictor.feature_extractor),
+                "predictions": self._cache_stats(self.opportunity_predictor),
+            },
+        }
+    
+    @staticmethod
+    def _cache_stats(source) -> dict:
+        lookups = source.cache_hits + source.cache_misses
+        return {
+            "hits": source.cache_hits,
+            "misses": source.cache_misses,
+            "hit_rate": round(source.cache_hits / lookups, 4) if lookups else 0.0,
         }
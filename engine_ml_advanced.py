@@ -24,17 +24,26 @@ Goal: Predict arbitrage windows 500ms-2s ahead with confidence scores
 
 import logging
 import math
+import threading
 import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Tuple, Any
+from typing import Optional, List, Dict, Tuple, Any, Callable
 from collections import deque, defaultdict
 from enum import Enum
 import json
 import os
 
+from engine_ringbuffer import RingBuffer, RollingMoments, PairRingBuffers
+from engine_leadlag import LeadLagAnalyzer
+from engine_metrics import metrics_engine
+from engine_outcomes import OutcomeTracker
+
 logger = logging.getLogger(__name__)
 
+# Length of AdvancedFeatures.to_vector()
+FEATURE_COUNT = 54
+
 # Try to import ML libraries
 try:
     import numpy as np
@@ -108,7 +117,7 @@ class AdvancedFeatures:
     # Cross-exchange features
     price_dispersion: float = 0.0  # Std of prices across exchanges
     max_cross_spread: float = 0.0  # Max bid-ask spread across exchanges
-    lead_lag_score: float = 0.0    # Which exchange leads
+    lead_lag_score: float = 0.0    # Lead of the first exchange over the others (seconds)
     correlation_strength: float = 0.0
     
     # Volatility features
@@ -239,6 +248,45 @@ class AdvancedFeatures:
         }
 
 
+class WilderRSI:
+    """
+    Wilder's RSI, updated in O(1) per price change.
+    
+    The first `period` changes seed simple averages of gains and losses;
+    after that each change is folded in with Wilder smoothing:
+    avg = (avg * (period - 1) + change) / period
+    """
+    
+    __slots__ = ("period", "avg_gain", "avg_loss", "count")
+    
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.count = 0
+    
+    def update(self, change: float):
+        gain = change if change > 0 else 0.0
+        loss = -change if change < 0 else 0.0
+        
+        if self.count < self.period:
+            self.count += 1
+            self.avg_gain += (gain - self.avg_gain) / self.count
+            self.avg_loss += (loss - self.avg_loss) / self.count
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+    
+    @property
+    def value(self) -> float:
+        if self.count < self.period:
+            return 50.0
+        if self.avg_loss == 0:
+            return 100.0
+        rs = self.avg_gain / self.avg_loss
+        return 100 - (100 / (1 + rs))
+
+
 class AdvancedFeatureExtractor:
     """
     Extracts advanced features from raw market data.
@@ -248,26 +296,40 @@ class AdvancedFeatureExtractor:
     - Technical indicator computation
     - Cross-exchange analysis
     - Volatility estimation
+    
+    Windows are preallocated NumPy ring buffers with a per-pair exchange
+    index. Indicators (RSI, MACD, Bollinger, spread moments, volatility)
+    are streaming accumulators advanced in `update()`, so `extract()`
+    only reads precomputed state.
+    
+    Each pair has a data version bumped on every tick. `extract()` keeps
+    the last snapshot per pair and returns it while the version is
+    unchanged, so repeated polls between ticks cost a dict lookup. Time
+    based meta features in a reused snapshot are as of its extraction.
+    
+    Lead-lag comes from a LeadLagAnalyzer fed from `update()`; extraction
+    reads its cached estimate.
     """
     
     WINDOW_SHORT = 10    # ~1 second
     WINDOW_MEDIUM = 50   # ~5 seconds
     WINDOW_LONG = 300    # ~30 seconds
     
-    def __init__(self):
-        # Price history: (exchange, pair) -> deque of (price, timestamp)
-        self.prices: Dict[Tuple[str, str], deque] = defaultdict(
-            lambda: deque(maxlen=self.WINDOW_LONG)
-        )
+    BOLLINGER_WINDOW = 20
+    VOLATILITY_WINDOWS = (60, 300)  # Price windows; returns use one fewer
+    
+    def __init__(self, lead_lag: Optional[LeadLagAnalyzer] = None):
+        # Price history: (exchange, pair) -> ring buffer of (mid, epoch seconds)
+        self.prices = PairRingBuffers(self.WINDOW_LONG)
         
-        # Spread history: pair -> deque of spread
-        self.spreads: Dict[str, deque] = defaultdict(
-            lambda: deque(maxlen=self.WINDOW_LONG)
+        # Spread history with rolling moments: pair -> window of spread
+        self.spreads: Dict[str, RollingMoments] = defaultdict(
+            lambda: RollingMoments(self.WINDOW_LONG)
         )
         
         # Imbalance history
-        self.imbalances: Dict[str, deque] = defaultdict(
-            lambda: deque(maxlen=self.WINDOW_MEDIUM)
+        self.imbalances: Dict[str, RingBuffer] = defaultdict(
+            lambda: RingBuffer(self.WINDOW_MEDIUM)
         )
         
         # Opportunity tracking
@@ -275,11 +337,29 @@ class AdvancedFeatureExtractor:
         self.opportunity_times: deque = deque(maxlen=100)
         
         # Technical indicator states
-        self.rsi_gains: Dict[str, deque] = defaultdict(lambda: deque(maxlen=14))
-        self.rsi_losses: Dict[str, deque] = defaultdict(lambda: deque(maxlen=14))
+        self.rsi: Dict[str, WilderRSI] = defaultdict(WilderRSI)
+        self.bollinger: Dict[Tuple[str, str], RollingMoments] = defaultdict(
+            lambda: RollingMoments(self.BOLLINGER_WINDOW)
+        )
+        
+        # Tick returns per (exchange, pair), one window per volatility horizon
+        self.returns: Dict[Tuple[str, str], Dict[int, RollingMoments]] = defaultdict(
+            lambda: {w: RollingMoments(w - 1) for w in self.VOLATILITY_WINDOWS}
+        )
+        
         self.ema_12: Dict[str, float] = {}
         self.ema_26: Dict[str, float] = {}
         self.ema_signal: Dict[str, float] = {}
+        
+        # Cross-exchange lead-lag, estimated periodically off the tick path
+        self.lead_lag = lead_lag if lead_lag is not None else LeadLagAnalyzer()
+        
+        # Data versions and the feature snapshot taken at each
+        self.versions: Dict[str, int] = defaultdict(int)
+        self.opportunity_version = 0
+        self._snapshots: Dict[str, Tuple[Tuple[int, int], AdvancedFeatures]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
     
     def update(
         self,
@@ -296,10 +376,8 @@ class AdvancedFeatureExtractor:
         mid = (bid + ask) / 2
         spread = ask - bid
         
-        key = (exchange, pair)
-        
         # Update price history
-        self.prices[key].append((mid, timestamp))
+        prices = self.prices.append(exchange, pair, mid, timestamp.timestamp())
         
         # Update spread history
         self.spreads[pair].append(spread)
@@ -309,20 +387,25 @@ class AdvancedFeatureExtractor:
             imbalance = (bid_size - ask_size) / (bid_size + ask_size)
             self.imbalances[pair].append(imbalance)
         
-        # Update RSI components
-        if len(self.prices[key]) >= 2:
-            prev_price = self.prices[key][-2][0]
-            change = mid - prev_price
+        key = (exchange, pair)
+        self.bollinger[key].append(mid)
+        
+        # Update RSI and return windows
+        if len(prices) >= 2:
+            prev_price = prices[-2]
+            self.rsi[pair].update(mid - prev_price)
             
-            if change > 0:
-                self.rsi_gains[pair].append(change)
-                self.rsi_losses[pair].append(0)
-            else:
-                self.rsi_gains[pair].append(0)
-                self.rsi_losses[pair].append(abs(change))
+            if prev_price != 0:
+                tick_return = (mid - prev_price) / prev_price
+                for moments in self.returns[key].values():
+                    moments.append(tick_return)
         
         # Update EMAs for MACD
         self._update_ema(pair, mid)
+        
+        self.lead_lag.update(exchange, pair, mid, timestamp)
+        
+        self.versions[pair] += 1
     
     def _update_ema(self, pair: str, price: float):
         """Update exponential moving averages"""
@@ -344,18 +427,76 @@ class AdvancedFeatureExtractor:
             macd = self.ema_12[pair] - self.ema_26[pair]
             self.ema_signal[pair] = macd * k_signal + self.ema_signal[pair] * (1 - k_signal)
     
+    def active_pairs(self, max_age_seconds: Optional[float] = None) -> List[str]:
+        """Pairs with data, optionally only those quoted within `max_age_seconds`"""
+        if max_age_seconds is None:
+            return list(self.prices.by_pair)
+        
+        cutoff = datetime.now().timestamp() - max_age_seconds
+        return [
+            pair for pair, buffers in self.prices.by_pair.items()
+            if any(buffer.latest_time >= cutoff for buffer in buffers.values())
+        ]
+    
     def record_opportunity(self, timestamp: Optional[datetime] = None):
         """Record when an opportunity was detected"""
         timestamp = timestamp or datetime.now()
         self.last_opportunity_time = timestamp
         self.opportunity_times.append(timestamp)
+        self.opportunity_version += 1
     
-    def extract(self, pair: str) -> AdvancedFeatures:
+    def version(self, pair: str) -> Tuple[int, int]:
+        """Data version of a pair (its tick count, plus the opportunity log's)"""
+        return self.versions.get(pair, 0), self.opportunity_version
+    
+    def snapshot(self, pair: str) -> Optional[AdvancedFeatures]:
+        """Cached features for a pair if still current, without extracting"""
+        cached = self._snapshots.get(pair)
+        if cached is not None and cached[0] == self.version(pair):
+            return cached[1]
+        return None
+    
+    def last_snapshot(self, pair: str) -> Optional[AdvancedFeatures]:
+        """Most recently extracted features for a pair, current or not"""
+        cached = self._snapshots.get(pair)
+        return cached[1] if cached is not None else None
+    
+    def extract(self, pair: str, now: Optional[datetime] = None) -> AdvancedFeatures:
+        """
+        Features for a trading pair, reused until its data version changes.
+        
+        The snapshot is shared between callers; treat it as read-only.
+        `now` overrides the wall clock for replayed data.
+        """
+        features = self.snapshot(pair)
+        if features is not None:
+            self.cache_hits += 1
+            metrics_engine.record_ml_cache("advanced", "features", hit=True)
+            return features
+        
+        self.cache_misses += 1
+        metrics_engine.record_ml_cache("advanced", "features", hit=False)
+        features = self._extract(pair, now)
+        if pair in self.versions:  # Don't cache pairs that have never quoted
+            self._snapshots[pair] = (self.version(pair), features)
+        return features
+    
+    def cache_stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+        }
+    
+    def _extract(self, pair: str, now: Optional[datetime] = None) -> AdvancedFeatures:
         """Extract all features for a trading pair"""
-        features = AdvancedFeatures(timestamp=datetime.now())
+        now = now or datetime.now()
+        features = AdvancedFeatures(timestamp=now)
         
-        # Collect all exchanges for this pair
-        exchanges = [ex for (ex, p) in self.prices.keys() if p == pair]
+        # Collect all exchanges for this pair (per-pair index, no scan)
+        buffers = self.prices.for_pair(pair)
+        exchanges = list(buffers)
         features.exchange_count = len(exchanges)
         
         if not exchanges:
@@ -363,59 +504,57 @@ class AdvancedFeatureExtractor:
         
         # ===== PRICE FEATURES =====
         all_prices = []
-        for ex in exchanges:
-            key = (ex, pair)
-            if key in self.prices and len(self.prices[key]) >= 2:
-                prices = list(self.prices[key])
+        for ex, buffer in buffers.items():
+            if len(buffer) >= 2:
+                prices = buffer.values()
                 
                 # Velocity (price change per tick)
-                velocity = (prices[-1][0] - prices[-2][0]) / prices[-2][0] if prices[-2][0] != 0 else 0
+                velocity = float((prices[-1] - prices[-2]) / prices[-2]) if prices[-2] != 0 else 0
                 features.price_velocity[ex] = velocity
                 
                 # Acceleration
                 if len(prices) >= 3:
-                    prev_velocity = (prices[-2][0] - prices[-3][0]) / prices[-3][0] if prices[-3][0] != 0 else 0
+                    prev_velocity = float((prices[-2] - prices[-3]) / prices[-3]) if prices[-3] != 0 else 0
                     features.price_acceleration[ex] = velocity - prev_velocity
                 
                 # Momentum (5s and 30s)
                 if len(prices) >= self.WINDOW_SHORT:
-                    features.price_momentum_5s[ex] = (prices[-1][0] - prices[-self.WINDOW_SHORT][0]) / prices[-self.WINDOW_SHORT][0]
+                    features.price_momentum_5s[ex] = float((prices[-1] - prices[-self.WINDOW_SHORT]) / prices[-self.WINDOW_SHORT])
                 
                 if len(prices) >= self.WINDOW_LONG:
-                    features.price_momentum_30s[ex] = (prices[-1][0] - prices[-self.WINDOW_LONG][0]) / prices[-self.WINDOW_LONG][0]
+                    features.price_momentum_30s[ex] = float((prices[-1] - prices[-self.WINDOW_LONG]) / prices[-self.WINDOW_LONG])
                 
-                all_prices.append(prices[-1][0])
+                all_prices.append(float(prices[-1]))
         
         # ===== SPREAD FEATURES =====
         if pair in self.spreads and len(self.spreads[pair]) > 0:
-            spreads = list(self.spreads[pair])
-            features.spread_current = spreads[-1]
-            features.spread_mean = sum(spreads) / len(spreads)
+            spreads = self.spreads[pair]
+            features.spread_current = spreads.latest
+            features.spread_mean = spreads.mean()
             
             if len(spreads) >= 2:
-                features.spread_std = self._std(spreads)
+                features.spread_std = spreads.std()
                 if features.spread_std > 0:
                     features.spread_z_score = (features.spread_current - features.spread_mean) / features.spread_std
                 
                 # Spread momentum
-                recent = spreads[-min(10, len(spreads)):]
-                features.spread_momentum = (recent[-1] - recent[0]) if len(recent) > 1 else 0
+                features.spread_momentum = spreads.latest - spreads[-min(10, len(spreads))]
                 
                 # Spread skew
                 if len(spreads) >= 10:
-                    features.spread_skew = self._skewness(spreads)
+                    features.spread_skew = spreads.skewness()
         
         # ===== ORDER BOOK FEATURES =====
         if pair in self.imbalances and len(self.imbalances[pair]) > 0:
-            imbalances = list(self.imbalances[pair])
-            features.imbalance = imbalances[-1]
-            features.top_level_imbalance = imbalances[-1]
+            imbalances = self.imbalances[pair]
+            features.imbalance = imbalances.latest
+            features.top_level_imbalance = imbalances.latest
             
             if len(imbalances) >= 2:
-                features.imbalance_momentum = imbalances[-1] - imbalances[0]
+                features.imbalance_momentum = imbalances.latest - imbalances[0]
         
         # ===== TECHNICAL INDICATORS =====
-        features.rsi_14 = self._calculate_rsi(pair)
+        features.rsi_14 = self.rsi[pair].value if pair in self.rsi else 50.0
         
         # MACD
         if pair in self.ema_12:
@@ -425,25 +564,24 @@ class AdvancedFeatureExtractor:
         
         # Bollinger position (requires std calculation)
         if exchanges and pair in self.spreads:
-            key = (exchanges[0], pair)
-            if key in self.prices and len(self.prices[key]) >= 20:
-                prices = [p[0] for p in list(self.prices[key])[-20:]]
-                mean = sum(prices) / len(prices)
-                std = self._std(prices)
+            window = self.bollinger[(exchanges[0], pair)]
+            if len(window) >= self.BOLLINGER_WINDOW:
+                mean = window.mean()
+                std = window.std()
                 
                 if std > 0:
-                    current = prices[-1]
+                    current = window.latest
                     upper = mean + 2 * std
                     lower = mean - 2 * std
                     features.bollinger_position = (current - lower) / (upper - lower) if upper != lower else 0.5
         
         # ===== CROSS-EXCHANGE FEATURES =====
         if len(all_prices) > 1:
-            features.price_dispersion = self._std(all_prices) / (sum(all_prices) / len(all_prices))
+            features.price_dispersion = self._std(np.array(all_prices)) / (sum(all_prices) / len(all_prices))
             features.max_cross_spread = max(all_prices) - min(all_prices)
             
             # Lead-lag score (which exchange leads)
-            features.lead_lag_score = self._calculate_lead_lag(pair, exchanges)
+            features.lead_lag_score = self._lead_lag_score(pair, exchanges)
         
         # ===== VOLATILITY FEATURES =====
         features.volatility_1m = self._calculate_volatility(pair, exchanges, window=60)
@@ -461,7 +599,6 @@ class AdvancedFeatureExtractor:
             features.volatility_regime = "normal"
         
         # ===== META FEATURES =====
-        now = datetime.now()
         if self.last_opportunity_time:
             features.seconds_since_last_opp = (now - self.last_opportunity_time).total_seconds()
         
@@ -471,74 +608,23 @@ class AdvancedFeatureExtractor:
         
         return features
     
-    def _std(self, values: List[float]) -> float:
+    def _std(self, values: np.ndarray) -> float:
         """Calculate standard deviation"""
         if len(values) < 2:
             return 0.0
-        mean = sum(values) / len(values)
-        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1)
-        return math.sqrt(variance)
-    
-    def _skewness(self, values: List[float]) -> float:
-        """Calculate skewness"""
-        if len(values) < 3:
-            return 0.0
-        n = len(values)
-        mean = sum(values) / n
-        std = self._std(values)
-        if std == 0:
-            return 0.0
-        
-        skew = sum((v - mean) ** 3 for v in values) / (n * std ** 3)
-        return skew
+        return float(values.std(ddof=1))
     
-    def _calculate_rsi(self, pair: str) -> float:
-        """Calculate RSI (Relative Strength Index)"""
-        if pair not in self.rsi_gains or len(self.rsi_gains[pair]) < 14:
-            return 50.0
-        
-        gains = list(self.rsi_gains[pair])
-        losses = list(self.rsi_losses[pair])
-        
-        avg_gain = sum(gains) / len(gains)
-        avg_loss = sum(losses) / len(losses)
-        
-        if avg_loss == 0:
-            return 100.0
-        
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        return rsi
-    
-    def _calculate_lead_lag(self, pair: str, exchanges: List[str]) -> float:
-        """Calculate which exchange leads in price discovery"""
-        # Simplified: compare recent price changes
-        if len(exchanges) < 2:
-            return 0.0
-        
-        scores = {}
-        for ex in exchanges:
-            key = (ex, pair)
-            if key in self.prices and len(self.prices[key]) >= 5:
-                prices = [p[0] for p in list(self.prices[key])[-5:]]
-                change = (prices[-1] - prices[0]) / prices[0] if prices[0] != 0 else 0
-                scores[ex] = change
-        
-        if not scores:
+    def _lead_lag_score(self, pair: str, exchanges: List[str]) -> float:
+        """Cached lead of the first exchange over the others, in seconds"""
+        estimate = self.lead_lag.estimate(pair)
+        if estimate is None:
             return 0.0
         
-        # Return normalized score of first exchange relative to mean
-        mean_change = sum(scores.values()) / len(scores)
-        first_ex = exchanges[0]
-        
-        if first_ex in scores:
-            return (scores[first_ex] - mean_change) * 100
-        
-        return 0.0
+        lead = estimate.lead_ms(exchanges[0])
+        return lead / 1000 if lead is not None else 0.0
     
     def _calculate_volatility(self, pair: str, exchanges: List[str], window: int = 60) -> float:
-        """Calculate volatility (standard deviation of returns)"""
+        """Volatility (standard deviation of tick returns) over a price window"""
         if not exchanges:
             return 0.0
         
@@ -546,17 +632,11 @@ class AdvancedFeatureExtractor:
         if key not in self.prices or len(self.prices[key]) < 10:
             return 0.0
         
-        prices = [p[0] for p in list(self.prices[key])[-min(window, len(self.prices[key])):]]
-        
-        if len(prices) < 2:
-            return 0.0
-        
-        returns = [(prices[i] - prices[i-1]) / prices[i-1] for i in range(1, len(prices)) if prices[i-1] != 0]
-        
-        if not returns:
+        returns = self.returns[key][window]
+        if len(returns) < 2:
             return 0.0
         
-        return self._std(returns)
+        return returns.std()
 
 
 @dataclass
@@ -595,51 +675,100 @@ class ONNXPredictor:
     - GPU acceleration
     """
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        intra_op_threads: int = 4,
+        inter_op_threads: int = 1,
+        max_batch: int = 64
+    ):
+        """
+        Args:
+            model_path: Path to the .onnx model
+            intra_op_threads: Threads used inside each operator
+            inter_op_threads: Threads running independent operators (>1 enables parallel mode)
+            max_batch: Rows in the preallocated input buffer
+        """
         self.model_path = model_path
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.max_batch = max_batch
         self.session: Optional[Any] = None
         self.input_name: Optional[str] = None
         self.output_name: Optional[str] = None
         
+        # Contiguous float32 input, reused by every run. Hold `buffer_lock`
+        # from filling the buffer until the run returns.
+        self.input_buffer = np.zeros((max_batch, FEATURE_COUNT), dtype=np.float32)
+        self.buffer_lock = threading.Lock()
+        
         if HAS_ONNX and model_path and os.path.exists(model_path):
             self._load_model(model_path)
     
     def _load_model(self, path: str):
         """Load ONNX model"""
         try:
-            # Configure session options for performance
-            sess_options = ort.SessionOptions()
-            sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-            sess_options.intra_op_num_threads = 4
-            
-            # Try GPU first, fall back to CPU
-            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-            
-            self.session = ort.InferenceSession(path, sess_options, providers=providers)
-            self.input_name = self.session.get_inputs()[0].name
-            self.output_name = self.session.get_outputs()[0].name
-            
+            self.swap(self.create_session(path), path)
             logger.info(f"Loaded ONNX model from {path}")
         except Exception as e:
             logger.error(f"Failed to load ONNX model: {e}")
             self.session = None
     
+    def create_session(self, path: str) -> Any:
+        """Build an InferenceSession with this predictor's options (raises on failure)"""
+        # Configure session options for performance
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = self.intra_op_threads
+        sess_options.inter_op_num_threads = self.inter_op_threads
+        if self.inter_op_threads > 1:
+            sess_options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        
+        # Try GPU first, fall back to CPU
+        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        
+        return ort.InferenceSession(path, sess_options, providers=providers)
+    
+    def swap(self, session: Any, path: Optional[str] = None) -> Any:
+        """
+        Atomically replace the session, returning the previous one.
+        
+        Runs hold `buffer_lock`, so an in-flight run finishes on the old
+        session and the next one starts on the new session.
+        """
+        input_name = session.get_inputs()[0].name
+        output_name = session.get_outputs()[0].name
+        
+        with self.buffer_lock:
+            previous = self.session
+            self.session = session
+            self.input_name = input_name
+            self.output_name = output_name
+            self.model_path = path
+        return previous
+    
     def predict(self, features: List[float]) -> Optional[float]:
         """Run inference on feature vector"""
         if self.session is None:
             return None
         
+        with self.buffer_lock:
+            self.input_buffer[0] = features
+            probabilities = self.predict_batch(self.input_buffer[:1])
+        return None if probabilities is None else float(probabilities[0])
+    
+    def predict_batch(self, batch: np.ndarray) -> Optional[np.ndarray]:
+        """Run one inference over a (rows, FEATURE_COUNT) float32 matrix"""
+        if self.session is None:
+            return None
+        
         try:
-            # Convert to numpy array with correct shape
-            input_data = np.array([features], dtype=np.float32)
-            
-            # Run inference
             outputs = self.session.run(
                 [self.output_name],
-                {self.input_name: input_data}
+                {self.input_name: batch}
             )
             
-            return float(outputs[0][0])
+            return np.asarray(outputs[0], dtype=np.float64).reshape(len(batch), -1)[:, 0]
         except Exception as e:
             logger.error(f"ONNX inference error: {e}")
             return None
@@ -696,6 +825,45 @@ class RuleBasedPredictor:
         
         # Clamp to [0, 1]
         return max(0, min(1, score))
+    
+    # Column positions in AdvancedFeatures.to_vector()
+    VELOCITY_COLUMNS = [0, 4, 8, 12, 16]
+    ACCELERATION_COLUMNS = [1, 5, 9, 13, 17]
+    COLUMNS = {
+        'spread_z_score': 22,
+        'spread_momentum': 23,
+        'imbalance': 26,
+        'imbalance_momentum': 27,
+        'price_dispersion': 40,
+        'volatility_ratio': 46,
+    }
+    
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Vectorized `predict` over a (rows, FEATURE_COUNT) feature matrix.
+        
+        Identical to the scalar path for up to five exchanges per pair (the
+        vector only carries velocity/acceleration for the first five).
+        """
+        w = self.WEIGHTS
+        c = self.COLUMNS
+        x = batch.astype(np.float64, copy=False)
+        
+        velocity = np.abs(x[:, self.VELOCITY_COLUMNS]).max(axis=1)
+        acceleration = np.abs(x[:, self.ACCELERATION_COLUMNS]).max(axis=1)
+        
+        score = (
+            w['price_velocity'] * np.minimum(1, velocity * 100)
+            + w['price_acceleration'] * np.minimum(1, acceleration * 200)
+            + w['spread_z_score'] * np.minimum(1, np.abs(x[:, c['spread_z_score']]) / 3)
+            + w['spread_momentum'] * np.minimum(1, np.abs(x[:, c['spread_momentum']]) * 1000)
+            + w['imbalance'] * np.minimum(1, np.abs(x[:, c['imbalance']]))
+            + w['imbalance_momentum'] * np.minimum(1, np.abs(x[:, c['imbalance_momentum']]) * 2)
+            + w['volatility_ratio'] * np.clip(x[:, c['volatility_ratio']] - 1, 0, 1)
+            + w['price_dispersion'] * np.minimum(1, x[:, c['price_dispersion']] * 1000)
+        )
+        
+        return np.clip(score, 0, 1)
 
 
 class AdvancedMLEngine:
@@ -713,22 +881,50 @@ class AdvancedMLEngine:
         self,
         model_path: Optional[str] = None,
         prediction_threshold: float = 0.6,
-        time_horizon_ms: int = 500
+        time_horizon_ms: int = 500,
+        intra_op_threads: int = 4,
+        inter_op_threads: int = 1,
+        max_batch: int = 64
     ):
         self.feature_extractor = AdvancedFeatureExtractor()
         self.prediction_threshold = prediction_threshold
         self.time_horizon_ms = time_horizon_ms
         
         # Initialize predictors
-        self.onnx_predictor = ONNXPredictor(model_path)
+        self.onnx_predictor = ONNXPredictor(
+            model_path,
+            intra_op_threads=intra_op_threads,
+            inter_op_threads=inter_op_threads,
+            max_batch=max_batch
+        )
         self.rule_predictor = RuleBasedPredictor()
         
-        # Prediction history for accuracy tracking
+        # Batch stats
+        self.batches_run = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0.0
+        
+        # Memoized predictions: pair -> (features snapshot, model session, result).
+        # Valid while the extractor still returns that snapshot and the same model is loaded.
+        self._memo: Dict[str, Tuple[AdvancedFeatures, Any, PredictionResult]] = {}
+        self.prediction_cache_hits = 0
+        self.prediction_cache_misses = 0
+        
+        # Optional ModelManager (hot reload, shadow scoring)
+        self.model_manager: Optional[Any] = None
+        
+        # Recent predictions, and their labels once the horizon passes
         self.predictions: deque = deque(maxlen=1000)
-        self.prediction_outcomes: deque = deque(maxlen=1000)
+        self.outcomes = OutcomeTracker(time_horizon_ms, prediction_threshold)
         
-        # Callbacks
+        # Guards the feature extractor: ticks arrive on the event loop while
+        # extraction may run on inference worker threads
+        self._lock = threading.Lock()
+        
+        # Callbacks, invoked through `dispatch(callback, result)`. The
+        # inference service swaps in a dispatcher that hops to the event loop.
         self._on_prediction_callbacks: List = []
+        self.dispatch: Callable = lambda callback, result: callback(result)
     
     def on_prediction(self, callback):
         """Register callback for predictions"""
@@ -745,30 +941,139 @@ class AdvancedMLEngine:
         ask_size: float = 1.0
     ):
         """Update with new market data"""
-        self.feature_extractor.update(exchange, pair, bid, ask, timestamp, bid_size, ask_size)
+        with self._lock:
+            self.feature_extractor.update(exchange, pair, bid, ask, timestamp, bid_size, ask_size)
+    
+    def extract(self, pair: str) -> AdvancedFeatures:
+        """Thread-safe feature extraction for one pair"""
+        with self._lock:
+            return self.feature_extractor.extract(pair)
+    
+    def score(self, features: AdvancedFeatures) -> Tuple[float, str]:
+        """Probability and model name (ONNX, or rule-based if unavailable)"""
+        if self.onnx_predictor.is_loaded():
+            probability = self.onnx_predictor.predict(features.to_vector())
+            if probability is not None:
+                return probability, "onnx_lstm"
+        
+        return self.rule_predictor.predict(features), "rule_based"
+    
+    def cached_features(self, pair: str) -> Optional[AdvancedFeatures]:
+        """
+        Last extracted features for a pair, possibly stale.
+        
+        Takes no lock (snapshots are replaced, never mutated), so the event
+        loop can use it while a worker holds the extractor.
+        """
+        return self.feature_extractor.last_snapshot(pair)
+    
+    def cached_prediction(self, pair: str) -> Optional[PredictionResult]:
+        """Last prediction for a pair if no tick or model change has happened since"""
+        memo = self._memo.get(pair)
+        if memo is not None:
+            features, model, result = memo
+            # Lock-free like cached_features: a racing tick only makes this a miss
+            current = self.feature_extractor.snapshot(pair)
+            if current is features and model is self.onnx_predictor.session:
+                self.prediction_cache_hits += 1
+                metrics_engine.record_ml_cache("advanced", "predictions", hit=True)
+                return result
+        
+        self.prediction_cache_misses += 1
+        metrics_engine.record_ml_cache("advanced", "predictions", hit=False)
+        return None
     
     def predict(self, pair: str) -> PredictionResult:
         """Generate prediction for a trading pair"""
+        cached = self.cached_prediction(pair)
+        if cached is not None:
+            return cached
+        
         start_time = time.time()
         
-        # Extract features
-        features = self.feature_extractor.extract(pair)
+        features = self.extract(pair)
+        probability, model_name = self.score(features)
         
-        # Run prediction
-        if self.onnx_predictor.is_loaded():
-            feature_vector = features.to_vector()
-            probability = self.onnx_predictor.predict(feature_vector)
-            if probability is None:
-                probability = self.rule_predictor.predict(features)
-                model_name = "rule_based"
+        inference_time = (time.time() - start_time) * 1000
+        
+        return self.finish_prediction(pair, features, probability, model_name, inference_time)
+    
+    def predict_batch(self, pairs: List[str]) -> Dict[str, PredictionResult]:
+        """
+        Predict for many pairs with one model call.
+        
+        Feature vectors are written into the predictor's preallocated
+        float32 matrix and scored in a single `InferenceSession.run` (or
+        one vectorized rule-based pass). Pairs beyond `max_batch` are
+        scored in further chunks. Pairs with a current memoized
+        prediction are not rescored.
+        """
+        results: Dict[str, PredictionResult] = {}
+        buffer = self.onnx_predictor.input_buffer
+        
+        stale = []
+        for pair in pairs:
+            cached = self.cached_prediction(pair)
+            if cached is not None:
+                results[pair] = cached
             else:
-                model_name = "onnx_lstm"
-        else:
-            probability = self.rule_predictor.predict(features)
-            model_name = "rule_based"
+                stale.append(pair)
+        pairs = stale
         
-        inference_time = (time.time() - start_time) * 1000
+        for offset in range(0, len(pairs), len(buffer)):
+            chunk = pairs[offset:offset + len(buffer)]
+            start_time = time.time()
+            
+            with self._lock:
+                features = [self.feature_extractor.extract(pair) for pair in chunk]
+            
+            with self.onnx_predictor.buffer_lock:
+                batch = buffer[:len(chunk)]
+                for row, f in enumerate(features):
+                    batch[row] = f.to_vector()
+                
+                probabilities = self.onnx_predictor.predict_batch(batch)
+                model_name = "onnx_lstm"
+                if probabilities is None:
+                    probabilities = self.rule_predictor.predict_batch(batch)
+                    model_name = "rule_based"
+            
+            # Amortized per-pair cost of the batch
+            elapsed = (time.time() - start_time) * 1000
+            self.batches_run += 1
+            self.last_batch_size = len(chunk)
+            self.last_batch_ms = elapsed
+            
+            for pair, f, probability in zip(chunk, features, probabilities.tolist()):
+                results[pair] = self.finish_prediction(
+                    pair, f, probability, model_name, elapsed / len(chunk), batch_size=len(chunk)
+                )
         
+        return results
+    
+    def run_cycle(self, max_age_seconds: Optional[float] = 10.0) -> Dict[str, PredictionResult]:
+        """Scheduler entry point: batch-predict every recently active pair"""
+        pairs = self.feature_extractor.active_pairs(max_age_seconds)
+        if not pairs:
+            return {}
+        return self.predict_batch(pairs)
+    
+    def finish_prediction(
+        self,
+        pair: str,
+        features: AdvancedFeatures,
+        probability: float,
+        model_name: str,
+        inference_time: float,
+        batch_size: int = 1,
+        memoize: bool = True
+    ) -> PredictionResult:
+        """
+        Wrap a probability into a PredictionResult, store it and notify.
+        
+        With `memoize`, the result is reused for `pair` until its features
+        change (pass False for stand-in results such as budget fallbacks).
+        """
         # Calculate confidence based on feature quality
         confidence = self._calculate_confidence(features, probability)
         
@@ -784,7 +1089,7 @@ class AdvancedMLEngine:
             probability=probability,
             confidence=confidence,
             time_horizon_ms=self.time_horizon_ms,
-            features_used=len(features.to_vector()),
+            features_used=FEATURE_COUNT,
             inference_time_ms=inference_time,
             model_name=model_name,
             signal=signal,
@@ -793,25 +1098,47 @@ class AdvancedMLEngine:
                 "spread_z_score": round(features.spread_z_score, 3),
                 "imbalance": round(features.imbalance, 3),
                 "exchange_count": features.exchange_count,
+                "batch_size": batch_size,
             }
         )
         
         # Store prediction
-        self.predictions.append((datetime.now(), pair, result))
+        now = datetime.now()
+        self.predictions.append((now, pair, result))
+        epoch = self.outcomes.record_prediction(pair, model_name, probability, now)
+        if memoize:
+            self._memo[pair] = (features, self.onnx_predictor.session, result)
+            if self.model_manager is not None:
+                self.model_manager.observe(pair, features, epoch)
         
         # Notify high-probability predictions
         if probability >= self.prediction_threshold:
             for callback in self._on_prediction_callbacks:
                 try:
-                    callback(result)
+                    self.dispatch(callback, result)
                 except Exception as e:
                     logger.error(f"Prediction callback error: {e}")
         
         return result
     
+    def record_opportunity(self, pair: str, timestamp: Optional[datetime] = None):
+        """Opportunity detected by an engine: feeds features and labels predictions"""
+        timestamp = timestamp or datetime.now()
+        with self._lock:
+            self.feature_extractor.record_opportunity(timestamp)
+        self.outcomes.record_opportunity(pair, timestamp)
+    
     def record_outcome(self, pair: str, had_opportunity: bool):
-        """Record actual outcome for accuracy tracking"""
-        self.prediction_outcomes.append((datetime.now(), pair, had_opportunity))
+        """
+        Record an externally observed outcome for the pair.
+        
+        An opportunity is handed to the outcome tracker like one from
+        `record_opportunity`; predictions (and the model manager's shadow
+        scores) are labelled by the tracker once their horizon passes, and
+        those that saw no opportunity are labelled negative.
+        """
+        if had_opportunity:
+            self.outcomes.record_opportunity(pair)
     
     def _calculate_confidence(self, features: AdvancedFeatures, probability: float) -> float:
         """Calculate confidence in prediction"""
@@ -836,15 +1163,15 @@ class AdvancedMLEngine:
     
     def get_accuracy_metrics(self) -> Dict:
         """Calculate prediction accuracy metrics"""
-        if len(self.prediction_outcomes) < 10:
-            return {"insufficient_data": True}
+        self.outcomes.expire()
+        if self.outcomes.labelled < 10:
+            return {"insufficient_data": True, "pending": self.outcomes.get_state()["pending"]}
         
-        # This would compare predictions vs outcomes
-        # Simplified for demo
         return {
             "total_predictions": len(self.predictions),
-            "total_outcomes": len(self.prediction_outcomes),
+            "total_outcomes": self.outcomes.labelled,
             "model_type": "onnx" if self.onnx_predictor.is_loaded() else "rule_based",
+            **self.outcomes.get_state(),
         }
     
     def get_recent_predictions(self, limit: int = 20) -> List[Dict]:
@@ -861,6 +1188,7 @@ class AdvancedMLEngine:
     
     def get_state(self) -> dict:
         """Get current state for API/dashboard"""
+        prediction_lookups = self.prediction_cache_hits + self.prediction_cache_misses
         return {
             "model_loaded": self.onnx_predictor.is_loaded(),
             "model_type": "onnx" if self.onnx_predictor.is_loaded() else "rule_based",
@@ -868,7 +1196,24 @@ class AdvancedMLEngine:
             "time_horizon_ms": self.time_horizon_ms,
             "recent_predictions": self.get_recent_predictions(10),
             "accuracy_metrics": self.get_accuracy_metrics(),
-            "feature_count": 54,  # Number of features in vector
+            "feature_count": FEATURE_COUNT,  # Number of features in vector
+            "cache": {
+                "features": self.feature_extractor.cache_stats(),
+                "predictions": {
+                    "hits": self.prediction_cache_hits,
+                    "misses": self.prediction_cache_misses,
+                    "hit_rate": round(self.prediction_cache_hits / prediction_lookups, 4) if prediction_lookups else 0.0,
+                },
+            },
+            "lead_lag": self.feature_extractor.lead_lag.get_state(),
+            "batching": {
+                "batches_run": self.batches_run,
+                "last_batch_size": self.last_batch_size,
+                "last_batch_ms": round(self.last_batch_ms, 3),
+                "max_batch": self.onnx_predictor.max_batch,
+                "intra_op_threads": self.onnx_predictor.intra_op_threads,
+                "inter_op_threads": self.onnx_predictor.inter_op_threads,
+            },
         }
 
 
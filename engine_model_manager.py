@@ -0,0 +1,315 @@
+"""
+ONNX Model Hot Reload and Shadow Scoring
+
+Watches a model directory and keeps the engine's ONNXPredictor current:
+- The newest `*.onnx` file in the directory is served. A new or rewritten
+  file is loaded into a fresh session on the watcher thread and swapped in
+  atomically, so predictions never pause and feature windows stay warm
+- A file that fails to load is skipped; the current model keeps serving
+- The newest file in `<dir>/shadow/` is a candidate, scored alongside the
+  live model on a sampled fraction of predictions. Shadow runs happen on
+  their own thread, off the prediction path, and the candidate's latency
+  and accuracy are tracked separately from the live model's
+
+Layout:
+    models/
+        predictor_v4.onnx      <- served
+        shadow/
+            predictor_v5.onnx  <- shadow candidate
+"""
+
+import glob
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from engine_ml_advanced import AdvancedMLEngine, AdvancedFeatures, ONNXPredictor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelStats:
+    """Latency and accuracy of one loaded model"""
+    path: Optional[str]
+    loaded_at: float = field(default_factory=time.time)
+    predictions: int = 0
+    latencies_ms: deque = field(default_factory=lambda: deque(maxlen=1000))
+    outcomes: int = 0
+    correct: int = 0
+    brier_sum: float = 0.0
+    
+    def score(self, probability: float, had_opportunity: bool, threshold: float):
+        self.outcomes += 1
+        self.correct += int((probability >= threshold) == had_opportunity)
+        self.brier_sum += (probability - float(had_opportunity)) ** 2
+    
+    def to_dict(self) -> dict:
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else None
+        return {
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "predictions": self.predictions,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies is not None else None,
+            "latency_p99_ms": round(float(np.percentile(latencies, 99)), 3) if latencies is not None else None,
+            "outcomes": self.outcomes,
+            "accuracy": round(self.correct / self.outcomes, 4) if self.outcomes else None,
+            "brier_score": round(self.brier_sum / self.outcomes, 4) if self.outcomes else None,
+        }
+
+
+class ModelManager:
+    """
+    Hot-reloads the live ONNX model and shadow-scores a candidate.
+    
+    Call `start()` for a background watcher, or `poll()` directly.
+    Accuracy is scored in `record_outcome()`, fed by the engine's outcome
+    tracker as each prediction is labelled; the label carries the
+    prediction's epoch, which matches it to its own shadow probability.
+    """
+    
+    SHADOW_DIR = "shadow"
+    
+    def __init__(
+        self,
+        engine: AdvancedMLEngine,
+        model_dir: str,
+        poll_seconds: float = 5.0,
+        shadow_fraction: float = 0.0,
+        settle_seconds: float = 2.0,
+        max_shadow_inflight: int = 32,
+        session_factory: Optional[Callable[[str], Any]] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            engine: Engine whose ONNX predictor is managed
+            model_dir: Directory watched for `*.onnx` files
+            poll_seconds: Seconds between directory scans
+            shadow_fraction: Share of predictions also scored by the shadow model
+            settle_seconds: Ignore files modified more recently (still being written)
+            max_shadow_inflight: Queued shadow runs before samples are dropped
+            session_factory: Builds a session from a path (defaults to the predictor's)
+            seed: Seed for shadow sampling
+        """
+        self.engine = engine
+        self.predictor = engine.onnx_predictor
+        self.model_dir = model_dir
+        self.shadow_dir = os.path.join(model_dir, self.SHADOW_DIR)
+        self.poll_seconds = poll_seconds
+        self.shadow_fraction = shadow_fraction
+        self.settle_seconds = settle_seconds
+        self.max_shadow_inflight = max_shadow_inflight
+        self.session_factory = session_factory or self.predictor.create_session
+        
+        self.live = ModelStats(self.predictor.model_path) if self.predictor.is_loaded() else None
+        self.shadow: Optional[ONNXPredictor] = None
+        self.shadow_stats: Optional[ModelStats] = None
+        
+        # Last (path, mtime) seen per slot, so each file version is tried once
+        self._seen: Dict[str, Optional[Tuple[str, float]]] = {"live": None, "shadow": None}
+        self.swaps = 0
+        self.failures = 0
+        
+        # pair -> [prediction epoch, shadow probability] per prediction, epoch order
+        self._pending: Dict[str, Deque[List]] = {}
+        self.max_pending = engine.outcomes.max_pending
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._shadow_inflight = 0
+        self.shadow_dropped = 0
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-shadow")
+        
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        engine.model_manager = self
+        engine.outcomes.on_label(self.record_outcome)
+    
+    # ===== WATCHING =====
+    
+    def start(self):
+        """Poll the model directory on a background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._watch, name="ml-model-watcher", daemon=True)
+        self._thread.start()
+    
+    def _watch(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Model watcher error: {e}")
+            if self._stop.wait(self.poll_seconds):
+                break
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_seconds + 1)
+        self._shadow_executor.shutdown(wait=False)
+    
+    def _newest(self, directory: str) -> Optional[Tuple[str, float]]:
+        """Newest settled `*.onnx` file in a directory as (path, mtime)"""
+        cutoff = time.time() - self.settle_seconds
+        newest = None
+        for path in glob.glob(os.path.join(directory, "*.onnx")):
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue  # Removed mid-scan
+            if mtime <= cutoff and (newest is None or mtime > newest[1]):
+                newest = (path, mtime)
+        return newest
+    
+    def poll(self) -> bool:
+        """Scan once, loading changed files. Returns True if the live model was swapped."""
+        swapped = False
+        
+        latest = self._newest(self.model_dir)
+        if latest is not None and latest != self._seen["live"]:
+            self._seen["live"] = latest
+            swapped = self._load_live(latest[0])
+        
+        latest = self._newest(self.shadow_dir)
+        if latest != self._seen["shadow"]:
+            self._seen["shadow"] = latest
+            if latest is None:
+                self.clear_shadow()
+            else:
+                self._load_shadow(latest[0])
+        
+        return swapped
+    
+    def _create(self, path: str) -> Optional[Any]:
+        try:
+            return self.session_factory(path)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ Failed to load model {path}: {e}")
+            return None
+    
+    def _load_live(self, path: str) -> bool:
+        session = self._create(path)
+        if session is None:
+            return False
+        
+        self.predictor.swap(session, path)
+        self.live = ModelStats(path)
+        self.swaps += 1
+        logger.info(f"🔄 Serving ONNX model {os.path.basename(path)}")
+        return True
+    
+    def _load_shadow(self, path: str):
+        session = self._create(path)
+        if session is None:
+            return
+        
+        shadow = ONNXPredictor(
+            intra_op_threads=self.predictor.intra_op_threads,
+            inter_op_threads=self.predictor.inter_op_threads,
+            max_batch=1
+        )
+        shadow.swap(session, path)
+        with self._lock:
+            self.shadow = shadow
+            self.shadow_stats = ModelStats(path)
+        logger.info(f"👥 Shadow scoring {os.path.basename(path)} on {self.shadow_fraction:.0%} of predictions")
+    
+    def clear_shadow(self):
+        with self._lock:
+            self.shadow = None
+            self.shadow_stats = None
+    
+    def promote_shadow(self) -> bool:
+        """Serve the shadow model live, keeping its stats"""
+        with self._lock:
+            shadow, stats = self.shadow, self.shadow_stats
+            self.shadow = self.shadow_stats = None
+        if shadow is None:
+            return False
+        
+        self.predictor.swap(shadow.session, shadow.model_path)
+        self.live = stats
+        self.swaps += 1
+        logger.info(f"⬆️ Promoted shadow model {os.path.basename(shadow.model_path or '')}")
+        return True
+    
+    # ===== SHADOW SCORING =====
+    
+    def observe(self, pair: str, features: AdvancedFeatures, epoch: float):
+        """Called for every live prediction; samples some for the shadow model"""
+        entry = [epoch, None]
+        queue = self._pending.get(pair)
+        if queue is None:
+            queue = self._pending.setdefault(pair, deque(maxlen=self.max_pending))
+        queue.append(entry)
+        if self.live is not None:
+            self.live.predictions += 1
+        
+        shadow = self.shadow
+        if shadow is None or self._rng.random() >= self.shadow_fraction:
+            return
+        
+        with self._lock:
+            if self._shadow_inflight >= self.max_shadow_inflight:
+                self.shadow_dropped += 1
+                return
+            self._shadow_inflight += 1
+        self._shadow_executor.submit(self._run_shadow, shadow, self.shadow_stats, entry, features.to_vector())
+    
+    def _run_shadow(self, shadow: ONNXPredictor, stats: ModelStats, entry: List, vector: List[float]):
+        try:
+            start = time.perf_counter()
+            probability = shadow.predict(vector)
+            elapsed = (time.perf_counter() - start) * 1000
+            
+            if probability is not None:
+                entry[1] = probability
+                with self._lock:
+                    stats.predictions += 1
+                    stats.latencies_ms.append(elapsed)
+        finally:
+            with self._lock:
+                self._shadow_inflight -= 1
+    
+    def record_outcome(self, pair: str, model: str, probability: float, had_opportunity: bool, epoch: float):
+        """Score one labelled prediction, live and (if sampled) shadow"""
+        threshold = self.engine.prediction_threshold
+        with self._lock:
+            # Labels arrive in prediction order; older entries were never labelled
+            queue = self._pending.get(pair)
+            entry = None
+            while queue and queue[0][0] <= epoch:
+                entry = queue.popleft()
+                if entry[0] == epoch:
+                    break
+                entry = None
+            if entry is None:
+                return  # Not a prediction this manager observed
+            
+            if self.live is not None:
+                self.live.score(probability, had_opportunity, threshold)
+            shadow_probability = entry[1]
+            if shadow_probability is not None and self.shadow_stats is not None:
+                self.shadow_stats.score(shadow_probability, had_opportunity, threshold)
+    
+    def get_state(self) -> dict:
+        return {
+            "model_dir": self.model_dir,
+            "live": self.live.to_dict() if self.live else None,
+            "shadow": self.shadow_stats.to_dict() if self.shadow_stats else None,
+            "shadow_fraction": self.shadow_fraction,
+            "shadow_dropped": self.shadow_dropped,
+            "swaps": self.swaps,
+            "load_failures": self.failures,
+        }
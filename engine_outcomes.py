@@ -0,0 +1,279 @@
+"""
+Prediction Outcome Tracking
+
+Joins ML predictions with what actually happened:
+- Every prediction waits in a deadline-ordered queue until its
+  `time_horizon_ms` has passed, then is labelled automatically: positive
+  if the detection engines reported an opportunity on its pair inside
+  the horizon
+- Per model, labels update a confusion matrix, calibration buckets and a
+  rolling accuracy window, all as running counters, so accuracy reads
+  never rescan history
+- Rolling accuracy is published on the `ml_model_accuracy` gauge
+
+Predictions share one horizon and arrive in time order, so deadlines are
+already sorted and expiry is a pop from the front of a deque. Opportunity
+times per pair are consumed the same way, giving O(1) amortized labelling.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from engine_metrics import metrics_engine
+
+logger = logging.getLogger(__name__)
+
+Timestamp = Union[datetime, float, None]
+
+
+@dataclass
+class ModelScorecard:
+    """Running outcome counters for one model"""
+    model: str
+    threshold: float
+    buckets: int = 10
+    rolling_window: int = 1000
+    tp: int = 0
+    fp: int = 0
+    tn: int = 0
+    fn: int = 0
+    brier_sum: float = 0.0
+    bucket_counts: np.ndarray = field(init=False, repr=False)
+    bucket_probability_sums: np.ndarray = field(init=False, repr=False)
+    bucket_positives: np.ndarray = field(init=False, repr=False)
+    recent: deque = field(default_factory=deque, repr=False)  # Correctness of the latest labels
+    recent_correct: int = 0
+    
+    def __post_init__(self):
+        self.bucket_counts = np.zeros(self.buckets, dtype=np.int64)
+        self.bucket_probability_sums = np.zeros(self.buckets)
+        self.bucket_positives = np.zeros(self.buckets, dtype=np.int64)
+    
+    def record(self, probability: float, had_opportunity: bool):
+        predicted = probability >= self.threshold
+        if predicted:
+            if had_opportunity:
+                self.tp += 1
+            else:
+                self.fp += 1
+        elif had_opportunity:
+            self.fn += 1
+        else:
+            self.tn += 1
+        
+        self.brier_sum += (probability - float(had_opportunity)) ** 2
+        
+        bucket = min(self.buckets - 1, max(0, int(probability * self.buckets)))
+        self.bucket_counts[bucket] += 1
+        self.bucket_probability_sums[bucket] += probability
+        self.bucket_positives[bucket] += int(had_opportunity)
+        
+        correct = predicted == had_opportunity
+        self.recent.append(correct)
+        self.recent_correct += correct
+        if len(self.recent) > self.rolling_window:
+            self.recent_correct -= self.recent.popleft()
+    
+    @property
+    def total(self) -> int:
+        return self.tp + self.fp + self.tn + self.fn
+    
+    @property
+    def accuracy(self) -> Optional[float]:
+        return (self.tp + self.tn) / self.total if self.total else None
+    
+    @property
+    def rolling_accuracy(self) -> Optional[float]:
+        return self.recent_correct / len(self.recent) if self.recent else None
+    
+    @property
+    def precision(self) -> Optional[float]:
+        return self.tp / (self.tp + self.fp) if self.tp + self.fp else None
+    
+    @property
+    def recall(self) -> Optional[float]:
+        return self.tp / (self.tp + self.fn) if self.tp + self.fn else None
+    
+    def calibration(self) -> List[dict]:
+        """Mean predicted probability vs observed rate per non-empty bucket"""
+        return [
+            {
+                "bucket": f"{i / self.buckets:.1f}-{(i + 1) / self.buckets:.1f}",
+                "count": int(count),
+                "mean_probability": round(float(self.bucket_probability_sums[i] / count), 4),
+                "observed_rate": round(float(self.bucket_positives[i] / count), 4),
+            }
+            for i, count in enumerate(self.bucket_counts) if count
+        ]
+    
+    def expected_calibration_error(self) -> Optional[float]:
+        if not self.total:
+            return None
+        counts = self.bucket_counts
+        mask = counts > 0
+        gap = np.abs(self.bucket_probability_sums[mask] - self.bucket_positives[mask])  # count * |mean p - rate|
+        return float(gap.sum() / self.total)
+    
+    def to_dict(self) -> dict:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return round(value, 4) if value is not None else None
+        
+        ece = self.expected_calibration_error()
+        return {
+            "model": self.model,
+            "labelled": self.total,
+            "confusion_matrix": {"tp": self.tp, "fp": self.fp, "tn": self.tn, "fn": self.fn},
+            "accuracy": rounded(self.accuracy),
+            "rolling_accuracy": rounded(self.rolling_accuracy),
+            "rolling_window": len(self.recent),
+            "precision": rounded(self.precision),
+            "recall": rounded(self.recall),
+            "brier_score": rounded(self.brier_sum / self.total if self.total else None),
+            "expected_calibration_error": rounded(ece),
+            "calibration": self.calibration(),
+        }
+
+
+class OutcomeTracker:
+    """
+    Labels predictions once their horizon expires.
+    
+    Call `record_prediction` for each prediction and `record_opportunity`
+    whenever an engine detects one. Expiry runs lazily on those calls (and
+    on `expire()`), so no timer is needed.
+    """
+    
+    def __init__(
+        self,
+        time_horizon_ms: int = 500,
+        threshold: float = 0.6,
+        rolling_window: int = 1000,
+        buckets: int = 10,
+        max_pending: int = 100000
+    ):
+        """
+        Args:
+            time_horizon_ms: How long after a prediction an opportunity counts
+            threshold: Probability at or above which a prediction is positive
+            rolling_window: Labels in the rolling accuracy window (per model)
+            buckets: Calibration buckets over [0, 1]
+            max_pending: Unlabelled predictions kept before the oldest are dropped
+        """
+        self.horizon = time_horizon_ms / 1000
+        self.threshold = threshold
+        self.rolling_window = rolling_window
+        self.buckets = buckets
+        self.max_pending = max_pending
+        
+        # (deadline, epoch, pair, model, probability), deadline order
+        self._pending: Deque[Tuple[float, float, str, str, float]] = deque()
+        # pair -> opportunity times not yet consumed, time order
+        self._opportunities: Dict[str, Deque[float]] = {}
+        
+        self.scorecards: Dict[str, ModelScorecard] = {}
+        self.dropped = 0
+        self._lock = threading.Lock()  # Predictions may be finished on inference workers
+        self._on_label_callbacks: List[Callable] = []
+    
+    def on_label(self, callback: Callable[[str, str, float, bool, float], None]):
+        """Register callback(pair, model, probability, had_opportunity, epoch)"""
+        self._on_label_callbacks.append(callback)
+    
+    @staticmethod
+    def _epoch(timestamp: Timestamp) -> float:
+        if timestamp is None:
+            return time.time()
+        if isinstance(timestamp, datetime):
+            return timestamp.timestamp()
+        return float(timestamp)
+    
+    def record_prediction(self, pair: str, model: str, probability: float, timestamp: Timestamp = None) -> float:
+        """Queue a prediction for labelling; returns its epoch, which its label carries"""
+        epoch = self._epoch(timestamp)
+        self.expire(epoch)
+        
+        with self._lock:
+            self._pending.append((epoch + self.horizon, epoch, pair, model, probability))
+            if len(self._pending) > self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+        return epoch
+    
+    def record_opportunity(self, pair: str, timestamp: Timestamp = None):
+        epoch = self._epoch(timestamp)
+        with self._lock:
+            events = self._opportunities.get(pair)
+            if events is None:
+                events = self._opportunities[pair] = deque()
+            if not events or epoch >= events[-1]:
+                events.append(epoch)
+            
+            # Only opportunities after the oldest waiting prediction can still match
+            oldest = self._pending[0][1] if self._pending else epoch
+            while events and events[0] <= oldest:
+                events.popleft()
+        self.expire(epoch)
+    
+    def expire(self, now: Timestamp = None) -> int:
+        """Label every prediction whose horizon has passed; returns how many"""
+        now = self._epoch(now)
+        labels = []
+        with self._lock:
+            pending = self._pending
+            while pending and pending[0][0] <= now:
+                labels.append(self._label(*pending.popleft()))
+        
+        for pair, model, probability, had_opportunity, epoch in labels:
+            for callback in self._on_label_callbacks:
+                try:
+                    callback(pair, model, probability, had_opportunity, epoch)
+                except Exception as e:
+                    logger.error(f"Outcome callback error: {e}")
+        
+        for model in {label[1] for label in labels}:
+            metrics_engine.record_ml_accuracy(model, self.scorecards[model].rolling_accuracy)
+        
+        return len(labels)
+    
+    def _label(self, deadline: float, epoch: float, pair: str, model: str, probability: float):
+        """Score one expired prediction (lock held)"""
+        # Earlier predictions of this pair are already labelled, so
+        # opportunities at or before this one's time are spent
+        events = self._opportunities.get(pair)
+        had_opportunity = False
+        if events:
+            while events and events[0] <= epoch:
+                events.popleft()
+            had_opportunity = bool(events) and events[0] <= deadline
+        
+        self._scorecard(model).record(probability, had_opportunity)
+        return pair, model, probability, had_opportunity, epoch
+    
+    def _scorecard(self, model: str) -> ModelScorecard:
+        scorecard = self.scorecards.get(model)
+        if scorecard is None:
+            scorecard = self.scorecards[model] = ModelScorecard(
+                model, self.threshold, self.buckets, self.rolling_window
+            )
+        return scorecard
+    
+    @property
+    def labelled(self) -> int:
+        return sum(s.total for s in self.scorecards.values())
+    
+    def get_state(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "labelled": self.labelled,
+            "dropped": self.dropped,
+            "time_horizon_ms": int(self.horizon * 1000),
+            "threshold": self.threshold,
+            "models": {model: s.to_dict() for model, s in self.scorecards.items()},
+        }
@@ -171,7 +171,8 @@ class ReplaySession:
             pair=self.config.pairs[0] if self.config.pairs and len(self.config.pairs) == 1 else None,
             start=start,
             end=end,
-            limit=1000000
+            limit=1000000,
+            ascending=True
         )
         
         for tick_data in ticks:
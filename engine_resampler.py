@@ -0,0 +1,214 @@
+"""
+Time-Aligned Mid Price Resampler
+
+Turns irregular per-exchange ticks into a regular grid:
+- Fixed cadence (e.g. one row every 100ms)
+- As-of join: each row holds the last mid price seen before the row time
+- Array-backed ring buffer, one column per (exchange, pair)
+
+Cross-series statistics (correlation, spreads, lead-lag) are only
+meaningful on aligned observations. Pairing the last N ticks of two
+feeds by index mixes different points in time, and recomputing on
+every tick of every leg wastes CPU. Consumers subscribe to the sample
+clock instead and read aligned windows as NumPy arrays.
+
+The clock is driven by tick timestamps, so live feeds and historical
+replay resample identically.
+"""
+
+import logging
+import math
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MidPriceResampler:
+    """
+    Samples the latest mid price of every (exchange, pair) on a fixed grid.
+    
+    `update()` is O(1) on the tick path: it only records the latest value.
+    When a tick crosses one or more grid boundaries, the pending rows are
+    written (forward-filling quiet series) and sample callbacks fire once
+    with the newest row time.
+    
+    Reads (`window`, `snapshot`) return copies and are safe to call from
+    worker threads.
+    """
+    
+    def __init__(
+        self,
+        interval_ms: int = 100,
+        capacity: int = 3000,
+        max_gap_samples: int = 50,
+        initial_columns: int = 16
+    ):
+        """
+        Args:
+            interval_ms: Grid spacing in milliseconds
+            capacity: Rows kept in the ring buffer (3000 x 100ms = 5 minutes)
+            max_gap_samples: Rows forward-filled after a gap before skipping ahead
+            initial_columns: Preallocated column slots (grown by doubling)
+        """
+        self.interval = interval_ms / 1000
+        self.interval_ms = interval_ms
+        self.capacity = capacity
+        self.max_gap_samples = max_gap_samples
+        
+        # Column registry: (exchange, pair) -> column index
+        self.columns: Dict[Tuple[str, str], int] = {}
+        self.keys: List[Tuple[str, str]] = []
+        
+        # Latest value per column, copied into a row at each boundary
+        self._latest = np.full(initial_columns, np.nan)
+        
+        # Ring buffer: row times (epoch seconds) and values
+        self.times = np.zeros(capacity)
+        self.values = np.full((capacity, initial_columns), np.nan)
+        self.count = 0  # Total rows ever written
+        
+        self.next_time: Optional[float] = None
+        self.samples_skipped = 0
+        
+        self._lock = threading.Lock()
+        self._on_sample_callbacks: List[Callable[[float], None]] = []
+    
+    def on_sample(self, callback: Callable[[float], None]):
+        """Register callback fired with the newest row time after sampling"""
+        self._on_sample_callbacks.append(callback)
+    
+    def update(self, exchange: str, pair: str, mid: float, timestamp: Union[datetime, float, None] = None):
+        """Record the latest mid price, emitting any grid rows it crosses"""
+        ts = self._to_epoch(timestamp)
+        
+        if self.next_time is None:
+            self.next_time = (math.floor(ts / self.interval) + 1) * self.interval
+        elif ts >= self.next_time:
+            self._emit_until(ts)
+        
+        key = (exchange, pair)
+        col = self.columns.get(key)
+        if col is None:
+            col = self._add_column(key)
+        self._latest[col] = mid
+    
+    def advance(self, timestamp: Union[datetime, float, None] = None) -> int:
+        """Emit rows up to `timestamp` without a tick (e.g. from a timer)"""
+        ts = self._to_epoch(timestamp)
+        if self.next_time is None or ts < self.next_time:
+            return 0
+        return self._emit_until(ts)
+    
+    def _emit_until(self, ts: float) -> int:
+        """Write every grid row with time <= ts"""
+        pending = int((ts - self.next_time) // self.interval) + 1
+        
+        if pending > self.max_gap_samples:
+            # Long gap: don't flood the buffer with identical rows
+            skipped = pending - self.max_gap_samples
+            self.next_time += skipped * self.interval
+            self.samples_skipped += skipped
+            pending = self.max_gap_samples
+        
+        with self._lock:
+            for _ in range(pending):
+                row = self.count % self.capacity
+                self.values[row, :] = self._latest
+                self.times[row] = self.next_time
+                self.count += 1
+                self.next_time += self.interval
+        
+        sample_time = self.next_time - self.interval
+        for callback in self._on_sample_callbacks:
+            try:
+                callback(sample_time)
+            except Exception as e:
+                logger.error(f"Resampler callback error: {e}")
+        
+        return pending
+    
+    def _add_column(self, key: Tuple[str, str]) -> int:
+        """Register a new series, growing the arrays if needed"""
+        col = len(self.keys)
+        
+        if col >= self._latest.shape[0]:
+            width = self._latest.shape[0] * 2
+            with self._lock:
+                latest = np.full(width, np.nan)
+                latest[:col] = self._latest
+                values = np.full((self.capacity, width), np.nan)
+                values[:, :col] = self.values
+                self._latest, self.values = latest, values
+        
+        self.columns[key] = col
+        self.keys.append(key)
+        return col
+    
+    @staticmethod
+    def _to_epoch(timestamp: Union[datetime, float, None]) -> float:
+        if timestamp is None:
+            return datetime.now().timestamp()
+        if isinstance(timestamp, datetime):
+            return timestamp.timestamp()
+        return float(timestamp)
+    
+    def __len__(self) -> int:
+        """Number of rows currently held"""
+        return min(self.count, self.capacity)
+    
+    def _row_order(self, n: Optional[int]) -> np.ndarray:
+        """Ring indices of the newest n rows, oldest first"""
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self.count
+        return np.arange(end - n, end) % self.capacity
+    
+    def window(
+        self,
+        keys: List[Tuple[str, str]],
+        n: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Aligned window for the given series.
+        
+        Returns (times, values) with values shaped (rows, len(keys)),
+        oldest row first. Series without data yet are all-NaN.
+        """
+        with self._lock:
+            rows = self._row_order(n)
+            times = self.times[rows]
+            cols = [self.columns.get(k, -1) for k in keys]
+            values = np.full((len(rows), len(keys)), np.nan)
+            for i, col in enumerate(cols):
+                if col >= 0:
+                    values[:, i] = self.values[rows, col]
+        return times, values
+    
+    def snapshot(self, n: Optional[int] = None) -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray]:
+        """Copy of every series: (keys, times, values)"""
+        with self._lock:
+            keys = list(self.keys)
+            rows = self._row_order(n)
+            return keys, self.times[rows], self.values[np.ix_(rows, np.arange(len(keys)))]
+    
+    def latest(self, exchange: str, pair: str) -> Optional[float]:
+        """Most recent sampled value for a series"""
+        col = self.columns.get((exchange, pair))
+        if col is None or self.count == 0:
+            return None
+        value = self.values[(self.count - 1) % self.capacity, col]
+        return None if np.isnan(value) else float(value)
+    
+    def get_state(self) -> dict:
+        return {
+            "interval_ms": self.interval_ms,
+            "series": len(self.keys),
+            "rows": len(self),
+            "capacity": self.capacity,
+            "samples_written": self.count,
+            "samples_skipped": self.samples_skipped,
+        }
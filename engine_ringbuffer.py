@@ -0,0 +1,238 @@
+"""
+Preallocated NumPy Ring Buffers
+
+Fixed-capacity (value, timestamp) series for per-tick feature windows:
+- O(1) append with no allocation after construction
+- Windows of the newest N samples are NumPy views (no copying)
+- Per-pair index of exchange buffers, so feature extraction for one pair
+  never scans the series of every other pair
+- Windowed moments (mean, std, skew) maintained in O(1) per sample
+
+Each sample is written twice, at slot i and slot i + capacity. The newest
+N samples are then always one contiguous slice of the backing array,
+whatever the write position, which is what makes windows zero-copy.
+"""
+
+from typing import Dict, Iterator, Optional, Tuple
+
+import math
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring buffer with a float64 value column and an epoch
+    seconds timestamp column.
+    
+    `values()` and `times()` return read-only views oldest first. They
+    alias the buffer, so copy them if they must outlive later appends.
+    """
+    
+    __slots__ = ("capacity", "_values", "_times", "_head", "_size")
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._values = np.zeros(2 * capacity)
+        self._times = np.zeros(2 * capacity)
+        self._head = 0  # Next write slot in [0, capacity)
+        self._size = 0
+    
+    def append(self, value: float, timestamp: float = 0.0):
+        head = self._head
+        mirror = head + self.capacity
+        self._values[head] = self._values[mirror] = value
+        self._times[head] = self._times[mirror] = timestamp
+        
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def _window(self, column: np.ndarray, n: Optional[int]) -> np.ndarray:
+        end = self._head + self.capacity
+        n = self._size if n is None else min(n, self._size)
+        view = column[end - n:end]
+        view.flags.writeable = False
+        return view
+    
+    def values(self, n: Optional[int] = None) -> np.ndarray:
+        """Newest n values (all if None), oldest first"""
+        return self._window(self._values, n)
+    
+    def times(self, n: Optional[int] = None) -> np.ndarray:
+        """Timestamps matching `values(n)`"""
+        return self._window(self._times, n)
+    
+    def __getitem__(self, index: int) -> float:
+        """Single value by position: 0 is the oldest, -1 the newest"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("ring buffer index out of range")
+        return float(self._values[self._head + self.capacity - self._size + index])
+    
+    @property
+    def latest(self) -> float:
+        return self[-1]
+    
+    @property
+    def latest_time(self) -> float:
+        return float(self._times[self._head + self.capacity - 1]) if self._size else 0.0
+    
+    def time_span(self) -> float:
+        """Seconds between the oldest and newest sample"""
+        if self._size < 2:
+            return 0.0
+        end = self._head + self.capacity
+        return float(self._times[end - 1] - self._times[end - self._size])
+    
+    def clear(self):
+        self._head = 0
+        self._size = 0
+
+
+class RollingMoments:
+    """
+    Count, mean, variance and skewness over a sliding window, O(1) per sample.
+    
+    Keeps power sums of (x - shift) for the values in a RingBuffer; the
+    evicted value is subtracted as each new one arrives. Shifting by a
+    recent value keeps the sums well conditioned for prices far from zero,
+    and the sums are rebuilt from the window once every `window` samples
+    so floating point drift can't accumulate.
+    """
+    
+    __slots__ = ("window", "buffer", "_shift", "_s1", "_s2", "_s3", "_since_rebuild")
+    
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = RingBuffer(window)
+        self._shift: Optional[float] = None
+        self._s1 = 0.0
+        self._s2 = 0.0
+        self._s3 = 0.0
+        self._since_rebuild = 0
+    
+    def append(self, value: float, timestamp: float = 0.0):
+        if self._shift is None:
+            self._shift = value
+        
+        if len(self.buffer) == self.window:
+            evicted = self.buffer[0] - self._shift
+            self._s1 -= evicted
+            self._s2 -= evicted * evicted
+            self._s3 -= evicted * evicted * evicted
+        
+        self.buffer.append(value, timestamp)
+        d = value - self._shift
+        self._s1 += d
+        self._s2 += d * d
+        self._s3 += d * d * d
+        
+        self._since_rebuild += 1
+        if self._since_rebuild >= self.window:
+            self._rebuild()
+    
+    def _rebuild(self):
+        values = self.buffer.values()
+        self._shift = float(values[-1])
+        d = values - self._shift
+        self._s1 = float(d.sum())
+        self._s2 = float(np.dot(d, d))
+        self._s3 = float(np.dot(d * d, d))
+        self._since_rebuild = 0
+    
+    def __len__(self) -> int:
+        return len(self.buffer)
+    
+    def values(self, n: Optional[int] = None) -> np.ndarray:
+        return self.buffer.values(n)
+    
+    def __getitem__(self, index: int) -> float:
+        return self.buffer[index]
+    
+    @property
+    def latest(self) -> float:
+        return self.buffer.latest
+    
+    def mean(self) -> float:
+        n = len(self.buffer)
+        return self._shift + self._s1 / n if n else 0.0
+    
+    def variance(self, ddof: int = 1) -> float:
+        n = len(self.buffer)
+        if n - ddof <= 0:
+            return 0.0
+        m = self._s1 / n
+        central = self._s2 - n * m * m
+        # Cancellation residue from evictions is not real dispersion
+        if central <= 1e-10 * self._s2:
+            return 0.0
+        return central / (n - ddof)
+    
+    def std(self, ddof: int = 1) -> float:
+        return math.sqrt(self.variance(ddof))
+    
+    def skewness(self) -> float:
+        """Third central moment over n * s^3 (s = sample std)"""
+        n = len(self.buffer)
+        if n < 3:
+            return 0.0
+        std = self.std()
+        if std == 0:
+            return 0.0
+        m = self._s1 / n
+        central = self._s3 - 3 * m * self._s2 + 2 * n * m ** 3
+        return central / (n * std ** 3)
+
+
+class PairRingBuffers:
+    """
+    Ring buffers keyed by (exchange, pair) with a per-pair exchange index.
+    
+    Iteration order within a pair is the order exchanges first quoted it.
+    """
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.by_key: Dict[Tuple[str, str], RingBuffer] = {}
+        self.by_pair: Dict[str, Dict[str, RingBuffer]] = {}
+    
+    def get(self, exchange: str, pair: str) -> RingBuffer:
+        """Buffer for a series, created on first use"""
+        buffer = self.by_key.get((exchange, pair))
+        if buffer is None:
+            buffer = RingBuffer(self.capacity)
+            self.by_key[(exchange, pair)] = buffer
+            self.by_pair.setdefault(pair, {})[exchange] = buffer
+        return buffer
+    
+    def append(self, exchange: str, pair: str, value: float, timestamp: float = 0.0) -> RingBuffer:
+        buffer = self.get(exchange, pair)
+        buffer.append(value, timestamp)
+        return buffer
+    
+    def for_pair(self, pair: str) -> Dict[str, RingBuffer]:
+        """exchange -> buffer for one pair (empty if never quoted)"""
+        return self.by_pair.get(pair, {})
+    
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self.by_key
+    
+    def __getitem__(self, key: Tuple[str, str]) -> RingBuffer:
+        return self.by_key[key]
+    
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.by_key)
+    
+    def __len__(self) -> int:
+        return len(self.by_key)
+    
+    def items(self):
+        return self.by_key.items()
+    
+    def keys(self):
+        return self.by_key.keys()
@@ -0,0 +1,437 @@
+"""
+Persistent Tick Segments
+
+Append-only on-disk tick storage that survives restarts:
+- Each (exchange, pair) is a directory of segment files holding fixed-width
+  40-byte records (int64 nanosecond time, float64 bid, ask, bid size, ask size)
+- The active segment is appended to in batches and rotated once it spans
+  `segment_seconds` of tick time or reaches `max_segment_bytes`
+- Every segment keeps a sparse time index (the time of every
+  `index_every`-th record), written beside it as `.idx` when it is sealed
+- Reads map segments with `np.memmap`, so a range scan touches only the
+  pages it returns
+- Sealed segments older than the retention window are deleted on rotation
+
+Layout:
+    data/ticks/
+        binance/
+            BTC%2FUSDT/
+                1704110400000000000.ticks   <- sealed
+                1704110400000000000.idx
+                1704114000000000000.ticks   <- active
+
+Implements the `store` / `query_ticks` / `get_database_stats` interface of
+InMemoryFallback, so `create_tick_storage` can use it in its place.
+"""
+
+import logging
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from engine_storage import NS_PER_SECOND, from_ns, to_ns
+from engine_timescale import TickRecord
+
+logger = logging.getLogger(__name__)
+
+RECORD_DTYPE = np.dtype([
+    ("time_ns", "<i8"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("bid_size", "<f8"),  # NaN = not reported
+    ("ask_size", "<f8"),
+])
+
+SEGMENT_SUFFIX = ".ticks"
+INDEX_SUFFIX = ".idx"
+
+
+class Segment:
+    """
+    One append-only file of records, oldest first.
+    
+    Times within a segment never decrease (the store clamps late ticks),
+    so a range is located by bisecting the sparse index down to one block
+    of `index_every` records and then searching that block.
+    """
+    
+    def __init__(self, path: str, index_every: int):
+        self.path = path
+        self.index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+        self.index_every = index_every
+        self.start_ns = int(os.path.basename(path)[:-len(SEGMENT_SUFFIX)])
+        
+        self.count = 0
+        self.last_ns: Optional[int] = None
+        self.index: List[int] = []  # Time of records 0, index_every, 2 * index_every, ...
+        self.sealed = False
+        
+        self._file = None
+        self._map: Optional[np.ndarray] = None
+    
+    @classmethod
+    def create(cls, directory: str, start_ns: int, index_every: int) -> 'Segment':
+        segment = cls(os.path.join(directory, f"{start_ns}{SEGMENT_SUFFIX}"), index_every)
+        open(segment.path, "ab").close()
+        return segment
+    
+    @classmethod
+    def open(cls, path: str, index_every: int, sealed: bool) -> 'Segment':
+        """Open an existing segment, dropping a torn trailing record"""
+        segment = cls(path, index_every)
+        size = os.path.getsize(path)
+        if size % RECORD_DTYPE.itemsize:
+            logger.warning(f"⚠️ Truncating torn record in {path}")
+            size -= size % RECORD_DTYPE.itemsize
+            os.truncate(path, size)
+        segment.count = size // RECORD_DTYPE.itemsize
+        
+        records = segment.records()
+        if segment.count:
+            segment.last_ns = int(records["time_ns"][-1])
+        
+        expected = -(-segment.count // index_every)
+        index = None
+        if os.path.exists(segment.index_path):
+            index = np.fromfile(segment.index_path, dtype="<i8")
+        if index is None or len(index) != expected:
+            index = records["time_ns"][::index_every]  # Missing or stale: rebuild
+        segment.index = [int(t) for t in index]
+        
+        segment.sealed = sealed
+        return segment
+    
+    @property
+    def nbytes(self) -> int:
+        return self.count * RECORD_DTYPE.itemsize
+    
+    def append(self, records: np.ndarray):
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        self._file.write(records.tobytes())
+        self._file.flush()
+        
+        # Index entries for every multiple of index_every in the new records
+        first = -(-self.count // self.index_every) * self.index_every
+        for position in range(first, self.count + len(records), self.index_every):
+            self.index.append(int(records["time_ns"][position - self.count]))
+        
+        self.count += len(records)
+        self.last_ns = int(records["time_ns"][-1])
+        self._map = None  # Remapped on the next read
+    
+    def seal(self):
+        """Stop appending and persist the sparse index"""
+        self.close()
+        np.asarray(self.index, dtype="<i8").tofile(self.index_path)
+        self.sealed = True
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def delete(self):
+        self.close()
+        self._map = None
+        for path in (self.path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+    
+    def records(self) -> np.ndarray:
+        """Read-only mapped view of every record (no copy)"""
+        if not self.count:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        if self._map is None or len(self._map) != self.count:
+            self._map = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", shape=(self.count,))
+        return self._map
+    
+    def _bisect(self, times: np.ndarray, time_ns: int, side: str) -> int:
+        bisect = bisect_left if side == "left" else bisect_right
+        block = bisect(self.index, time_ns)
+        lo = max(0, (block - 1) * self.index_every)
+        hi = min(len(times), block * self.index_every)
+        return lo + int(np.searchsorted(times[lo:hi], time_ns, side))
+    
+    def search(self, start_ns: Optional[int], end_ns: Optional[int]) -> np.ndarray:
+        """Mapped records with start_ns <= time <= end_ns"""
+        records = self.records()
+        times = records["time_ns"]
+        lo = self._bisect(times, start_ns, "left") if start_ns is not None else 0
+        hi = self._bisect(times, end_ns, "right") if end_ns is not None else self.count
+        return records[lo:max(lo, hi)]
+
+
+class SegmentTickStore:
+    """
+    Persistent tick store on append-only memory-mapped segments.
+    
+    Ticks are buffered per key and written `write_batch` at a time (and on
+    `flush()`, which queries call first), so the tick path does one file
+    write per batch rather than per tick.
+    """
+    
+    def __init__(
+        self,
+        directory: str = "data/ticks",
+        segment_seconds: int = 3600,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        index_every: int = 1024,
+        write_batch: int = 1024,
+        retention_hours: int = 24 * 7
+    ):
+        """
+        Args:
+            directory: Root directory of the per-key segment directories
+            segment_seconds: Tick time spanned by a segment before rotation
+            max_segment_bytes: Segment size before rotation
+            index_every: Records per sparse index entry
+            write_batch: Buffered ticks per key before a write
+            retention_hours: Sealed segments older than this are deleted
+        """
+        self.directory = directory
+        self.segment_ns = segment_seconds * NS_PER_SECOND
+        self.max_segment_bytes = max_segment_bytes
+        self.index_every = index_every
+        self.write_batch = write_batch
+        self.retention = timedelta(hours=retention_hours)
+        
+        # (exchange, pair) -> segments, oldest first; the last one is active
+        self.segments: Dict[Tuple[str, str], List[Segment]] = {}
+        self._pending: Dict[Tuple[str, str], List[Tuple[int, float, float, float, float]]] = {}
+        self._last_ns: Dict[Tuple[str, str], int] = {}
+        
+        self.ticks_stored = 0
+        self.clamped = 0
+        self.rotations = 0
+        self.segments_expired = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+    
+    def _key_dir(self, exchange: str, pair: str) -> str:
+        return os.path.join(self.directory, quote(exchange, safe=""), quote(pair, safe=""))
+    
+    def _load(self):
+        """Reopen the segments left by a previous run"""
+        for exchange_dir in sorted(os.listdir(self.directory)):
+            exchange_path = os.path.join(self.directory, exchange_dir)
+            if not os.path.isdir(exchange_path):
+                continue
+            for pair_dir in sorted(os.listdir(exchange_path)):
+                pair_path = os.path.join(exchange_path, pair_dir)
+                names = sorted(
+                    (name for name in os.listdir(pair_path) if name.endswith(SEGMENT_SUFFIX)),
+                    key=lambda name: int(name[:-len(SEGMENT_SUFFIX)])
+                )
+                if not names:
+                    continue
+                
+                key = (unquote(exchange_dir), unquote(pair_dir))
+                self.segments[key] = [
+                    Segment.open(os.path.join(pair_path, name), self.index_every, sealed=i < len(names) - 1)
+                    for i, name in enumerate(names)
+                ]
+                last = [s.last_ns for s in self.segments[key] if s.last_ns is not None]
+                if last:
+                    self._last_ns[key] = last[-1]
+        
+        if self.segments:
+            total = sum(s.count for segments in self.segments.values() for s in segments)
+            logger.info(f"📂 Reopened {total} ticks in {self.directory}")
+    
+    def store(
+        self,
+        exchange: str,
+        pair: str,
+        bid: float,
+        ask: float,
+        timestamp: Optional[datetime] = None,
+        bid_size: Optional[float] = None,
+        ask_size: Optional[float] = None
+    ):
+        time_ns = to_ns(timestamp or datetime.now())
+        key = (exchange, pair)
+        
+        with self._lock:
+            last = self._last_ns.get(key)
+            if last is not None and time_ns < last:
+                time_ns = last
+                self.clamped += 1
+            self._last_ns[key] = time_ns
+            
+            pending = self._pending.setdefault(key, [])
+            pending.append((
+                time_ns,
+                bid,
+                ask,
+                math.nan if bid_size is None else bid_size,
+                math.nan if ask_size is None else ask_size
+            ))
+            self.ticks_stored += 1
+            
+            if len(pending) >= self.write_batch:
+                self._write(key)
+    
+    def flush(self):
+        """Write every buffered tick"""
+        with self._lock:
+            for key in list(self._pending):
+                self._write(key)
+    
+    def _write(self, key: Tuple[str, str]):
+        """Append a key's buffered ticks to its active segment (lock held)"""
+        pending = self._pending.pop(key, None)
+        if not pending:
+            return
+        
+        records = np.array(pending, dtype=RECORD_DTYPE)
+        self._active(key, int(records["time_ns"][0])).append(records)
+    
+    def _active(self, key: Tuple[str, str], time_ns: int) -> Segment:
+        """Segment to append to, rotating when the active one is full"""
+        segments = self.segments.setdefault(key, [])
+        if segments:
+            active = segments[-1]
+            if time_ns - active.start_ns < self.segment_ns and active.nbytes < self.max_segment_bytes:
+                return active
+            active.seal()
+            self.rotations += 1
+        
+        directory = self._key_dir(*key)
+        os.makedirs(directory, exist_ok=True)
+        if segments and segments[-1].start_ns >= time_ns:
+            time_ns = segments[-1].start_ns + 1  # Keep file names unique and ordered
+        segments.append(Segment.create(directory, time_ns, self.index_every))
+        self._expire(segments, time_ns)
+        return segments[-1]
+    
+    def _expire(self, segments: List[Segment], now_ns: int):
+        """Delete sealed segments wholly older than the retention window"""
+        cutoff = now_ns - int(self.retention.total_seconds() * NS_PER_SECOND)
+        while segments and segments[0].sealed and (segments[0].last_ns is None or segments[0].last_ns < cutoff):
+            segments.pop(0).delete()
+            self.segments_expired += 1
+    
+    def query_ticks(
+        self,
+        exchange: Optional[str] = None,
+        pair: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 10000,
+        ascending: bool = False
+    ) -> List[Dict]:
+        """Ticks in [start, end], newest first unless `ascending` (like the database query)"""
+        start_ns = to_ns(start) if start else None
+        end_ns = to_ns(end) if end else None
+        
+        self.flush()
+        with self._lock:
+            matches = [
+                (key, list(segments)) for key, segments in self.segments.items()
+                if (not exchange or key[0] == exchange) and (not pair or key[1] == pair)
+            ]
+        
+        keys, blocks = [], []
+        for key, segments in matches:
+            block = self._range(segments, start_ns, end_ns, limit, ascending)
+            if len(block):
+                keys.append(key)
+                blocks.append(block)
+        if not blocks:
+            return []
+        
+        records = np.concatenate(blocks)
+        owners = np.repeat(np.arange(len(blocks)), [len(b) for b in blocks])
+        order = np.argsort(records["time_ns"] if ascending else -records["time_ns"], kind="stable")[:limit]
+        
+        result = []
+        for i in order:
+            record = records[i]
+            key_exchange, key_pair = keys[owners[i]]
+            result.append(TickRecord(
+                timestamp=from_ns(int(record["time_ns"])),
+                exchange=key_exchange,
+                pair=key_pair,
+                bid=float(record["bid"]),
+                ask=float(record["ask"]),
+                bid_size=None if math.isnan(record["bid_size"]) else float(record["bid_size"]),
+                ask_size=None if math.isnan(record["ask_size"]) else float(record["ask_size"])
+            ).to_dict())
+        return result
+    
+    @staticmethod
+    def _range(
+        segments: List[Segment],
+        start_ns: Optional[int],
+        end_ns: Optional[int],
+        limit: int,
+        ascending: bool
+    ) -> np.ndarray:
+        """At most `limit` records of one key in range, from the requested end"""
+        blocks = []
+        remaining = limit
+        for segment in (segments if ascending else reversed(segments)):
+            if remaining <= 0:
+                break
+            if not segment.count:
+                continue
+            if end_ns is not None and segment.index[0] > end_ns:
+                continue
+            if start_ns is not None and segment.last_ns < start_ns:
+                continue
+            
+            block = segment.search(start_ns, end_ns)
+            block = block[:remaining] if ascending else block[max(0, len(block) - remaining):]
+            blocks.append(block)
+            remaining -= len(block)
+        
+        if not blocks:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.concatenate(blocks if ascending else blocks[::-1])
+    
+    def get_database_stats(self) -> Dict:
+        with self._lock:
+            segments = [s for key_segments in self.segments.values() for s in key_segments]
+            pending = sum(len(p) for p in self._pending.values())
+            keys = set(self.segments) | set(self._pending)
+        
+        return {
+            "connected": False,
+            "storage_type": "segments",
+            "total_ticks": sum(s.count for s in segments) + pending,
+            "unique_keys": len(keys),
+            "ticks_stored": self.ticks_stored,
+            "ticks_buffered": pending,
+            "segments": len(segments),
+            "disk_bytes": sum(s.nbytes for s in segments),
+            "rotations": self.rotations,
+            "segments_expired": self.segments_expired,
+            "out_of_order_ticks": self.clamped,
+        }
+    
+    def get_state(self) -> dict:
+        return {
+            "storage_type": "segments",
+            "directory": self.directory,
+            "database_stats": self.get_database_stats(),
+            "segment_seconds": self.segment_ns // NS_PER_SECOND,
+            "max_segment_bytes": self.max_segment_bytes,
+            "retention_hours": self.retention.total_seconds() / 3600,
+        }
+    
+    def close(self):
+        """Write buffered ticks and release file handles"""
+        self.flush()
+        with self._lock:
+            for segments in self.segments.values():
+                for segment in segments:
+                    segment.close()
@@ -5,54 +5,32 @@ Implements mean-reversion strategies based on:
 - Pair correlation analysis
 - Z-score based entry/exit signals
 - Cointegration testing
-- Spread analysis
+- Spread analysis on time-aligned (resampled) mid prices
 
 This is more sophisticated than simple price arbitrage as it
 uses statistical relationships rather than direct price differences.
 """
 
 import logging
+import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import deque
 import math
 
+import numpy as np
+
+from engine_jobs import BackgroundJob
+from engine_resampler import MidPriceResampler
+
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class PriceHistory:
-    """Rolling window of prices for a pair/exchange"""
-    max_size: int = 500  # ~5 minutes at 100ms updates
-    prices: deque = field(default_factory=lambda: deque(maxlen=500))
-    timestamps: deque = field(default_factory=lambda: deque(maxlen=500))
-    
-    def add(self, price: float, timestamp: datetime):
-        self.prices.append(price)
-        self.timestamps.append(timestamp)
-    
-    def get_prices(self) -> List[float]:
-        return list(self.prices)
-    
-    def mean(self) -> float:
-        if not self.prices:
-            return 0.0
-        return sum(self.prices) / len(self.prices)
-    
-    def std(self) -> float:
-        if len(self.prices) < 2:
-            return 0.0
-        mean = self.mean()
-        variance = sum((p - mean) ** 2 for p in self.prices) / (len(self.prices) - 1)
-        return math.sqrt(variance)
-    
-    def z_score(self, current_price: float) -> float:
-        """Calculate z-score of current price vs historical distribution"""
-        std = self.std()
-        if std == 0:
-            return 0.0
-        return (current_price - self.mean()) / std
+def _thin_to_grid(values: np.ndarray, interval_ms: int, grid_ms: int) -> Tuple[np.ndarray, float]:
+    """Keep every k-th sample row, anchored at the newest; returns (rows, step seconds)"""
+    stride = max(1, round(grid_ms / interval_ms))
+    return values[::-1][::stride][::-1], stride * interval_ms / 1000
 
 
 @dataclass
@@ -138,6 +116,8 @@ class StatArbSignal:
     correlation: float
     confidence: float  # 0-1 confidence in signal
     timestamp: datetime
+    spread_model: str = "ratio"  # "ratio" or "hedged" (Engle-Granger residual)
+    hedge_ratio: Optional[float] = None
     
     def to_dict(self) -> dict:
         return {
@@ -153,6 +133,8 @@ class StatArbSignal:
             "correlation": round(self.correlation, 4),
             "confidence": round(self.confidence, 2),
             "timestamp": self.timestamp.isoformat(),
+            "spread_model": self.spread_model,
+            "hedge_ratio": round(self.hedge_ratio, 4) if self.hedge_ratio is not None else None,
             "action": self._get_action(),
         }
     
@@ -164,12 +146,600 @@ class StatArbSignal:
         return "Hold"
 
 
+@dataclass
+class PairCandidate:
+    """Screening result for one pair combination"""
+    pair_a: str
+    pair_b: str
+    correlation: float  # Mean log-price correlation across exchanges
+    half_life: Optional[float]  # Mean-reversion half-life in seconds
+    exchanges: int  # Exchanges quoting both legs
+    
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.pair_a, self.pair_b)
+    
+    def to_dict(self) -> dict:
+        return {
+            "pair_a": self.pair_a,
+            "pair_b": self.pair_b,
+            "correlation": round(self.correlation, 4),
+            "half_life_s": round(self.half_life, 1) if self.half_life else None,
+            "exchanges": self.exchanges,
+        }
+
+
+class PairDiscovery(BackgroundJob):
+    """
+    Screens all (exchange, pair) mid-price series for stat arb candidates.
+    
+    Every `interval_seconds` the engine hands over a snapshot of its
+    resampled, time-aligned mid prices. A single worker thread thins them
+    to the screening grid and computes, in a handful of matrix products:
+    - The full log-price correlation matrix
+    - The OLS hedge ratio for every column pair
+    - The lag-1 autocorrelation of every hedged spread (half-life)
+    
+    Combinations that are both correlated and mean-reverting are ranked and
+    the top K promoted. Hysteresis keeps the tracked set stable: a promoted
+    pair is only demoted after failing the looser `demote_correlation`
+    screen `demote_after` times in a row.
+    """
+    
+    name = "pair-discovery"
+    
+    def __init__(
+        self,
+        top_k: int = 5,
+        min_correlation: float = 0.8,
+        demote_correlation: float = 0.6,
+        max_half_life_seconds: float = 120.0,
+        demote_after: int = 3,
+        grid_ms: int = 500,
+        min_points: int = 60,
+        interval_seconds: float = 30.0
+    ):
+        """
+        Args:
+            top_k: Maximum number of discovered pairs to track
+            min_correlation: Correlation required for promotion
+            demote_correlation: Correlation below which a tracked pair counts a miss
+            max_half_life_seconds: Slowest mean reversion accepted
+            demote_after: Consecutive misses before a pair is demoted
+            grid_ms: Screening grid spacing (a multiple of the sample interval)
+            min_points: Minimum aligned grid points per series
+            interval_seconds: Time between screening runs
+        """
+        super().__init__(interval_seconds)
+        self.top_k = top_k
+        self.min_correlation = min_correlation
+        self.demote_correlation = demote_correlation
+        self.max_half_life_seconds = max_half_life_seconds
+        self.demote_after = demote_after
+        self.grid_ms = grid_ms
+        self.min_points = min_points
+        
+        # Discovered pairs currently promoted, and their consecutive misses
+        self.promoted: Dict[Tuple[str, str], PairCandidate] = {}
+        self.misses: Dict[Tuple[str, str], int] = {}
+        
+        # Latest full ranking (for dashboard)
+        self.candidates: List[PairCandidate] = []
+        
+        self.runs = 0
+        self.last_run_ms = 0.0
+    
+    def submit(self, resampler: MidPriceResampler, now: float):
+        """Snapshot the aligned series and screen them on the worker thread"""
+        # Copying the sample buffer is one array copy; everything else runs off-thread
+        self._submit(now, self.screen, resampler.snapshot(), resampler.interval_ms)
+    
+    def screen(
+        self,
+        snapshot: Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray],
+        interval_ms: int
+    ) -> List[PairCandidate]:
+        """Rank all same-exchange pair combinations (runs on worker thread)"""
+        start = time.perf_counter()
+        keys, _, values = snapshot
+        
+        values, step_seconds = _thin_to_grid(values, interval_ms, self.grid_ms)
+        
+        by_exchange: Dict[str, List[Tuple[str, int]]] = {}
+        for col, (exchange, pair) in enumerate(keys):
+            by_exchange.setdefault(exchange, []).append((pair, col))
+        
+        # Per pair combination: list of (correlation, half_life) across exchanges
+        stats: Dict[Tuple[str, str], List[Tuple[float, Optional[float]]]] = {}
+        
+        for exchange, columns in by_exchange.items():
+            if len(columns) < 2:
+                continue
+            
+            matrix = self._align(sorted(columns), values)
+            if matrix is None:
+                continue
+            pairs, logs = matrix
+            
+            correlation, rho = self._screen_matrix(logs)
+            
+            for i in range(len(pairs)):
+                for j in range(i + 1, len(pairs)):
+                    r = rho[i, j]
+                    half_life = -math.log(2) / math.log(r) * step_seconds if 0 < r < 1 else None
+                    stats.setdefault((pairs[i], pairs[j]), []).append(
+                        (float(correlation[i, j]), half_life)
+                    )
+        
+        candidates = []
+        for (pair_a, pair_b), per_exchange in stats.items():
+            half_lives = [hl for _, hl in per_exchange if hl is not None]
+            candidates.append(PairCandidate(
+                pair_a=pair_a,
+                pair_b=pair_b,
+                correlation=sum(c for c, _ in per_exchange) / len(per_exchange),
+                half_life=sum(half_lives) / len(half_lives) if len(half_lives) == len(per_exchange) else None,
+                exchanges=len(per_exchange),
+            ))
+        
+        candidates.sort(key=lambda c: c.correlation, reverse=True)
+        
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        return candidates
+    
+    def _align(
+        self,
+        columns: List[Tuple[str, int]],
+        values: np.ndarray
+    ) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Log prices of one exchange's series over their common span (T x N)"""
+        # Sampled series only have leading gaps (before their first tick)
+        valid = ~np.isnan(values[:, [col for _, col in columns]])
+        first = np.where(valid.any(axis=0), valid.argmax(axis=0), len(values))
+        
+        # Drop series that don't cover enough rows, then start where every
+        # remaining series has a value
+        kept = [i for i in range(len(columns)) if len(values) - first[i] >= self.min_points]
+        if len(kept) < 2:
+            return None
+        
+        start = max(first[i] for i in kept)
+        logs = np.log(values[start:, [columns[i][1] for i in kept]])
+        
+        return [columns[i][0] for i in kept], logs
+    
+    @staticmethod
+    def _screen_matrix(logs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Correlation and spread AR(1) coefficient for every column pair.
+        
+        For the spread e = x_i - beta_ij * x_j, the lag-1 autocorrelation
+        expands into terms of the lag-0 and lag-1 cross-product matrices, so
+        no per-pair residual series is ever materialized.
+        """
+        x = logs - logs.mean(axis=0)
+        lagged, current = x[:-1], x[1:]
+        
+        s0 = lagged.T @ lagged   # sum x_i(t-1) x_j(t-1)
+        s1 = current.T @ lagged  # sum x_i(t) x_j(t-1)
+        full = x.T @ x
+        
+        diag = np.diag(full)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            correlation = full / np.sqrt(np.outer(diag, diag))
+            
+            d0 = np.diag(s0)
+            d1 = np.diag(s1)
+            beta = s0 / d0[np.newaxis, :]  # regress column i on column j
+            
+            num = d1[:, np.newaxis] - beta * (s1 + s1.T) + beta ** 2 * d1[np.newaxis, :]
+            den = d0[:, np.newaxis] - 2 * beta * s0 + beta ** 2 * d0[np.newaxis, :]
+            rho = num / den
+        
+        return np.nan_to_num(correlation), np.nan_to_num(rho, nan=1.0)
+    
+    def apply(self, candidates: List[PairCandidate]) -> List[Tuple[str, str]]:
+        """Update the promoted set with hysteresis; returns discovered pairs"""
+        self.runs += 1
+        self.candidates = candidates
+        by_key = {c.key: c for c in candidates}
+        
+        # Demote incumbents that keep failing the loose screen
+        for key in list(self.promoted):
+            candidate = by_key.get(key)
+            if candidate and self._passes(candidate, self.demote_correlation):
+                self.promoted[key] = candidate
+                self.misses[key] = 0
+                continue
+            
+            self.misses[key] = self.misses.get(key, 0) + 1
+            if self.misses[key] >= self.demote_after:
+                logger.info(f"📉 Pair discovery: demoted {key[0]}/{key[1]}")
+                del self.promoted[key]
+                del self.misses[key]
+        
+        # Fill free slots from the strict screen, best first
+        for candidate in candidates:
+            if len(self.promoted) >= self.top_k:
+                break
+            if candidate.key in self.promoted or not self._passes(candidate, self.min_correlation):
+                continue
+            
+            logger.info(
+                f"📈 Pair discovery: promoted {candidate.pair_a}/{candidate.pair_b} "
+                f"(corr={candidate.correlation:.3f}, half-life={candidate.half_life:.1f}s)"
+            )
+            self.promoted[candidate.key] = candidate
+            self.misses[candidate.key] = 0
+        
+        return list(self.promoted)
+    
+    def _passes(self, candidate: PairCandidate, min_correlation: float) -> bool:
+        return (
+            candidate.correlation >= min_correlation
+            and candidate.half_life is not None
+            and candidate.half_life <= self.max_half_life_seconds
+        )
+    
+    def get_state(self) -> dict:
+        return {
+            "promoted": [c.to_dict() for c in self.promoted.values()],
+            "top_candidates": [c.to_dict() for c in self.candidates[:10]],
+            "runs": self.runs,
+            "last_run_ms": round(self.last_run_ms, 2),
+            "config": {
+                "top_k": self.top_k,
+                "min_correlation": self.min_correlation,
+                "demote_correlation": self.demote_correlation,
+                "max_half_life_seconds": self.max_half_life_seconds,
+                "interval_seconds": self.interval_seconds,
+            },
+        }
+    
+
+
+@dataclass
+class CointegrationResult:
+    """Engle-Granger test result for one pair on one exchange"""
+    exchange: str
+    pair_a: str
+    pair_b: str
+    hedge_ratio: float  # beta in log(a) = alpha + beta * log(b) + e
+    intercept: float
+    adf_stat: float  # ADF t-statistic of the residuals
+    critical_value: float
+    cointegrated: bool
+    half_life: Optional[float]  # Residual mean-reversion half-life in seconds
+    observations: int
+    tested_at: float  # Sample time (epoch seconds) of the newest row used
+    
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return (self.exchange, self.pair_a, self.pair_b)
+    
+    def to_dict(self) -> dict:
+        return {
+            "exchange": self.exchange,
+            "pair_a": self.pair_a,
+            "pair_b": self.pair_b,
+            "hedge_ratio": round(self.hedge_ratio, 4),
+            "intercept": round(self.intercept, 4),
+            "adf_stat": round(self.adf_stat, 3),
+            "critical_value": self.critical_value,
+            "cointegrated": self.cointegrated,
+            "half_life_s": round(self.half_life, 1) if self.half_life else None,
+            "observations": self.observations,
+            "tested_at": datetime.fromtimestamp(self.tested_at).isoformat(),
+        }
+
+
+class CointegrationTester(BackgroundJob):
+    """
+    Periodic Engle-Granger cointegration tests for every candidate pair.
+    
+    Step 1: OLS of log(a) on log(b) gives the hedge ratio and intercept.
+    Step 2: an ADF regression on the residuals tests for a unit root:
+        de(t) = gamma * e(t-1) + sum(phi_i * de(t-i)) + u(t)
+    The pair is cointegrated when the t-statistic of gamma is below the
+    Engle-Granger critical value.
+    
+    All pairs sharing the test window are stacked into (pairs, T) arrays
+    and both regressions are solved as one batch on the worker thread.
+    Results are cached with the sample time they were computed at and
+    expire after `max_age_seconds`.
+    """
+    
+    name = "cointegration"
+    
+    # MacKinnon (2010) critical values, two variables, constant term
+    CRITICAL_VALUES = {"1%": -3.90, "5%": -3.34, "10%": -3.04}
+    
+    def __init__(
+        self,
+        grid_ms: int = 1000,
+        window: int = 300,
+        min_points: int = 100,
+        adf_lags: int = 1,
+        significance: str = "5%",
+        max_age_seconds: float = 120.0,
+        interval_seconds: float = 15.0
+    ):
+        """
+        Args:
+            grid_ms: Test grid spacing (a multiple of the sample interval)
+            window: Most recent grid points used per test
+            min_points: Minimum grid points where both legs have prices
+            adf_lags: Lagged differences in the ADF regression
+            significance: Critical value level ("1%", "5%" or "10%")
+            max_age_seconds: Sample time after which a result is stale
+            interval_seconds: Time between test runs
+        """
+        super().__init__(interval_seconds)
+        self.grid_ms = grid_ms
+        self.window = window
+        self.min_points = min_points
+        self.adf_lags = adf_lags
+        self.significance = significance
+        self.critical_value = self.CRITICAL_VALUES[significance]
+        self.max_age_seconds = max_age_seconds
+        
+        # (exchange, pair_a, pair_b) -> latest result
+        self.results: Dict[Tuple[str, str, str], CointegrationResult] = {}
+        
+        self.runs = 0
+        self.last_run_ms = 0.0
+    
+    def submit(
+        self,
+        resampler: MidPriceResampler,
+        candidates: List[Tuple[str, str, str]],
+        now: float
+    ):
+        """Snapshot the aligned series and test the candidates on the worker thread"""
+        self._submit(now, self.test_pairs, resampler.snapshot(), resampler.interval_ms, list(candidates))
+    
+    def apply(self, results: List[CointegrationResult]):
+        """Store finished results in the cache"""
+        self.runs += 1
+        for result in results:
+            self.results[result.key] = result
+    
+    def get(self, exchange: str, pair_a: str, pair_b: str, now: float) -> Optional[CointegrationResult]:
+        """Cached result for a pair, if still fresh at sample time `now`"""
+        result = self.results.get((exchange, pair_a, pair_b))
+        if result is None or now - result.tested_at > self.max_age_seconds:
+            return None
+        return result
+    
+    def test_pairs(
+        self,
+        snapshot: Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray],
+        interval_ms: int,
+        candidates: List[Tuple[str, str, str]]
+    ) -> List[CointegrationResult]:
+        """Run Engle-Granger on every candidate (runs on worker thread)"""
+        start = time.perf_counter()
+        keys, times, values = snapshot
+        if len(times) == 0:
+            return []
+        
+        values, step_seconds = _thin_to_grid(values, interval_ms, self.grid_ms)
+        values = values[-self.window:]
+        tested_at = float(times[-1])
+        
+        columns = {key: col for col, key in enumerate(keys)}
+        pairs = []
+        legs_a, legs_b = [], []
+        for exchange, pair_a, pair_b in candidates:
+            col_a = columns.get((exchange, pair_a))
+            col_b = columns.get((exchange, pair_b))
+            if col_a is not None and col_b is not None:
+                pairs.append((exchange, pair_a, pair_b))
+                legs_a.append(col_a)
+                legs_b.append(col_b)
+        
+        if not pairs:
+            return []
+        
+        # Common window per batch: the newest rows where every leg is quoted
+        y = values[:, legs_a].T
+        x = values[:, legs_b].T
+        valid = ~(np.isnan(y) | np.isnan(x))
+        covered = valid[:, ::-1].cumprod(axis=1).sum(axis=1)  # Trailing valid rows
+        
+        keep = covered >= self.min_points
+        if not keep.any():
+            return []
+        
+        length = int(covered[keep].min())
+        y = np.log(y[keep, -length:])
+        x = np.log(x[keep, -length:])
+        pairs = [p for p, k in zip(pairs, keep) if k]
+        
+        # Flat legs have no hedge ratio
+        moving = (x.std(axis=1) > 0) & (y.std(axis=1) > 0)
+        y, x = y[moving], x[moving]
+        pairs = [p for p, m in zip(pairs, moving) if m]
+        if not pairs:
+            return []
+        
+        beta, alpha, adf, gamma = self.engle_granger(y, x, self.adf_lags)
+        
+        results = []
+        for i, (exchange, pair_a, pair_b) in enumerate(pairs):
+            rho = 1 + gamma[i]
+            half_life = -math.log(2) / math.log(rho) * step_seconds if 0 < rho < 1 else None
+            results.append(CointegrationResult(
+                exchange=exchange,
+                pair_a=pair_a,
+                pair_b=pair_b,
+                hedge_ratio=float(beta[i]),
+                intercept=float(alpha[i]),
+                adf_stat=float(adf[i]),
+                critical_value=self.critical_value,
+                cointegrated=bool(adf[i] < self.critical_value),
+                half_life=half_life,
+                observations=length,
+                tested_at=tested_at,
+            ))
+        
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        return results
+    
+    @staticmethod
+    def engle_granger(
+        y: np.ndarray,
+        x: np.ndarray,
+        lags: int = 1
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Batched Engle-Granger regressions on (pairs, T) log price arrays.
+        
+        Returns (hedge_ratio, intercept, adf_stat, gamma), one entry per pair.
+        """
+        # Step 1: cointegrating regression y = alpha + beta * x
+        x_mean = x.mean(axis=1, keepdims=True)
+        y_mean = y.mean(axis=1, keepdims=True)
+        dx = x - x_mean
+        dy = y - y_mean
+        beta = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        alpha = y_mean[:, 0] - beta * x_mean[:, 0]
+        resid = dy - beta[:, np.newaxis] * dx
+        
+        # Step 2: ADF regression on the residuals, (pairs, n, 1 + lags) design
+        diff = np.diff(resid, axis=1)
+        n = diff.shape[1] - lags
+        target = diff[:, lags:]
+        design = np.stack(
+            [resid[:, lags:-1]] + [diff[:, lags - i:lags - i + n] for i in range(1, lags + 1)],
+            axis=2
+        )
+        
+        design_t = design.transpose(0, 2, 1)
+        inverse = np.linalg.pinv(design_t @ design)
+        coef = inverse @ (design_t @ target[..., np.newaxis])
+        errors = target - (design @ coef)[..., 0]
+        
+        variance = (errors ** 2).sum(axis=1) / (n - design.shape[2])
+        gamma = coef[:, 0, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            adf = gamma / np.sqrt(variance * inverse[:, 0, 0])
+        
+        return beta, alpha, np.nan_to_num(adf), gamma
+    
+    def get_state(self) -> dict:
+        return {
+            "results": [r.to_dict() for r in self.results.values()],
+            "cointegrated": sum(1 for r in self.results.values() if r.cointegrated),
+            "runs": self.runs,
+            "last_run_ms": round(self.last_run_ms, 2),
+            "config": {
+                "grid_ms": self.grid_ms,
+                "window": self.window,
+                "adf_lags": self.adf_lags,
+                "significance": self.significance,
+                "max_age_seconds": self.max_age_seconds,
+                "interval_seconds": self.interval_seconds,
+            },
+        }
+
+
+class KalmanHedge:
+    """
+    Dynamic hedge ratio from a 2-state Kalman filter on log prices.
+    
+    State [alpha, beta] follows a random walk; each aligned observation
+    log(a) = alpha + beta * log(b) + noise updates it in constant time, so
+    the hedge adapts without refitting a regression over a window.
+    
+    The innovation (one-step prediction error) is the spread, and its
+    variance from the filter normalizes it into a z-score. Observation
+    noise is learned from recent post-fit residuals unless given.
+    """
+    
+    def __init__(
+        self,
+        delta: float = 1e-10,
+        observation_var: Optional[float] = None,
+        noise_window: int = 200
+    ):
+        """
+        Args:
+            delta: State drift per observation (higher adapts faster)
+            observation_var: Fixed measurement noise variance (None = adaptive)
+            noise_window: Smoothing window for the adaptive noise estimate
+        """
+        self.state_var = delta / (1 - delta)
+        self.adaptive = observation_var is None
+        self.observation_var = observation_var if observation_var is not None else 1e-6
+        self._noise_weight = 2 / (noise_window + 1)
+        
+        self.alpha = 0.0
+        self.beta = 0.0
+        
+        # State covariance (symmetric 2x2)
+        self.p00 = 1.0
+        self.p01 = 0.0
+        self.p11 = 1.0
+        
+        self.spread = 0.0
+        self.z_score = 0.0
+        self.count = 0
+    
+    def update(self, price_a: float, price_b: float) -> Tuple[float, float]:
+        """Add one aligned observation; returns (spread, z-score)"""
+        y = math.log(price_a)
+        x = math.log(price_b)
+        
+        # Predict: random-walk state, covariance grows
+        self.p00 += self.state_var
+        self.p11 += self.state_var
+        
+        # Innovation and its variance, S = H P H' + R with H = [1, x]
+        ph0 = self.p00 + x * self.p01
+        ph1 = self.p01 + x * self.p11
+        hph = ph0 + x * ph1
+        innovation = y - (self.alpha + self.beta * x)
+        variance = hph + self.observation_var
+        
+        # Correct
+        k0 = ph0 / variance
+        k1 = ph1 / variance
+        self.alpha += k0 * innovation
+        self.beta += k1 * innovation
+        self.p00 -= k0 * ph0
+        self.p01 -= k0 * ph1
+        self.p11 -= k1 * ph1
+        
+        if self.adaptive:
+            # R ~ E[r^2] + H P H' using the post-fit residual
+            residual = y - (self.alpha + self.beta * x)
+            hph_post = self.p00 + 2 * x * self.p01 + x * x * self.p11
+            estimate = residual * residual + hph_post
+            self.observation_var += self._noise_weight * (estimate - self.observation_var)
+        
+        self.spread = innovation
+        self.z_score = innovation / math.sqrt(variance)
+        self.count += 1
+        return self.spread, self.z_score
+    
+    def to_dict(self) -> dict:
+        return {
+            "alpha": round(self.alpha, 6),
+            "beta": round(self.beta, 6),
+            "observation_var": self.observation_var,
+            "observations": self.count,
+        }
+
+
 class StatisticalArbitrageEngine:
     """
     Detects statistical arbitrage opportunities using mean-reversion.
     
     Strategy:
-    1. Track price ratio (spread) between correlated pairs
+    1. Track the spread between correlated pairs: the Engle-Granger
+       residual log(a) - beta * log(b) - alpha once the pair tests as
+       cointegrated, the raw price ratio until then
     2. Calculate z-score of current spread vs historical
     3. Generate signal when z-score exceeds threshold
     4. Expect spread to revert to mean
@@ -181,43 +751,86 @@ class StatisticalArbitrageEngine:
     - Signal: Short BTC, Long ETH (expect spread to narrow)
     """
     
+    # auto:   Engle-Granger residual when cointegrated, price ratio otherwise
+    # ratio:  always the raw price ratio
+    # kalman: innovation of a dynamic hedge (KalmanHedge), O(1) per sample
+    SPREAD_MODELS = ("auto", "ratio", "kalman")
+    
     def __init__(
         self,
         z_score_entry: float = 2.0,
         z_score_exit: float = 0.5,
         min_correlation: float = 0.7,
-        min_history: int = 100
+        min_history: int = 100,
+        sample_interval_ms: int = 100,
+        discovery: Optional[PairDiscovery] = None,
+        enable_discovery: bool = True,
+        cointegration: Optional[CointegrationTester] = None,
+        enable_cointegration: bool = True,
+        spread_models: Optional[Dict[Tuple[str, str], str]] = None,
+        default_spread_model: str = "auto"
     ):
         """
         Args:
             z_score_entry: Z-score threshold to enter trade
             z_score_exit: Z-score threshold to exit trade
             min_correlation: Minimum correlation to consider pair
-            min_history: Minimum price points before generating signals
+            min_history: Minimum aligned samples before generating signals
+            sample_interval_ms: Resampling cadence the engine runs on
+            discovery: Pair screener (a default one is created if enabled)
+            enable_discovery: Promote correlated pairs into the tracked set
+            cointegration: Engle-Granger tester (a default one is created if enabled)
+            enable_cointegration: Use hedge-ratio spreads for cointegrated pairs
+            spread_models: Spread model per (pair_a, pair_b), see SPREAD_MODELS
+            default_spread_model: Spread model for pairs not listed
         """
+        if default_spread_model not in self.SPREAD_MODELS:
+            raise ValueError(f"Unknown spread model: {default_spread_model}")
+        
         self.z_score_entry = z_score_entry
         self.z_score_exit = z_score_exit
         self.min_correlation = min_correlation
         self.min_history = min_history
         
-        # Price histories: (exchange, pair) -> PriceHistory
-        self.price_history: Dict[Tuple[str, str], PriceHistory] = {}
+        # Time-aligned mid prices; spreads are evaluated on its clock, not per tick
+        self.resampler = MidPriceResampler(interval_ms=sample_interval_ms)
+        self.resampler.on_sample(self._on_sample)
+        self.exchanges: set = set()
         
         # Spread histories: (exchange, pair_a, pair_b) -> SpreadHistory
         self.spread_history: Dict[Tuple[str, str, str], SpreadHistory] = {}
         
+        # Cointegration result each history was built with (None = price ratio)
+        self.hedge_fits: Dict[Tuple[str, str, str], Optional[CointegrationResult]] = {}
+        
+        # Kalman filters for pairs using the "kalman" spread model
+        self.kalman_filters: Dict[Tuple[str, str, str], KalmanHedge] = {}
+        
+        # Spread model per (pair_a, pair_b); unlisted pairs use the default
+        self.default_spread_model = default_spread_model
+        self.spread_models: Dict[Tuple[str, str], str] = {}
+        for pair, model in (spread_models or {}).items():
+            self.set_spread_model(*pair, model)
+        
         # Current signals
         self.signals: List[StatArbSignal] = []
         
         # Signal history
         self.signal_history: List[StatArbSignal] = []
         
-        # Tracked pairs for stat arb
-        self.tracked_pairs: List[Tuple[str, str]] = [
+        # Tracked pairs for stat arb (seed pairs are always tracked)
+        self.seed_pairs: List[Tuple[str, str]] = [
             ("BTC/USDT", "ETH/USDT"),
             ("ETH/USDT", "SOL/USDT"),
             ("BTC/USDT", "SOL/USDT"),
         ]
+        self.tracked_pairs: List[Tuple[str, str]] = list(self.seed_pairs)
+        
+        # Automatic pair discovery (runs off the tick path)
+        self.discovery = discovery or (PairDiscovery() if enable_discovery else None)
+        
+        # Batch Engle-Granger tests (runs off the tick path)
+        self.cointegration = cointegration or (CointegrationTester() if enable_cointegration else None)
         
         # Callbacks
         self._on_signal_callbacks: List = []
@@ -226,68 +839,137 @@ class StatisticalArbitrageEngine:
         """Register callback for new signals"""
         self._on_signal_callbacks.append(callback)
     
+    def set_spread_model(self, pair_a: str, pair_b: str, model: str):
+        """Select the spread model for a pair (history restarts under the new model)"""
+        if model not in self.SPREAD_MODELS:
+            raise ValueError(f"Unknown spread model: {model}")
+        
+        self.spread_models[(pair_a, pair_b)] = model
+        for key in [k for k in self.spread_history if k[1:] == (pair_a, pair_b)]:
+            del self.spread_history[key]
+            self.hedge_fits.pop(key, None)
+            self.kalman_filters.pop(key, None)
+    
+    def get_spread_model(self, pair_a: str, pair_b: str) -> str:
+        return self.spread_models.get((pair_a, pair_b), self.default_spread_model)
+    
     def update_price(self, exchange: str, pair: str, price: float, timestamp: Optional[datetime] = None):
-        """Update price and check for stat arb signals"""
+        """Record latest price; spreads are evaluated when the sample clock ticks"""
         timestamp = timestamp or datetime.now()
         
-        # Store price history
-        key = (exchange, pair)
-        if key not in self.price_history:
-            self.price_history[key] = PriceHistory()
-        self.price_history[key].add(price, timestamp)
+        self.exchanges.add(exchange)
+        self.resampler.update(exchange, pair, price, timestamp)
+    
+    def _on_sample(self, sample_time: float):
+        """Evaluate all tracked spreads on the newest aligned sample"""
+        timestamp = datetime.fromtimestamp(sample_time)
+        
+        if self.discovery:
+            self._run_discovery()
         
-        # Update spreads for tracked pairs
-        for pair_a, pair_b in self.tracked_pairs:
-            if pair in (pair_a, pair_b):
+        if self.cointegration:
+            self._run_cointegration()
+        
+        for exchange in self.exchanges:
+            for pair_a, pair_b in self.tracked_pairs:
                 self._update_spread(exchange, pair_a, pair_b, timestamp)
     
-    def _update_spread(self, exchange: str, pair_a: str, pair_b: str, timestamp: datetime):
-        """Update spread between two pairs and check for signals"""
+    def _run_discovery(self):
+        """Apply finished screening results and schedule the next run"""
+        candidates = self.discovery.collect()
+        if candidates is not None:
+            discovered = self.discovery.apply(candidates)
+            self.tracked_pairs = self.seed_pairs + [
+                p for p in discovered if p not in self.seed_pairs
+            ]
+        
+        now = time.monotonic()
+        if self.discovery.due(now):
+            self.discovery.submit(self.resampler, now)
+    
+    def _run_cointegration(self):
+        """Cache finished Engle-Granger results and schedule the next batch"""
+        results = self.cointegration.collect()
+        if results is not None:
+            self.cointegration.apply(results)
+        
+        now = time.monotonic()
+        if self.cointegration.due(now):
+            candidates = [
+                (exchange, pair_a, pair_b)
+                for exchange in sorted(self.exchanges)
+                for pair_a, pair_b in self.tracked_pairs
+            ]
+            self.cointegration.submit(self.resampler, candidates, now)
+    
+    def _aligned_prices(
+        self,
+        exchange: str,
+        pair_a: str,
+        pair_b: str
+    ) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Sample times and prices where both legs have a price, shaped (rows, 2)"""
         key_a = (exchange, pair_a)
         key_b = (exchange, pair_b)
         
-        # Need history for both pairs
-        if key_a not in self.price_history or key_b not in self.price_history:
-            return
+        if key_a not in self.resampler.columns or key_b not in self.resampler.columns:
+            return None, None
         
-        hist_a = self.price_history[key_a]
-        hist_b = self.price_history[key_b]
+        times, window = self.resampler.window([key_a, key_b])
+        valid = ~np.isnan(window).any(axis=1)
+        return times[valid], window[valid]
+    
+    def _hedge_fit(self, exchange: str, pair_a: str, pair_b: str, timestamp: datetime) -> Optional[CointegrationResult]:
+        """Fresh cointegration result to build the spread from, or None for the ratio"""
+        if not self.cointegration or self.get_spread_model(pair_a, pair_b) == "ratio":
+            return None
+        result = self.cointegration.get(exchange, pair_a, pair_b, timestamp.timestamp())
+        return result if result and result.cointegrated else None
+    
+    @staticmethod
+    def _spread_series(prices: np.ndarray, model: Optional[CointegrationResult]) -> np.ndarray:
+        """Spread for each (price_a, price_b) row under the given model"""
+        if model is None:
+            return prices[:, 0] / prices[:, 1]
+        return np.log(prices[:, 0]) - model.hedge_ratio * np.log(prices[:, 1]) - model.intercept
+    
+    def _update_spread(self, exchange: str, pair_a: str, pair_b: str, timestamp: datetime):
+        """Update spread between two pairs and check for signals"""
+        times, aligned = self._aligned_prices(exchange, pair_a, pair_b)
         
-        # Need enough data
-        if len(hist_a.prices) < self.min_history or len(hist_b.prices) < self.min_history:
+        # Need enough aligned data for both pairs
+        if aligned is None or len(aligned) < self.min_history:
             return
         
-        # Calculate current spread (price ratio)
-        price_a = hist_a.prices[-1]
-        price_b = hist_b.prices[-1]
-        
-        if price_b == 0:
+        if aligned[-1, 1] == 0:
             return
         
-        spread = price_a / price_b
-        
-        # Store spread history
         spread_key = (exchange, pair_a, pair_b)
-        if spread_key not in self.spread_history:
-            self.spread_history[spread_key] = SpreadHistory()
-        self.spread_history[spread_key].add(spread, timestamp)
+        
+        if self.get_spread_model(pair_a, pair_b) == "kalman":
+            spread_hist, z_score = self._update_kalman(spread_key, times, aligned, timestamp)
+            spread_model = "kalman"
+            hedge_ratio = self.kalman_filters[spread_key].beta
+        else:
+            spread_hist = self._update_window(spread_key, times, aligned, timestamp)
+            z_score = spread_hist.z_score()
+            fit = self.hedge_fits[spread_key]
+            spread_model = "hedged" if fit else "ratio"
+            hedge_ratio = fit.hedge_ratio if fit else None
+        
+        spread = spread_hist.spreads[-1]
         
         # Calculate correlation
-        correlation = self._calculate_correlation(hist_a, hist_b)
+        correlation = self._calculate_correlation(aligned[:, 0], aligned[:, 1])
         
         # Only proceed if highly correlated
         if correlation < self.min_correlation:
             return
         
-        spread_hist = self.spread_history[spread_key]
-        
         # Need enough spread history
         if len(spread_hist.spreads) < self.min_history:
             return
         
-        # Calculate z-score
-        z_score = spread_hist.z_score()
-        
         # Determine signal
         signal = self._determine_signal(z_score)
         
@@ -309,7 +991,9 @@ class StatisticalArbitrageEngine:
                 half_life=half_life,
                 correlation=correlation,
                 confidence=confidence,
-                timestamp=timestamp
+                timestamp=timestamp,
+                spread_model=spread_model,
+                hedge_ratio=hedge_ratio,
             )
             
             # Update current signals
@@ -335,31 +1019,67 @@ class StatisticalArbitrageEngine:
                 except Exception as e:
                     logger.error(f"Stat arb callback error: {e}")
     
-    def _calculate_correlation(self, hist_a: PriceHistory, hist_b: PriceHistory) -> float:
-        """Calculate Pearson correlation between two price series"""
-        prices_a = hist_a.get_prices()
-        prices_b = hist_b.get_prices()
-        
-        # Use same length
-        n = min(len(prices_a), len(prices_b))
-        if n < 10:
-            return 0.0
+    def _update_window(
+        self,
+        spread_key: Tuple[str, str, str],
+        times: np.ndarray,
+        aligned: np.ndarray,
+        timestamp: datetime
+    ) -> SpreadHistory:
+        """Append the ratio or Engle-Granger spread; z-score comes from the window"""
+        fit = self._hedge_fit(*spread_key, timestamp)
         
-        prices_a = prices_a[-n:]
-        prices_b = prices_b[-n:]
+        if spread_key not in self.spread_history or self.hedge_fits.get(spread_key) is not fit:
+            # New pair or new hedge ratio: rebuild the window under this fit so
+            # z-scores never mix spreads computed with different definitions
+            spread_hist = SpreadHistory()
+            tail = slice(-spread_hist.max_size, None)
+            spread_hist.spreads.extend(self._spread_series(aligned[tail], fit).tolist())
+            spread_hist.timestamps.extend(datetime.fromtimestamp(t) for t in times[tail])
+            self.spread_history[spread_key] = spread_hist
+            self.hedge_fits[spread_key] = fit
+            return spread_hist
         
-        mean_a = sum(prices_a) / n
-        mean_b = sum(prices_b) / n
+        spread_hist = self.spread_history[spread_key]
+        spread_hist.add(float(self._spread_series(aligned[-1:], fit)[0]), timestamp)
+        return spread_hist
+    
+    def _update_kalman(
+        self,
+        spread_key: Tuple[str, str, str],
+        times: np.ndarray,
+        aligned: np.ndarray,
+        timestamp: datetime
+    ) -> Tuple[SpreadHistory, float]:
+        """Advance the pair's Kalman filter by one sample; z-score comes from the filter"""
+        kalman = self.kalman_filters.get(spread_key)
         
-        numerator = sum((a - mean_a) * (b - mean_b) for a, b in zip(prices_a, prices_b))
+        if kalman is None or spread_key not in self.spread_history:
+            # Warm up on the aligned history once; every later sample is O(1)
+            kalman = KalmanHedge()
+            spread_hist = SpreadHistory()
+            spreads = [kalman.update(price_a, price_b)[0] for price_a, price_b in aligned.tolist()]
+            spread_hist.spreads.extend(spreads)
+            spread_hist.timestamps.extend(datetime.fromtimestamp(t) for t in times[-spread_hist.max_size:])
+            self.kalman_filters[spread_key] = kalman
+            self.spread_history[spread_key] = spread_hist
+            return spread_hist, kalman.z_score
         
-        std_a = math.sqrt(sum((a - mean_a) ** 2 for a in prices_a))
-        std_b = math.sqrt(sum((b - mean_b) ** 2 for b in prices_b))
+        spread_hist = self.spread_history[spread_key]
+        price_a, price_b = aligned[-1]
+        spread, z_score = kalman.update(float(price_a), float(price_b))
+        spread_hist.add(spread, timestamp)
+        return spread_hist, z_score
+    
+    def _calculate_correlation(self, prices_a: np.ndarray, prices_b: np.ndarray) -> float:
+        """Calculate Pearson correlation between two aligned price series"""
+        if len(prices_a) < 10:
+            return 0.0
         
-        if std_a == 0 or std_b == 0:
+        if prices_a.std() == 0 or prices_b.std() == 0:
             return 0.0
         
-        return numerator / (std_a * std_b)
+        return float(np.corrcoef(prices_a, prices_b)[0, 1])
     
     def _determine_signal(self, z_score: float) -> str:
         """Determine signal based on z-score"""
@@ -411,16 +1131,20 @@ class StatisticalArbitrageEngine:
         
         spread_hist = self.spread_history[spread_key]
         
-        key_a = (exchange, pair_a)
-        key_b = (exchange, pair_b)
-        
-        if key_a not in self.price_history or key_b not in self.price_history:
+        _, aligned = self._aligned_prices(exchange, pair_a, pair_b)
+        if aligned is None or len(aligned) == 0:
             return None
         
-        hist_a = self.price_history[key_a]
-        hist_b = self.price_history[key_b]
+        correlation = self._calculate_correlation(aligned[:, 0], aligned[:, 1])
+        fit = self.hedge_fits.get(spread_key)
+        kalman = self.kalman_filters.get(spread_key)
         
-        correlation = self._calculate_correlation(hist_a, hist_b)
+        if kalman:
+            spread_model, hedge_ratio, z_score = "kalman", kalman.beta, kalman.z_score
+        else:
+            spread_model = "hedged" if fit else "ratio"
+            hedge_ratio = fit.hedge_ratio if fit else None
+            z_score = spread_hist.z_score()
         
         return {
             "pair_a": pair_a,
@@ -429,12 +1153,15 @@ class StatisticalArbitrageEngine:
             "current_spread": spread_hist.spreads[-1] if spread_hist.spreads else 0,
             "mean_spread": spread_hist.mean(),
             "std_spread": spread_hist.std(),
-            "z_score": spread_hist.z_score(),
+            "z_score": z_score,
             "half_life": spread_hist.half_life(),
             "correlation": correlation,
             "data_points": len(spread_hist.spreads),
-            "price_a": hist_a.prices[-1] if hist_a.prices else 0,
-            "price_b": hist_b.prices[-1] if hist_b.prices else 0,
+            "price_a": float(aligned[-1, 0]),
+            "price_b": float(aligned[-1, 1]),
+            "spread_model": spread_model,
+            "hedge_ratio": hedge_ratio,
+            "adf_stat": fit.adf_stat if fit else None,
         }
     
     def get_state(self) -> dict:
@@ -452,10 +1179,23 @@ class StatisticalArbitrageEngine:
                 for pair_a, pair_b in self.tracked_pairs
                 if self.get_pair_analysis(exchange, pair_a, pair_b)
             ],
+            "resampler": self.resampler.get_state(),
+            "discovery": self.discovery.get_state() if self.discovery else None,
+            "cointegration": self.cointegration.get_state() if self.cointegration else None,
             "config": {
                 "z_score_entry": self.z_score_entry,
                 "z_score_exit": self.z_score_exit,
                 "min_correlation": self.min_correlation,
                 "min_history": self.min_history,
+                "sample_interval_ms": self.resampler.interval_ms,
+                "default_spread_model": self.default_spread_model,
+                "spread_models": {f"{a}/{b}": m for (a, b), m in self.spread_models.items()},
             }
         }
+    
+    def stop(self):
+        """Stop background workers"""
+        if self.discovery:
+            self.discovery.stop()
+        if self.cointegration:
+            self.cointegration.stop()
@@ -9,18 +9,48 @@ Stores every price update for:
 
 Uses efficient in-memory storage with optional persistence.
 In production, would use TimescaleDB or ClickHouse.
+
+Ticks are held column-wise per (exchange, pair): an int64 nanosecond
+timestamp column plus float64 bid, ask and size columns in NumPy ring
+buffers, 40 bytes per tick. `Tick` objects are only built on read.
+Exports and imports stream these columns (see engine_export).
+
+With `compress_block_ticks` set, a full buffer seals its oldest ticks
+into a compressed cold block (see engine_compression) instead of
+overwriting them. Queries decode cold blocks lazily, one at a time.
 """
 
+import asyncio
+import heapq
 import logging
+import time
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Iterator
-from collections import deque
-import json
-import gzip
+from itertools import chain, islice
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Tuple, Iterator
+
+import numpy as np
+
+from engine_compression import TickBlock
+from engine_metrics import metrics_engine
 
 logger = logging.getLogger(__name__)
 
+NS_PER_SECOND = 1_000_000_000
+
+
+def to_ns(timestamp: datetime) -> int:
+    """Epoch nanoseconds, exact to the microsecond (no float rounding)"""
+    seconds = int(timestamp.replace(microsecond=0).timestamp())
+    return seconds * NS_PER_SECOND + timestamp.microsecond * 1000
+
+
+def from_ns(ns: int) -> datetime:
+    """Naive local datetime from epoch nanoseconds (inverse of `to_ns`)"""
+    seconds, remainder = divmod(int(ns), NS_PER_SECOND)
+    return datetime.fromtimestamp(seconds).replace(microsecond=remainder // 1000)
+
 
 @dataclass
 class Tick:
@@ -30,6 +60,8 @@ class Tick:
     pair: str
     bid: float
     ask: float
+    bid_size: float = 0.0  # 0 = size not reported
+    ask_size: float = 0.0
     
     @property
     def mid(self) -> float:
@@ -48,6 +80,8 @@ class Tick:
             "ask": self.ask,
             "mid": self.mid,
             "spread": self.spread,
+            "bid_size": self.bid_size,
+            "ask_size": self.ask_size,
         }
     
     @classmethod
@@ -58,6 +92,8 @@ class Tick:
             pair=data["pair"],
             bid=data["bid"],
             ask=data["ask"],
+            bid_size=data.get("bid_size", 0.0),
+            ask_size=data.get("ask_size", 0.0),
         )
 
 
@@ -88,14 +124,631 @@ class OHLCV:
         }
 
 
+class TickBuffer:
+    """
+    Fixed-capacity columnar ring of ticks for one (exchange, pair).
+    
+    Columns start small and double until `capacity`, after which the
+    oldest tick is overwritten (TickCompactor may also evict the oldest
+    ticks and shrink the columns). Column reads (`column`) return arrays
+    oldest first; `Tick` objects are materialized only by `tick()` and
+    iteration.
+    
+    Timestamps are kept non-decreasing (a tick stamped earlier than its
+    predecessor is stored at the predecessor's time and counted in
+    `clamped`), so time ranges are found by binary search. A wrapped
+    ring is two sorted runs, searched one after the other.
+    """
+    
+    __slots__ = (
+        "exchange", "pair", "capacity", "time_ns", "bid", "ask", "bid_size", "ask_size",
+        "_start", "_size", "clamped", "evicted"
+    )
+    
+    COLUMNS = ("time_ns", "bid", "ask", "bid_size", "ask_size")
+    
+    def __init__(self, exchange: str, pair: str, capacity: int, initial_capacity: int = 1024):
+        self.exchange = exchange
+        self.pair = pair
+        self.capacity = capacity
+        allocated = max(1, min(capacity, initial_capacity))
+        self.time_ns = np.zeros(allocated, dtype=np.int64)
+        self.bid = np.zeros(allocated)
+        self.ask = np.zeros(allocated)
+        self.bid_size = np.zeros(allocated)
+        self.ask_size = np.zeros(allocated)
+        self._start = 0  # Slot of the oldest tick
+        self._size = 0
+        self.clamped = 0
+        self.evicted = 0  # Ticks overwritten or dropped; the oldest tick's absolute position
+    
+    def append(self, time_ns: int, bid: float, ask: float, bid_size: float = 0.0, ask_size: float = 0.0) -> int:
+        """Append one tick; returns the (possibly clamped) time it was stored at"""
+        if self._size:
+            last = int(self.time_ns[self._slot(-1)])
+            if time_ns < last:
+                time_ns = last
+                self.clamped += 1
+        
+        allocated = len(self.time_ns)
+        if self._size == allocated and allocated < self.capacity:
+            self._resize(min(self.capacity, allocated * 2))
+            allocated = len(self.time_ns)
+        
+        if self._size < allocated:
+            slot = self._start + self._size
+            if slot >= allocated:
+                slot -= allocated
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = slot + 1 if slot + 1 < allocated else 0
+            self.evicted += 1
+        
+        self.time_ns[slot] = time_ns
+        self.bid[slot] = bid
+        self.ask[slot] = ask
+        self.bid_size[slot] = bid_size
+        self.ask_size[slot] = ask_size
+        return time_ns
+    
+    def extend(
+        self,
+        time_ns: np.ndarray,
+        bid: np.ndarray,
+        ask: np.ndarray,
+        bid_size: np.ndarray,
+        ask_size: np.ndarray
+    ) -> np.ndarray:
+        """
+        Append many ticks (time ordered) at once; only the newest `capacity`
+        are kept. Returns the (possibly clamped) times of all of them.
+        """
+        time_ns = np.asarray(time_ns, dtype=np.int64)
+        if not len(time_ns):
+            return time_ns
+        
+        floor = self.time_ns[self._slot(-1)] if self._size else time_ns[0]
+        monotonic = np.maximum.accumulate(np.maximum(time_ns, floor))
+        self.clamped += int(np.count_nonzero(monotonic != time_ns))
+        
+        columns = [monotonic, bid, ask, bid_size, ask_size]
+        if len(monotonic) > self.capacity:
+            columns = [np.asarray(c)[-self.capacity:] for c in columns]
+        count = len(columns[0])
+        
+        allocated = len(self.time_ns)
+        needed = min(self.capacity, self._size + count)
+        if needed > allocated:
+            while allocated < needed:
+                allocated *= 2
+            self._resize(min(self.capacity, allocated))
+            allocated = len(self.time_ns)
+        
+        slots = (self._start + self._size + np.arange(count)) % allocated
+        for name, values in zip(self.COLUMNS, columns):
+            getattr(self, name)[slots] = values
+        
+        self.evicted += len(monotonic) - count
+        total = self._size + count
+        if total > allocated:
+            self._start = (self._start + total - allocated) % allocated
+            self.evicted += total - allocated
+            total = allocated
+        self._size = total
+        return monotonic
+    
+    def _resize(self, allocated: int):
+        """Reallocate the columns (at least `_size` slots), oldest tick first"""
+        for name in self.COLUMNS:
+            new = np.zeros(allocated, dtype=getattr(self, name).dtype)
+            new[:self._size] = self.values(name, 0, self._size)
+            setattr(self, name, new)
+        self._start = 0
+    
+    def drop_oldest(self, count: int) -> int:
+        """Evict up to `count` of the oldest ticks; returns how many were evicted"""
+        count = min(max(0, count), self._size)
+        if count:
+            self._start = (self._start + count) % len(self.time_ns)
+            self._size -= count
+            self.evicted += count
+        return count
+    
+    def drop_before(self, time_ns: int) -> int:
+        """Evict ticks stamped before `time_ns`"""
+        return self.drop_oldest(self.bisect(time_ns))
+    
+    def shrink(self, min_allocated: int = 1024) -> bool:
+        """Release memory when at most half of the allocation is in use"""
+        allocated = len(self.time_ns)
+        target = max(min_allocated, 1 << max(0, self._size - 1).bit_length())
+        if self._size * 2 > allocated or target >= allocated:
+            return False
+        self._resize(target)
+        return True
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated for the columns"""
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+    
+    def column(self, name: str) -> np.ndarray:
+        """One column, oldest first (a view unless the ring has wrapped)"""
+        return self.values(name, 0, self._size)
+    
+    def values(self, name: str, lo: int, hi: int) -> np.ndarray:
+        """Column values of ticks lo..hi-1 (a view unless they straddle the wrap)"""
+        data = getattr(self, name)
+        allocated = len(data)
+        first, last = self._start + lo, self._start + hi
+        if last <= allocated:
+            return data[first:last]
+        if first >= allocated:
+            return data[first - allocated:last - allocated]
+        return np.concatenate((data[first:], data[:last - allocated]))
+    
+    def snapshot(self) -> Dict[str, np.ndarray]:
+        """
+        Copies of every column, oldest first.
+        
+        Take it on the thread that appends (a concurrent append, resize or
+        eviction can tear it); the copies can then be read anywhere.
+        """
+        start, size = self._start, self._size
+        columns = {}
+        for name in self.COLUMNS:
+            data = getattr(self, name)
+            end = start + size
+            if end <= len(data):
+                columns[name] = data[start:end].copy()
+            else:
+                columns[name] = np.concatenate((data[start:], data[:end - len(data)]))
+        return columns
+    
+    def _slot(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("tick index out of range")
+        slot = self._start + index
+        return slot - len(self.time_ns) if slot >= len(self.time_ns) else slot
+    
+    def tick(self, index: int) -> Tick:
+        """Materialize one tick: 0 is the oldest, -1 the newest"""
+        slot = self._slot(index)
+        return Tick(
+            timestamp=from_ns(self.time_ns[slot]),
+            exchange=self.exchange,
+            pair=self.pair,
+            bid=float(self.bid[slot]),
+            ask=float(self.ask[slot]),
+            bid_size=float(self.bid_size[slot]),
+            ask_size=float(self.ask_size[slot]),
+        )
+    
+    def _runs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The time column as two sorted runs, oldest first (second empty unless wrapped)"""
+        end = self._start + self._size
+        allocated = len(self.time_ns)
+        if end <= allocated:
+            return self.time_ns[self._start:end], self.time_ns[:0]
+        return self.time_ns[self._start:], self.time_ns[:end - allocated]
+    
+    def bisect(self, time_ns: int, side: str = "left") -> int:
+        """Logical index where `time_ns` would be inserted, O(log n)"""
+        first, second = self._runs()
+        index = int(np.searchsorted(first, time_ns, side))
+        if index < len(first):
+            return index
+        return len(first) + int(np.searchsorted(second, time_ns, side))
+    
+    def range(
+        self,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        limit: Optional[int] = None,
+        ascending: bool = True
+    ) -> range:
+        """
+        Logical indices of ticks in [start_ns, end_ns], at most `limit`.
+        
+        Oldest first when `ascending`, otherwise newest first (the limit
+        then keeps the newest ticks).
+        """
+        lo = self.bisect(start_ns, "left") if start_ns is not None else 0
+        hi = self.bisect(end_ns, "right") if end_ns is not None else self._size
+        if hi <= lo:
+            return range(0)
+        if limit is not None:
+            limit = max(0, limit)
+            if ascending:
+                hi = min(hi, lo + limit)
+            else:
+                lo = max(lo, hi - limit)
+        return range(lo, hi) if ascending else range(hi - 1, lo - 1, -1)
+    
+    def iter_range(
+        self,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        ascending: bool = True,
+        chunk: int = 256
+    ) -> Iterator[Tick]:
+        """
+        Lazily yield ticks in [start_ns, end_ns], `chunk` at a time.
+        
+        Safe to consume while ticks are stored: positions are absolute
+        (counted from `evicted`), so later ticks are not included and
+        ticks evicted before they are reached are skipped.
+        """
+        indices = self.range(start_ns, end_ns)
+        first, stop = indices.start + self.evicted, indices.stop + self.evicted
+        if ascending:
+            position = first
+            while position < stop:
+                lo = max(position, self.evicted)
+                hi = min(stop, lo + chunk, self.evicted + self._size)
+                if lo >= hi:
+                    return
+                batch = list(self.ticks(range(lo - self.evicted, hi - self.evicted)))
+                yield from batch
+                position = hi
+        else:
+            position = stop
+            while position > first:
+                lo = max(first, position - chunk, self.evicted)
+                if lo >= position:
+                    return
+                batch = list(self.ticks(range(position - 1 - self.evicted, lo - 1 - self.evicted, -1)))
+                yield from batch
+                position = lo
+    
+    def ticks(self, indices: Iterator[int]) -> Iterator[Tick]:
+        for index in indices:
+            yield self.tick(index)
+    
+    def __iter__(self) -> Iterator[Tick]:
+        return self.ticks(range(self._size))
+    
+    def latest(self) -> Optional[Tick]:
+        return self.tick(-1) if self._size else None
+
+
+DEFAULT_CANDLE_INTERVALS = (1, 5, 60, 300, 3600)  # Seconds
+
+
+def _rollup(columns: Dict[str, np.ndarray], interval_ns: int) -> Dict[str, np.ndarray]:
+    """Merge time-ordered candle (or tick) columns into `interval_ns` candles"""
+    starts = columns["start_ns"] - columns["start_ns"] % interval_ns
+    if not len(starts):
+        return {name: column[:0] for name, column in columns.items()}
+    
+    edges = np.flatnonzero(np.diff(starts)) + 1
+    heads = np.concatenate(([0], edges))
+    tails = np.append(edges, len(starts)) - 1
+    return {
+        "start_ns": starts[heads],
+        "open": columns["open"][heads],
+        "high": np.maximum.reduceat(columns["high"], heads),
+        "low": np.minimum.reduceat(columns["low"], heads),
+        "close": columns["close"][tails],
+        "volume": np.add.reduceat(columns["volume"], heads),
+        "mid_sum": np.add.reduceat(columns["mid_sum"], heads),
+    }
+
+
+class CandleSeries:
+    """
+    OHLCV candles of one interval for one (exchange, pair), built as ticks arrive.
+    
+    Candles start at multiples of the interval since the epoch, so any
+    interval in seconds buckets correctly. The candle being built lives in
+    plain attributes; closed candles go into a columnar ring of `capacity`
+    candles, oldest first. Ticks must arrive in time order (TickBuffer's
+    stored times do).
+    """
+    
+    __slots__ = (
+        "exchange", "pair", "interval_ns", "capacity",
+        "start_ns", "open", "high", "low", "close", "volume", "mid_sum",
+        "_start", "_size", "_current"
+    )
+    
+    COLUMNS = ("start_ns", "open", "high", "low", "close", "volume", "mid_sum")
+    
+    def __init__(self, exchange: str, pair: str, interval_seconds: int, capacity: int, initial_capacity: int = 64):
+        self.exchange = exchange
+        self.pair = pair
+        self.interval_ns = int(interval_seconds * NS_PER_SECOND)
+        self.capacity = capacity
+        allocated = max(1, min(capacity, initial_capacity))
+        self.start_ns = np.zeros(allocated, dtype=np.int64)
+        self.open = np.zeros(allocated)
+        self.high = np.zeros(allocated)
+        self.low = np.zeros(allocated)
+        self.close = np.zeros(allocated)
+        self.volume = np.zeros(allocated, dtype=np.int64)
+        self.mid_sum = np.zeros(allocated)
+        self._start = 0  # Slot of the oldest closed candle
+        self._size = 0
+        self._current: Optional[list] = None  # [start_ns, open, high, low, close, volume, mid_sum]
+    
+    @property
+    def interval_seconds(self) -> float:
+        return self.interval_ns / NS_PER_SECOND
+    
+    def update(self, time_ns: int, mid: float):
+        self._merge(time_ns - time_ns % self.interval_ns, mid, mid, mid, mid, 1, mid)
+    
+    def update_many(self, time_ns: np.ndarray, mid: np.ndarray):
+        """Fold a time-ordered block of ticks in, one merge per candle"""
+        ticks = {
+            "start_ns": np.asarray(time_ns, dtype=np.int64),
+            "open": mid, "high": mid, "low": mid, "close": mid,
+            "volume": np.ones(len(mid), dtype=np.int64),
+            "mid_sum": mid,
+        }
+        for candle in zip(*(column.tolist() for column in _rollup(ticks, self.interval_ns).values())):
+            self._merge(*candle)
+    
+    def _merge(self, start_ns: int, open_: float, high: float, low: float, close: float, volume: int, mid_sum: float):
+        current = self._current
+        if current is not None and start_ns <= current[0]:
+            if high > current[2]:
+                current[2] = high
+            if low < current[3]:
+                current[3] = low
+            current[4] = close
+            current[5] += volume
+            current[6] += mid_sum
+            return
+        
+        if current is not None:
+            self._close(current)
+        self._current = [start_ns, open_, high, low, close, volume, mid_sum]
+    
+    def _close(self, candle: list):
+        allocated = len(self.start_ns)
+        if self._size < allocated:
+            slot = self._start + self._size  # Never wrapped before the ring is full
+            self._size += 1
+        elif allocated < self.capacity:
+            self._grow(min(self.capacity, allocated * 2))
+            slot = self._size
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = slot + 1 if slot + 1 < allocated else 0
+        
+        for name, value in zip(self.COLUMNS, candle):
+            getattr(self, name)[slot] = value
+    
+    def _grow(self, allocated: int):
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(allocated, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+    
+    def __len__(self) -> int:
+        return self._size + (self._current is not None)
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+    
+    def _bisect(self, start_ns: int) -> int:
+        """Closed candles starting before `start_ns`"""
+        end = self._start + self._size
+        allocated = len(self.start_ns)
+        first = self.start_ns[self._start:min(end, allocated)]
+        index = int(np.searchsorted(first, start_ns))
+        if index < len(first) or end <= allocated:
+            return index
+        return len(first) + int(np.searchsorted(self.start_ns[:end - allocated], start_ns))
+    
+    def columns(
+        self,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Candles overlapping [start_ns, end_ns], oldest first, including the
+        one being built. With `limit`, only the newest `limit`. O(log n + k).
+        """
+        lo = self._bisect(start_ns - self.interval_ns + 1) if start_ns is not None else 0
+        hi = self._bisect(end_ns + 1) if end_ns is not None else self._size
+        current = self._current
+        include_current = current is not None and (
+            (start_ns is None or current[0] + self.interval_ns > start_ns) and (end_ns is None or current[0] <= end_ns)
+        )
+        if limit is not None:
+            lo = max(lo, hi - max(0, limit - include_current))
+        
+        allocated = len(self.start_ns)
+        slots = (self._start + np.arange(lo, max(lo, hi))) % allocated
+        result = {name: getattr(self, name)[slots] for name in self.COLUMNS}
+        if include_current and (limit is None or limit > 0):
+            result = {
+                name: np.append(column, np.array(value, dtype=column.dtype))
+                for (name, column), value in zip(result.items(), current)
+            }
+        return result
+    
+    def candles(
+        self,
+        start_ns: Optional[int] = None,
+        end_ns: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[OHLCV]:
+        return candles_from_columns(self.exchange, self.pair, self.columns(start_ns, end_ns, limit))
+
+
+def candles_from_columns(exchange: str, pair: str, columns: Dict[str, np.ndarray]) -> List[OHLCV]:
+    rows = zip(*(columns[name].tolist() for name in CandleSeries.COLUMNS))
+    return [
+        OHLCV(
+            timestamp=from_ns(start_ns),
+            exchange=exchange,
+            pair=pair,
+            open=open_,
+            high=high,
+            low=low,
+            close=close,
+            volume=volume,
+            vwap=mid_sum / volume
+        )
+        for start_ns, open_, high, low, close, volume, mid_sum in rows
+    ]
+
+
+def fair_share(sizes: List[int], budget: int) -> int:
+    """Largest per-key cap with sum(min(size, cap)) <= budget (max-min fairness)"""
+    remaining = budget
+    ordered = sorted(sizes)
+    for i, size in enumerate(ordered):
+        share = remaining // (len(ordered) - i)
+        if size > share:
+            return share
+        remaining -= size
+    return ordered[-1] if ordered else 0
+
+
+class TickCompactor:
+    """
+    Retention and a global memory budget for an in-memory tick store.
+    
+    Works on any store keeping `ticks: Dict[key, TickBuffer]` and a
+    `retention` timedelta (TickStorage, InMemoryFallback). Each pass:
+    - evicts ticks older than the retention window
+    - if more than `memory_budget_bytes` of ticks remain, caps every key
+      (hot ticks plus compressed cold blocks) at a max-min fair share of
+      the budget: keys below the share keep everything, larger keys lose
+      their oldest ticks down to it, cold blocks before hot ticks
+    - shrinks buffers left at most half full
+    - drops expired compressed cold blocks, if the store keeps them
+    
+    Run `run()` on the event loop that stores ticks, so passes never
+    interleave with writes. Evicted ticks stay summarized in TickStorage's
+    candles, which are built at ingest.
+    """
+    
+    TICK_BYTES = 40  # int64 time + four float64 columns
+    
+    def __init__(
+        self,
+        storage: Any,
+        memory_budget_bytes: Optional[int] = None,
+        interval_seconds: float = 10.0,
+        name: str = "tick_storage"
+    ):
+        """
+        Args:
+            storage: Store whose `ticks` buffers are compacted
+            memory_budget_bytes: Stored tick bytes allowed across all keys (None: no budget)
+            interval_seconds: Seconds between passes in `run()`
+            name: Label for the eviction metrics
+        """
+        self.storage = storage
+        self.memory_budget_bytes = memory_budget_bytes
+        self.interval_seconds = interval_seconds
+        self.name = name
+        
+        self.passes = 0
+        self.evicted_age = 0
+        self.evicted_budget = 0
+        self.last_share: Optional[int] = None
+        self.last_pass_ms = 0.0
+        
+        storage.compactor = self
+    
+    def compact(self, now: Optional[datetime] = None) -> Tuple[int, int]:
+        """One pass; returns ticks evicted (by age, by budget)"""
+        start = time.perf_counter()
+        buffers: List[TickBuffer] = list(self.storage.ticks.values())
+        cutoff_ns = to_ns((now or datetime.now()) - self.storage.retention)
+        
+        by_age = sum(buffer.drop_before(cutoff_ns) for buffer in buffers)
+        expire_cold = getattr(self.storage, "expire_cold", None)
+        if expire_cold is not None:
+            by_age += expire_cold(cutoff_ns)
+        
+        by_budget = 0
+        self.last_share = None
+        if self.memory_budget_bytes is not None:
+            cold = getattr(self.storage, "cold", {})
+            keys = [(buffer, cold.get((buffer.exchange, buffer.pair), [])) for buffer in buffers]
+            sizes = [len(buffer) * self.TICK_BYTES + sum(block.nbytes for block in blocks) for buffer, blocks in keys]
+            if sum(sizes) > self.memory_budget_bytes:
+                share = fair_share(sizes, self.memory_budget_bytes)
+                by_budget = sum(
+                    self._evict_oldest(buffer, blocks, size - share)
+                    for (buffer, blocks), size in zip(keys, sizes) if size > share
+                )
+                self.last_share = share
+        
+        for buffer in buffers:
+            buffer.shrink()
+        
+        self.passes += 1
+        self.evicted_age += by_age
+        self.evicted_budget += by_budget
+        self.last_pass_ms = (time.perf_counter() - start) * 1000
+        
+        metrics_engine.record_tick_compaction(
+            self.name, by_age, by_budget,
+            sum(buffer.nbytes for buffer in buffers) + getattr(self.storage, "cold_bytes", 0)
+        )
+        if by_budget:
+            logger.info(f"🧹 Evicted {by_budget} ticks over the memory budget (share {self.last_share} bytes per key)")
+        return by_age, by_budget
+    
+    def _evict_oldest(self, buffer: TickBuffer, blocks: List[TickBlock], excess_bytes: int) -> int:
+        """Free `excess_bytes` of a key's oldest ticks, whole cold blocks first; returns ticks evicted"""
+        evicted = 0
+        while blocks and excess_bytes > 0:
+            block = blocks.pop(0)
+            excess_bytes -= block.nbytes
+            evicted += block.count
+        if excess_bytes > 0:
+            evicted += buffer.drop_oldest(-(-excess_bytes // self.TICK_BYTES))
+        return evicted
+    
+    async def run(self):
+        """Compact every interval until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Tick compaction error: {e}")
+    
+    def get_state(self) -> dict:
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "interval_seconds": self.interval_seconds,
+            "passes": self.passes,
+            "evicted_age": self.evicted_age,
+            "evicted_budget": self.evicted_budget,
+            "fair_share_bytes": self.last_share,
+            "last_pass_ms": round(self.last_pass_ms, 3),
+        }
+
+
 class TickStorage:
     """
     In-memory tick storage with aggregation.
     
     Features:
     - Store millions of ticks efficiently
-    - Aggregate to OHLCV candles
+    - OHLCV candles at several resolutions, built as ticks arrive
     - Query by time range
+    - Optional compression of sealed (cold) blocks of older ticks
     - Export/import functionality
     
     In production, replace with TimescaleDB:
@@ -111,168 +764,327 @@ class TickStorage:
     ```
     """
     
-    def __init__(self, max_ticks_per_key: int = 100000, retention_hours: int = 24):
+    def __init__(
+        self,
+        max_ticks_per_key: int = 100000,
+        retention_hours: int = 24,
+        candle_intervals: Tuple[int, ...] = DEFAULT_CANDLE_INTERVALS,
+        candle_capacity: int = 1000,
+        compress_block_ticks: int = 0
+    ):
         """
         Args:
             max_ticks_per_key: Max ticks to keep per exchange/pair combo
             retention_hours: Hours of data to retain
+            candle_intervals: Candle resolutions (seconds) maintained on ingest
+            candle_capacity: Closed candles kept per key and resolution
+            compress_block_ticks: Ticks sealed per cold block when a buffer is
+                full (0: no compression, the oldest ticks are overwritten)
         """
         self.max_ticks = max_ticks_per_key
         self.retention = timedelta(hours=retention_hours)
+        self.candle_intervals = tuple(sorted(candle_intervals))
+        self.candle_capacity = candle_capacity
+        self.compress_block_ticks = min(compress_block_ticks, max_ticks_per_key)
         
-        # Tick storage: (exchange, pair) -> deque of Ticks
-        self.ticks: Dict[Tuple[str, str], deque] = {}
+        # Tick storage: (exchange, pair) -> columnar ring buffer (hot ticks)
+        self.ticks: Dict[Tuple[str, str], TickBuffer] = {}
+        # (exchange, pair) -> compressed blocks of older ticks, oldest first
+        self.cold: Dict[Tuple[str, str], List[TickBlock]] = {}
+        # (exchange, pair) -> candle series, one per interval (ascending)
+        self.candles: Dict[Tuple[str, str], List[CandleSeries]] = {}
         
         # Statistics
         self.total_ticks_stored = 0
         self.total_ticks_received = 0
         self.start_time: Optional[datetime] = None
+        
+        # Set by the latest TickExporter (engine_export) for progress reporting
+        self.exporter = None
+        # Set by a TickCompactor enforcing retention and the memory budget
+        self.compactor: Optional[TickCompactor] = None
     
-    def store(self, exchange: str, pair: str, bid: float, ask: float, timestamp: Optional[datetime] = None):
+    def store(
+        self,
+        exchange: str,
+        pair: str,
+        bid: float,
+        ask: float,
+        timestamp: Optional[datetime] = None,
+        bid_size: float = 0.0,
+        ask_size: float = 0.0
+    ):
         """Store a tick"""
         timestamp = timestamp or datetime.now()
         
         if self.start_time is None:
             self.start_time = timestamp
         
-        tick = Tick(
-            timestamp=timestamp,
-            exchange=exchange,
-            pair=pair,
-            bid=bid,
-            ask=ask
-        )
+        buffer = self.ticks.get((exchange, pair))
+        if buffer is None:
+            buffer = self._create_key(exchange, pair)
+        if self.compress_block_ticks and len(buffer) >= buffer.capacity:
+            self._seal(buffer)
+        time_ns = buffer.append(to_ns(timestamp), bid, ask, bid_size, ask_size)
         
-        key = (exchange, pair)
-        if key not in self.ticks:
-            self.ticks[key] = deque(maxlen=self.max_ticks)
+        mid = (bid + ask) / 2
+        for series in self.candles[(exchange, pair)]:
+            series.update(time_ns, mid)
         
-        self.ticks[key].append(tick)
         self.total_ticks_stored += 1
         self.total_ticks_received += 1
     
+    def _create_key(self, exchange: str, pair: str) -> TickBuffer:
+        key = (exchange, pair)
+        self.candles[key] = [
+            CandleSeries(exchange, pair, interval, self.candle_capacity) for interval in self.candle_intervals
+        ]
+        self.cold[key] = []
+        buffer = self.ticks[key] = TickBuffer(exchange, pair, self.max_ticks)
+        return buffer
+    
+    def _seal(self, buffer: TickBuffer):
+        """Compress the buffer's oldest `compress_block_ticks` ticks into a cold block"""
+        count = min(self.compress_block_ticks, len(buffer))
+        block = TickBlock.encode({name: buffer.values(name, 0, count) for name in TickBuffer.COLUMNS})
+        buffer.drop_oldest(count)
+        
+        blocks = self.cold[(buffer.exchange, buffer.pair)]
+        blocks.append(block)
+        # Retention in tick time, so cold blocks stay bounded without a compactor
+        cutoff_ns = block.last_ns - int(self.retention.total_seconds() * NS_PER_SECOND)
+        while blocks[0].last_ns < cutoff_ns:
+            blocks.pop(0)
+    
+    def expire_cold(self, cutoff_ns: int) -> int:
+        """Drop cold blocks whose ticks are all older than `cutoff_ns`; returns ticks dropped"""
+        dropped = 0
+        for blocks in self.cold.values():
+            while blocks and blocks[0].last_ns < cutoff_ns:
+                dropped += blocks.pop(0).count
+        return dropped
+    
+    @property
+    def cold_bytes(self) -> int:
+        """Compressed bytes held in cold blocks"""
+        return sum(block.nbytes for blocks in self.cold.values() for block in blocks)
+    
+    def store_batch(self, exchange: str, pair: str, columns: Dict[str, np.ndarray]):
+        """Store a block of one key's ticks given as TickBuffer columns (e.g. from an export)"""
+        count = len(columns["time_ns"])
+        if not count:
+            return
+        
+        if self.start_time is None:
+            self.start_time = from_ns(int(columns["time_ns"][0]))
+        
+        buffer = self.ticks.get((exchange, pair))
+        if buffer is None:
+            buffer = self._create_key(exchange, pair)
+        
+        offset = 0
+        while offset < count:
+            # With compression, add only what fits and seal before overflowing
+            room = count - offset
+            if self.compress_block_ticks:
+                if len(buffer) >= buffer.capacity:
+                    self._seal(buffer)
+                room = min(room, buffer.capacity - len(buffer))
+            piece = {name: np.asarray(columns[name])[offset:offset + room] for name in TickBuffer.COLUMNS}
+            times = buffer.extend(*(piece[name] for name in TickBuffer.COLUMNS))
+            
+            mid = (piece["bid"] + piece["ask"]) / 2
+            for series in self.candles[(exchange, pair)]:
+                series.update_many(times, mid)
+            offset += room
+        
+        self.total_ticks_stored += count
+        self.total_ticks_received += count
+    
     def get_ticks(
         self, 
         exchange: str, 
         pair: str, 
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
-        limit: int = 1000
+        limit: int = 1000,
+        ascending: bool = True
     ) -> List[Tick]:
-        """Get ticks for an exchange/pair within time range"""
-        key = (exchange, pair)
-        if key not in self.ticks:
+        """Get ticks for an exchange/pair within time range (oldest first unless not `ascending`)"""
+        buffer = self.ticks.get((exchange, pair))
+        if buffer is None:
             return []
         
-        result = []
-        for tick in self.ticks[key]:
-            if start and tick.timestamp < start:
-                continue
-            if end and tick.timestamp > end:
-                continue
-            result.append(tick)
-            if len(result) >= limit:
-                break
+        start_ns = to_ns(start) if start else None
+        end_ns = to_ns(end) if end else None
+        if not self.cold[(exchange, pair)]:
+            return list(buffer.ticks(buffer.range(start_ns, end_ns, limit, ascending)))
+        return list(islice(self._iter_key(buffer, start_ns, end_ns, ascending), limit))
+    
+    def _iter_key(
+        self,
+        buffer: TickBuffer,
+        start_ns: Optional[int],
+        end_ns: Optional[int],
+        ascending: bool = True
+    ) -> Iterator[Tick]:
+        """One key's ticks in [start_ns, end_ns]: overlapping cold blocks, then the hot buffer"""
+        blocks = [
+            block for block in self.cold.get((buffer.exchange, buffer.pair), ())
+            if block.overlaps(start_ns, end_ns)
+        ]
+        cold = (
+            tick
+            for block in (blocks if ascending else reversed(blocks))
+            for tick in self._block_ticks(buffer, block, start_ns, end_ns, ascending)
+        )
+        hot = buffer.iter_range(start_ns, end_ns, ascending)
+        return chain(cold, hot) if ascending else chain(hot, cold)
+    
+    @staticmethod
+    def _block_ticks(
+        buffer: TickBuffer,
+        block: TickBlock,
+        start_ns: Optional[int],
+        end_ns: Optional[int],
+        ascending: bool
+    ) -> Iterator[Tick]:
+        """Decode one cold block (only when reached) and yield its ticks in range"""
+        columns = block.decode(start_ns, end_ns)
+        rows = zip(*(columns[name].tolist() for name in TickBuffer.COLUMNS))
+        if not ascending:
+            rows = reversed(list(rows))
+        for time_ns, bid, ask, bid_size, ask_size in rows:
+            yield Tick(from_ns(time_ns), buffer.exchange, buffer.pair, bid, ask, bid_size, ask_size)
+    
+    def snapshot(self, exchange: str, pair: str) -> Dict[str, np.ndarray]:
+        """Copies of one key's columns, cold blocks decoded, oldest first (see `capture`)"""
+        return self.assemble(*self.capture(exchange, pair))
+    
+    def capture(self, exchange: str, pair: str) -> Tuple[Dict[str, np.ndarray], List[TickBlock]]:
+        """
+        Copies of one key's hot columns and of its cold block list.
         
-        return result
+        Call on the thread that stores ticks: appends, sealing and expiry
+        mutate both. Sealed blocks are immutable, so `assemble` can decode
+        the result on any thread.
+        """
+        return self.ticks[(exchange, pair)].snapshot(), list(self.cold.get((exchange, pair), ()))
+    
+    @staticmethod
+    def assemble(hot: Dict[str, np.ndarray], blocks: List[TickBlock]) -> Dict[str, np.ndarray]:
+        """One key's columns, oldest first, from a `capture`"""
+        if not blocks:
+            return hot
+        decoded = [block.decode() for block in blocks] + [hot]
+        return {name: np.concatenate([part[name] for part in decoded]) for name in TickBuffer.COLUMNS}
     
     def get_all_ticks(
         self,
         pair: Optional[str] = None,
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
-        limit: int = 10000
+        limit: int = 10000,
+        ascending: bool = True
     ) -> List[Tick]:
         """Get ticks across all exchanges for a pair"""
-        result = []
-        
-        for (exchange, p), ticks in self.ticks.items():
-            if pair and p != pair:
-                continue
-            
-            for tick in ticks:
-                if start and tick.timestamp < start:
-                    continue
-                if end and tick.timestamp > end:
-                    continue
-                result.append(tick)
+        return list(self.iter_ticks(pair, start, end, limit, ascending))
+    
+    def iter_ticks(
+        self,
+        pair: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        ascending: bool = True,
+        exchanges: Optional[List[str]] = None
+    ) -> Iterator[Tick]:
+        """
+        Lazily merge every matching key's ticks in time order.
         
-        # Sort by timestamp and limit
-        result.sort(key=lambda t: t.timestamp)
-        return result[:limit]
+        Each key is already time ordered, so a k-way heap merge yields
+        them in O(log k) per tick, materializing only what is consumed.
+        """
+        start_ns = to_ns(start) if start else None
+        end_ns = to_ns(end) if end else None
+        series = [
+            self._iter_key(buffer, start_ns, end_ns, ascending)
+            for (exchange, p), buffer in list(self.ticks.items())
+            if (not pair or p == pair) and (not exchanges or exchange in exchanges)
+        ]
+        merged = heapq.merge(*series, key=attrgetter("timestamp"), reverse=not ascending)
+        return islice(merged, limit) if limit is not None else merged
     
-    def aggregate_ohlcv(
-        self, 
-        exchange: str, 
-        pair: str, 
+    def get_candles(
+        self,
+        exchange: str,
+        pair: str,
         interval_seconds: int = 60,
         start: Optional[datetime] = None,
-        end: Optional[datetime] = None
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None
     ) -> List[OHLCV]:
-        """Aggregate ticks into OHLCV candles"""
-        ticks = self.get_ticks(exchange, pair, start, end, limit=100000)
+        """
+        OHLCV candles overlapping [start, end], oldest first (the newest
+        `limit` if given; the last candle may still be forming).
         
-        if not ticks:
+        Maintained resolutions are read directly. Any other whole-second
+        interval is rolled up from the coarsest maintained resolution that
+        divides it, or from the raw ticks if none does. Raises ValueError
+        unless `interval_seconds` is positive.
+        """
+        if interval_seconds <= 0:
+            raise ValueError(f"Candle interval must be positive, got {interval_seconds}s")
+        key = (exchange, pair)
+        if key not in self.ticks:
             return []
         
-        candles = []
-        current_candle_start = None
-        current_ticks = []
-        
-        for tick in ticks:
-            # Determine candle start time
-            candle_start = datetime(
-                tick.timestamp.year,
-                tick.timestamp.month,
-                tick.timestamp.day,
-                tick.timestamp.hour,
-                (tick.timestamp.minute // (interval_seconds // 60)) * (interval_seconds // 60),
-                0
-            )
-            
-            if current_candle_start is None:
-                current_candle_start = candle_start
-            
-            if candle_start != current_candle_start:
-                # Finalize previous candle
-                if current_ticks:
-                    candles.append(self._create_ohlcv(
-                        exchange, pair, current_candle_start, current_ticks
-                    ))
-                current_candle_start = candle_start
-                current_ticks = []
-            
-            current_ticks.append(tick)
+        start_ns = to_ns(start) if start else None
+        end_ns = to_ns(end) if end else None
+        interval_ns = int(interval_seconds * NS_PER_SECOND)
+        
+        source = None
+        for series in self.candles[key]:
+            if interval_ns % series.interval_ns == 0:
+                source = series  # Ascending, so the last match is the coarsest
         
-        # Finalize last candle
-        if current_ticks:
-            candles.append(self._create_ohlcv(
-                exchange, pair, current_candle_start, current_ticks
-            ))
+        if source is not None and source.interval_ns == interval_ns:
+            return source.candles(start_ns, end_ns, limit)
         
-        return candles
+        if source is not None:
+            # Widen the range to whole target candles before rolling up
+            lo = start_ns - start_ns % interval_ns if start_ns is not None else None
+            # `limit` target candles span at most this many source candles
+            source_limit = limit * (interval_ns // source.interval_ns) + 1 if limit is not None else None
+            columns = source.columns(lo, end_ns, source_limit)
+        else:
+            buffer = self.ticks[key]
+            lo = start_ns - start_ns % interval_ns if start_ns is not None else None
+            indices = buffer.range(lo, end_ns)
+            times = buffer.values("time_ns", indices.start, indices.stop)
+            mid = (buffer.values("bid", indices.start, indices.stop) + buffer.values("ask", indices.start, indices.stop)) / 2
+            columns = {
+                "start_ns": times,
+                "open": mid, "high": mid, "low": mid, "close": mid,
+                "volume": np.ones(len(times), dtype=np.int64),
+                "mid_sum": mid,
+            }
+        
+        columns = _rollup(columns, interval_ns)
+        if limit is not None:
+            columns = {name: column[max(0, len(column) - limit):] for name, column in columns.items()}
+        return candles_from_columns(exchange, pair, columns)
     
-    def _create_ohlcv(
+    def aggregate_ohlcv(
         self, 
         exchange: str, 
         pair: str, 
-        timestamp: datetime, 
-        ticks: List[Tick]
-    ) -> OHLCV:
-        """Create OHLCV candle from ticks"""
-        prices = [t.mid for t in ticks]
-        
-        return OHLCV(
-            timestamp=timestamp,
-            exchange=exchange,
-            pair=pair,
-            open=prices[0],
-            high=max(prices),
-            low=min(prices),
-            close=prices[-1],
-            volume=len(ticks),
-            vwap=sum(prices) / len(prices)
-        )
+        interval_seconds: int = 60,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[OHLCV]:
+        """Aggregate ticks into OHLCV candles (see `get_candles`)"""
+        return self.get_candles(exchange, pair, interval_seconds, start, end)
     
     def get_statistics(self) -> dict:
         """Get storage statistics"""
@@ -281,17 +1093,37 @@ class TickStorage:
             "total_ticks_stored": self.total_ticks_stored,
             "unique_keys": len(self.ticks),
             "ticks_per_key": {},
+            "memory_bytes": 0,
             "memory_estimate_mb": 0,
         }
         
         total_ticks = 0
-        for (exchange, pair), ticks in self.ticks.items():
-            count = len(ticks)
+        total_bytes = 0
+        cold_ticks = 0
+        for (exchange, pair), buffer in self.ticks.items():
+            cold = sum(block.count for block in self.cold[(exchange, pair)])
+            count = len(buffer) + cold
             stats["ticks_per_key"][f"{exchange}/{pair}"] = count
             total_ticks += count
+            cold_ticks += cold
+            total_bytes += buffer.nbytes
+        cold_bytes = self.cold_bytes
+        total_bytes += cold_bytes
         
-        # Rough memory estimate (each tick ~200 bytes)
-        stats["memory_estimate_mb"] = round(total_ticks * 200 / 1024 / 1024, 2)
+        # Column bytes actually allocated (buffers grow by doubling) plus compressed blocks
+        stats["memory_bytes"] = total_bytes
+        stats["memory_estimate_mb"] = round(total_bytes / 1024 / 1024, 2)
+        stats["bytes_per_tick"] = round(total_bytes / total_ticks, 1) if total_ticks else 0.0
+        stats["cold_ticks"] = cold_ticks
+        stats["cold_bytes"] = cold_bytes
+        stats["compression_ratio"] = (
+            round(cold_ticks * TickCompactor.TICK_BYTES / cold_bytes, 2) if cold_bytes else None
+        )
+        stats["out_of_order_ticks"] = sum(buffer.clamped for buffer in self.ticks.values())
+        stats["candle_intervals"] = list(self.candle_intervals)
+        stats["candle_memory_bytes"] = sum(
+            series.nbytes for key_series in self.candles.values() for series in key_series
+        )
         
         if self.start_time:
             duration = (datetime.now() - self.start_time).total_seconds()
@@ -301,42 +1133,23 @@ class TickStorage:
         
         return stats
     
-    def export_json(self, filepath: str, compressed: bool = True):
-        """Export all ticks to JSON file"""
-        data = {
-            "exported_at": datetime.now().isoformat(),
-            "statistics": self.get_statistics(),
-            "ticks": {}
-        }
-        
-        for (exchange, pair), ticks in self.ticks.items():
-            key = f"{exchange}/{pair}"
-            data["ticks"][key] = [t.to_dict() for t in ticks]
-        
-        if compressed:
-            with gzip.open(filepath + ".gz", 'wt', encoding='utf-8') as f:
-                json.dump(data, f)
-        else:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
-        
-        logger.info(f"Exported {self.total_ticks_stored} ticks to {filepath}")
-    
     def get_state(self) -> dict:
         """Get current state for API/dashboard"""
         stats = self.get_statistics()
         
         # Get recent ticks sample
         recent_ticks = []
-        for (exchange, pair), ticks in self.ticks.items():
-            if ticks:
-                recent_ticks.append(ticks[-1].to_dict())
+        for buffer in self.ticks.values():
+            if len(buffer):
+                recent_ticks.append(buffer.latest().to_dict())
         
         return {
             "storage_statistics": stats,
             "recent_ticks": recent_ticks[:20],
             "available_pairs": list(set(pair for _, pair in self.ticks.keys())),
             "available_exchanges": list(set(ex for ex, _ in self.ticks.keys())),
+            "export": self.exporter.get_state() if self.exporter else None,
+            "compaction": self.compactor.get_state() if self.compactor else None,
         }
 
 
@@ -377,16 +1190,11 @@ class ReplayEngine:
         Yields:
             Tick objects in chronological order
         """
-        ticks = self.storage.get_all_ticks(pair, start, end, limit=100000)
-        
-        if not ticks:
-            return
+        ticks = self.storage.iter_ticks(pair, start, end)
         
         self.is_playing = True
         self.playback_speed = speed
         
-        import time
-        
         last_time = None
         for i, tick in enumerate(ticks):
             if not self.is_playing:
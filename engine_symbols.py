@@ -0,0 +1,98 @@
+"""
+Interned Symbol Registry
+
+Maps exchange, pair and currency names to small integer ids:
+- Ids are dense (0, 1, 2, ...) and never reused, so engines can key dicts
+  or index lists by them
+- Every pair's base and quote currency ids are computed once, when the pair
+  is first seen, instead of splitting "BASE/QUOTE" on every tick
+- Names are `sys.intern`ed, so the strings handed back are shared objects
+
+Exchange clients resolve ids once, when a message is parsed, and carry them
+on the PriceUpdate; engines receive ids rather than looking names up again.
+Registration is thread safe; lookups of known names take no lock.
+"""
+
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+NO_CURRENCY = -1  # Base/quote id of a pair name without a "/"
+
+
+class SymbolRegistry:
+    """Integer ids for exchange, pair and currency names"""
+    
+    def __init__(self):
+        self.exchanges: List[str] = []   # exchange id -> name
+        self.pairs: List[str] = []       # pair id -> name
+        self.currencies: List[str] = []  # currency id -> name
+        self.pair_base: List[int] = []   # pair id -> base currency id
+        self.pair_quote: List[int] = []  # pair id -> quote currency id
+        
+        self._exchange_ids: Dict[str, int] = {}
+        self._pair_ids: Dict[str, int] = {}
+        self._currency_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def _intern(self, ids: Dict[str, int], names: List[str], name: str) -> int:
+        with self._lock:
+            symbol_id = ids.get(name)
+            if symbol_id is None:
+                symbol_id = len(names)
+                names.append(sys.intern(name))
+                ids[names[symbol_id]] = symbol_id
+            return symbol_id
+    
+    def exchange_id(self, name: str) -> int:
+        """Id of an exchange, registering it if new"""
+        exchange_id = self._exchange_ids.get(name)
+        return exchange_id if exchange_id is not None else self._intern(self._exchange_ids, self.exchanges, name)
+    
+    def currency_id(self, name: str) -> int:
+        """Id of a currency, registering it if new"""
+        currency_id = self._currency_ids.get(name)
+        return currency_id if currency_id is not None else self._intern(self._currency_ids, self.currencies, name)
+    
+    def pair_id(self, name: str) -> int:
+        """Id of a "BASE/QUOTE" pair, registering it (and its currencies) if new"""
+        pair_id = self._pair_ids.get(name)
+        if pair_id is not None:
+            return pair_id
+        
+        base = quote = NO_CURRENCY
+        if '/' in name:
+            base_name, quote_name = name.split('/', 1)
+            base, quote = self.currency_id(base_name), self.currency_id(quote_name)
+        with self._lock:
+            pair_id = self._pair_ids.get(name)
+            if pair_id is None:
+                # Base/quote are appended before the id is published
+                self.pair_base.append(base)
+                self.pair_quote.append(quote)
+                pair_id = len(self.pairs)
+                self.pairs.append(sys.intern(name))
+                self._pair_ids[self.pairs[pair_id]] = pair_id
+            return pair_id
+    
+    def find_currency(self, name: str) -> Optional[int]:
+        """Id of a currency if it has been seen, without registering it"""
+        return self._currency_ids.get(name)
+    
+    def split(self, pair_id: int) -> Optional[Tuple[str, str]]:
+        """(base, quote) names of a pair, None if it has no "/" """
+        base = self.pair_base[pair_id]
+        if base == NO_CURRENCY:
+            return None
+        return self.currencies[base], self.currencies[self.pair_quote[pair_id]]
+    
+    def get_state(self) -> dict:
+        return {
+            "exchanges": len(self.exchanges),
+            "pairs": len(self.pairs),
+            "currencies": len(self.currencies),
+        }
+
+
+# Global registry shared by exchange clients and engines
+symbols = SymbolRegistry()
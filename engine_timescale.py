@@ -9,14 +9,36 @@ Provides high-performance time-series storage for:
 
 TimescaleDB is a PostgreSQL extension optimized for time-series data.
 If TimescaleDB is not available, falls back to in-memory storage.
+
+Writes never block the caller: `store()` appends a row to a queue and a
+dedicated writer thread inserts batches, flushing when a batch fills or
+every `flush_interval_ms`. A failed batch goes back to the front of the
+queue and is retried with exponential backoff. The queue is bounded; when
+the database falls that far behind, the oldest queued rows are dropped
+and counted.
+
+Batches are streamed with `COPY ticks FROM STDIN` (text or binary format,
+encoded into one reused buffer) on a connection the writer keeps checked
+out, or inserted with `execute_values` in "insert" mode. The batch size
+adapts to observed flush latency. See scripts/bench_timescale_ingest.py.
 """
 
+import io
 import logging
+import struct
+import threading
+import time
+from collections import deque
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Tuple, Any, Generator
-from collections import deque
 import json
+import math
+
+import numpy as np
+
+from engine_metrics import metrics_engine
+from engine_storage import Tick, TickBuffer, to_ns
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +97,101 @@ class TickRecord:
         }
 
 
+INGEST_MODES = ("copy", "insert")
+COPY_FORMATS = ("text", "binary")
+TICK_COLUMNS = "time, exchange, pair, bid, ask, bid_size, ask_size"
+
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+def _copy_text(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _utc(timestamp: datetime) -> datetime:
+    """Aware UTC time; naive datetimes are local time, as in `to_ns`"""
+    return timestamp.astimezone(timezone.utc)
+
+
+def _copy_field(value: str) -> bytes:
+    data = value.encode()
+    return struct.pack("!i", len(data)) + data
+
+
+class CopyEncoder:
+    """
+    Encodes queued tick rows for `COPY ticks FROM STDIN` into one reused buffer.
+    
+    - text: tab-separated lines, NULL as \\N, timestamps in UTC with an
+      explicit +00:00 offset
+    - binary: PGCOPY framing, timestamps as microseconds since 2000-01-01 UTC
+    
+    Naive datetimes are taken as local time (like `datetime.timestamp()`) in
+    both formats, so the stored instant never depends on the session TimeZone.
+    
+    The (exchange, pair) columns are encoded once per key and cached.
+    """
+    
+    BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+    BINARY_TRAILER = struct.pack("!h", -1)
+    BINARY_NULL = struct.pack("!i", -1)
+    _BINARY_START = struct.Struct("!hiq")  # Field count, then the 8-byte timestamp
+    _BINARY_FLOAT = struct.Struct("!id")
+    
+    def __init__(self, fmt: str = "text"):
+        if fmt not in COPY_FORMATS:
+            raise ValueError(f"Unknown COPY format: {fmt}")
+        self.fmt = fmt
+        self.statement = f"COPY ticks ({TICK_COLUMNS}) FROM STDIN WITH (FORMAT {fmt})"
+        self.buffer = io.BytesIO()
+        self.bytes_encoded = 0
+        self._keys: Dict[Tuple[str, str], Any] = {}
+    
+    def encode(self, rows: List[tuple]) -> io.BytesIO:
+        """Encode rows as (time, exchange, pair, bid, ask, bid_size, ask_size); returns the rewound buffer"""
+        buffer = self.buffer
+        buffer.seek(0)
+        buffer.truncate()
+        buffer.write(self._encode_text(rows) if self.fmt == "text" else self._encode_binary(rows))
+        self.bytes_encoded += buffer.tell()
+        buffer.seek(0)
+        return buffer
+    
+    def _key(self, exchange: str, pair: str) -> Any:
+        key = self._keys.get((exchange, pair))
+        if key is None:
+            if self.fmt == "text":
+                key = f"{_copy_text(exchange)}\t{_copy_text(pair)}\t"
+            else:
+                key = _copy_field(exchange) + _copy_field(pair)
+            key = self._keys[(exchange, pair)] = key
+        return key
+    
+    def _encode_text(self, rows: List[tuple]) -> bytes:
+        null = "\\N"
+        lines = [
+            f"{_utc(timestamp).isoformat(' ')}\t{self._key(exchange, pair)}{bid}\t{ask}\t"
+            f"{null if bid_size is None else bid_size}\t{null if ask_size is None else ask_size}\n"
+            for timestamp, exchange, pair, bid, ask, bid_size, ask_size in rows
+        ]
+        return "".join(lines).encode()
+    
+    def _encode_binary(self, rows: List[tuple]) -> bytes:
+        start, number, null = self._BINARY_START.pack, self._BINARY_FLOAT.pack, self.BINARY_NULL
+        parts = [self.BINARY_HEADER]
+        for timestamp, exchange, pair, bid, ask, bid_size, ask_size in rows:
+            micros = (_utc(timestamp) - PG_EPOCH) // ONE_MICROSECOND
+            parts.append(start(7, 8, micros))
+            parts.append(self._key(exchange, pair))
+            parts.append(number(8, bid))
+            parts.append(number(8, ask))
+            parts.append(null if bid_size is None else number(8, bid_size))
+            parts.append(null if ask_size is None else number(8, ask_size))
+        parts.append(self.BINARY_TRAILER)
+        return b"".join(parts)
+
+
 class TimescaleDBStorage:
     """
     TimescaleDB storage engine for tick data.
@@ -85,12 +202,15 @@ class TimescaleDBStorage:
     - ticks_1h: Continuous aggregate for 1-hour OHLCV
     
     Features:
+    - Non-blocking batched writes from a background writer thread
     - Automatic chunk management
     - Compression for old data
     - Continuous aggregates for fast queries
     - Retention policies
     """
     
+    MAX_RETRY_DELAY = 5.0  # Longest backoff, in seconds, before retrying a failed batch
+    
     CREATE_EXTENSION = "CREATE EXTENSION IF NOT EXISTS timescaledb;"
     
     CREATE_TICKS_TABLE = """
@@ -164,8 +284,31 @@ class TimescaleDBStorage:
         min_connections: int = 1,
         max_connections: int = 10,
         enable_compression: bool = True,
-        retention_days: int = 30
+        retention_days: int = 30,
+        batch_size: int = 1000,
+        flush_interval_ms: float = 250.0,
+        max_queue_rows: int = 100000,
+        ingest_mode: str = "copy",
+        copy_format: str = "text",
+        adaptive_batching: bool = True,
+        min_batch_size: int = 250,
+        max_batch_size: int = 50000,
+        target_flush_ms: float = 100.0
     ):
+        """
+        Args:
+            batch_size: Rows per write (the initial size when adaptive); a full batch wakes the writer early
+            flush_interval_ms: Longest a queued row waits for the writer
+            max_queue_rows: Queued rows kept before the oldest are dropped
+            ingest_mode: "copy" (COPY FROM STDIN) or "insert" (execute_values)
+            copy_format: "text" or "binary" COPY encoding
+            adaptive_batching: Resize batches toward `target_flush_ms`
+            min_batch_size: Smallest adaptive batch
+            max_batch_size: Largest adaptive batch
+            target_flush_ms: Flush latency adaptive batching aims below
+        """
+        if ingest_mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode: {ingest_mode}")
         self.host = host
         self.port = port
         self.database = database
@@ -177,19 +320,42 @@ class TimescaleDBStorage:
         self.pool: Optional[Any] = None
         self.connected = False
         
-        # Write buffer for batch inserts
-        self.write_buffer: List[TickRecord] = []
-        self.buffer_size = 1000
+        # Double buffering: the tick path appends rows to the queue while the
+        # writer thread inserts the batch it last drained. deque appends and
+        # pops are atomic, so neither side takes a lock per row.
+        self.write_queue: deque = deque(maxlen=max_queue_rows)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue_rows = max_queue_rows
+        self.ingest_mode = ingest_mode
+        self.encoder = CopyEncoder(copy_format)
+        self.adaptive_batching = adaptive_batching
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_flush_ms = target_flush_ms
+        # Pooled connection the writer keeps checked out between batches
+        self._writer_conn: Optional[Any] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._writing = False
+        self._writer: Optional[threading.Thread] = None
         
         # Statistics
         self.ticks_written = 0
         self.ticks_buffered = 0
+        self.ticks_dropped = 0
+        self._dropped_reported = 0
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flush_latencies_ms: deque = deque(maxlen=1000)
         self.last_flush = datetime.now()
         
         if HAS_PSYCOPG2:
             try:
                 self._connect(min_connections, max_connections)
                 self._initialize_schema()
+                self.start_writer()
             except Exception as e:
                 logger.warning(f"Failed to connect to TimescaleDB: {e}")
                 self.connected = False
@@ -274,61 +440,170 @@ class TimescaleDBStorage:
         bid_size: Optional[float] = None,
         ask_size: Optional[float] = None
     ):
-        """Store a single tick (buffered for batch insert)"""
-        timestamp = timestamp or datetime.now()
-        
-        tick = TickRecord(
-            timestamp=timestamp,
-            exchange=exchange,
-            pair=pair,
-            bid=bid,
-            ask=ask,
-            bid_size=bid_size,
-            ask_size=ask_size
-        )
+        """Queue a single tick for the writer thread; never blocks"""
+        if not self.connected:
+            return
         
-        self.write_buffer.append(tick)
+        queue = self.write_queue
+        if len(queue) == self.max_queue_rows:
+            self.ticks_dropped += 1  # The append below evicts the oldest row
+        queue.append((timestamp or datetime.now(), exchange, pair, bid, ask, bid_size, ask_size))
         self.ticks_buffered += 1
         
-        # Flush buffer when full
-        if len(self.write_buffer) >= self.buffer_size:
-            self.flush()
+        # Wake the writer early for a full batch
+        if len(queue) >= self.batch_size and not self._wake.is_set():
+            self._ensure_writer()
+            self._wake.set()
     
-    def flush(self):
-        """Flush write buffer to database"""
-        if not self.write_buffer:
+    # ===== WRITER THREAD =====
+    
+    def start_writer(self):
+        """Start the background writer thread"""
+        if self._writer is not None:
             return
+        self._stop.clear()
+        self._writer = threading.Thread(target=self._run_writer, name="timescale-writer", daemon=True)
+        self._writer.start()
+    
+    def _ensure_writer(self):
+        """Restart the writer thread if it has died"""
+        writer = self._writer
+        if writer is not None and not writer.is_alive() and not self._stop.is_set():
+            logger.warning("⚠️ TimescaleDB writer thread died, restarting it")
+            self._writer = None
+            self.start_writer()
+    
+    def _run_writer(self):
+        retry_delay = 0.0
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stop.is_set()
+            
+            try:
+                written = self._write_queued()
+            except Exception as e:
+                logger.error(f"TimescaleDB writer error: {e}")
+                written = False
+            self._writing = False
+            with self._idle:
+                self._idle.notify_all()
+            
+            if stopping and not written and self.write_queue:
+                logger.warning(f"⚠️ Dropping {len(self.write_queue)} unwritten ticks on close")
+                self.ticks_dropped += len(self.write_queue)
+                self.write_queue.clear()
+            dropped, self._dropped_reported = self.ticks_dropped - self._dropped_reported, self.ticks_dropped
+            metrics_engine.record_tick_db_queue("timescale", len(self.write_queue), dropped)
+            if stopping:
+                return
+            
+            if written:
+                retry_delay = 0.0
+            else:
+                # Back off before retrying; store() wakeups don't cut this short
+                retry_delay = min(self.MAX_RETRY_DELAY, max(self.flush_interval, retry_delay * 2))
+                self._stop.wait(retry_delay)
+    
+    def _write_queued(self) -> bool:
+        """Write queued batches until the queue is empty; False if a batch failed"""
+        while self.write_queue:
+            self._writing = True  # Before draining, so flush() never sees an empty queue mid-write
+            if not self._write_batch(self._drain()):
+                return False
+        return True
+    
+    def _drain(self) -> List[tuple]:
+        """Pop up to one batch of queued rows (the writer's back buffer)"""
+        queue = self.write_queue
+        return [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+    
+    def _write_batch(self, rows: List[tuple]) -> bool:
+        """Write one batch; on failure the rows go back to the front of the queue"""
+        if not rows:
+            return True
+        start = time.perf_counter()
+        try:
+            conn = self._writer_conn
+            if conn is None:
+                conn = self._writer_conn = self.pool.getconn()
+            self._write_rows(conn, rows)
+            conn.commit()
+        except Exception as e:
+            self.flush_failures += 1
+            logger.error(f"Failed to flush {len(rows)} ticks: {e}")
+            self._requeue(rows)
+            try:
+                self._release_writer_conn(broken=True)
+            except Exception as e:
+                logger.debug(f"Failed to release writer connection: {e}")
+            return False
         
-        if not self.connected:
-            # Discard buffer if not connected
-            self.write_buffer.clear()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.ticks_written += len(rows)
+        self.last_flush = datetime.now()
+        self.flushes += 1
+        self.flush_latencies_ms.append(elapsed_ms)
+        metrics_engine.record_tick_db_flush("timescale", elapsed_ms / 1000, len(rows))
+        if self.adaptive_batching:
+            self._adapt_batch_size(len(rows), elapsed_ms)
+        return True
+    
+    def _requeue(self, rows: List[tuple]):
+        """Put a failed batch back at the front of the queue, dropping its oldest rows if they no longer fit"""
+        queue = self.write_queue
+        keep = max(0, min(len(rows), self.max_queue_rows - len(queue)))
+        self.ticks_dropped += len(rows) - keep
+        queue.extendleft(reversed(rows[len(rows) - keep:]))
+    
+    def _release_writer_conn(self, broken: bool = False):
+        """Return the writer's connection to the pool (closing it if it may be broken)"""
+        conn, self._writer_conn = self._writer_conn, None
+        if conn is None:
             return
-        
-        conn = self.pool.getconn()
         try:
-            with conn.cursor() as cur:
-                values = [tick.to_tuple() for tick in self.write_buffer]
-                
-                execute_values(
-                    cur,
-                    """
-                    INSERT INTO ticks (time, exchange, pair, bid, ask, bid_size, ask_size)
-                    VALUES %s
-                    """,
-                    values,
-                    page_size=1000
-                )
-                
-                conn.commit()
-                self.ticks_written += len(self.write_buffer)
-                self.write_buffer.clear()
-                self.last_flush = datetime.now()
-                
-        except Exception as e:
-            logger.error(f"Failed to flush ticks: {e}")
             conn.rollback()
-        finally:
-            self.pool.putconn(conn)
+        except Exception:
+            broken = True
+        self.pool.putconn(conn, close=broken)
+    
+    def _adapt_batch_size(self, rows: int, elapsed_ms: float):
+        """Halve batches that overrun the target latency; double full ones well under it"""
+        if elapsed_ms > self.target_flush_ms:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        elif rows >= self.batch_size and elapsed_ms < self.target_flush_ms / 2:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+    
+    def _write_rows(self, conn: Any, rows: List[tuple]):
+        """Write one batch on `conn` (committed by the caller)"""
+        with conn.cursor() as cur:
+            if self.ingest_mode == "copy":
+                cur.copy_expert(self.encoder.statement, self.encoder.encode(rows))
+                return
+            execute_values(
+                cur,
+                f"INSERT INTO ticks ({TICK_COLUMNS}) VALUES %s",
+                [(_utc(row[0]),) + row[1:] for row in rows],
+                page_size=len(rows)
+            )
+    
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """
+        Wake the writer and wait until every queued row has been written.
+        Returns False on timeout, e.g. while failed batches are being retried.
+        """
+        self._ensure_writer()
+        if self._writer is None:
+            # No writer thread: write inline (discarding if not connected)
+            while self.connected and self.write_queue:
+                if not self._write_batch(self._drain()):
+                    return False
+            self.write_queue.clear()
+            return True
+        
+        with self._idle:
+            self._wake.set()
+            return self._idle.wait_for(lambda: not self.write_queue and not self._writing, timeout)
     
     def query_ticks(
         self,
@@ -336,9 +611,10 @@ class TimescaleDBStorage:
         pair: Optional[str] = None,
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
-        limit: int = 10000
+        limit: int = 10000,
+        ascending: bool = False
     ) -> List[Dict]:
-        """Query tick data with optional filters"""
+        """Query tick data with optional filters (newest first unless `ascending`)"""
         if not self.connected:
             return []
         
@@ -368,7 +644,7 @@ class TimescaleDBStorage:
             SELECT time, exchange, pair, bid, ask, bid_size, ask_size
             FROM ticks
             WHERE {where_clause}
-            ORDER BY time DESC
+            ORDER BY time {"ASC" if ascending else "DESC"}
             LIMIT %s
         """
         
@@ -512,7 +788,7 @@ class TimescaleDBStorage:
         stats = {
             "connected": True,
             "ticks_written": self.ticks_written,
-            "ticks_buffered": len(self.write_buffer),
+            "ticks_buffered": len(self.write_queue),
             "last_flush": self.last_flush.isoformat(),
         }
         
@@ -558,17 +834,41 @@ class TimescaleDBStorage:
         return {
             "storage_type": "timescaledb" if self.connected else "memory",
             "database_stats": self.get_database_stats(),
-            "buffer_size": len(self.write_buffer),
-            "buffer_max": self.buffer_size,
+            "writer": self.get_writer_state(),
             "retention_days": self.retention_days,
             "compression_enabled": self.enable_compression,
         }
     
+    def get_writer_state(self) -> dict:
+        latencies = np.array(self.flush_latencies_ms) if self.flush_latencies_ms else None
+        return {
+            "running": self._writer is not None and self._writer.is_alive(),
+            "queue_depth": len(self.write_queue),
+            "queue_max": self.max_queue_rows,
+            "ingest_mode": self.ingest_mode,
+            "copy_format": self.encoder.fmt if self.ingest_mode == "copy" else None,
+            "batch_size": self.batch_size,
+            "adaptive_batching": self.adaptive_batching,
+            "target_flush_ms": self.target_flush_ms,
+            "bytes_encoded": self.encoder.bytes_encoded,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "ticks_received": self.ticks_buffered,
+            "ticks_dropped": self.ticks_dropped,
+            "flushes": self.flushes,
+            "flush_failures": self.flush_failures,
+            "flush_p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies is not None else None,
+            "flush_p99_ms": round(float(np.percentile(latencies, 99)), 3) if latencies is not None else None,
+        }
+    
     def close(self):
-        """Close database connections"""
-        if self.write_buffer:
-            self.flush()
+        """Write out queued ticks, stop the writer and close database connections"""
+        if self._writer is not None:
+            self._stop.set()
+            self._wake.set()
+            self._writer.join(timeout=10)
+            self._writer = None
         if self.pool:
+            self._release_writer_conn()
             self.pool.closeall()
             self.connected = False
 
@@ -576,18 +876,21 @@ class TimescaleDBStorage:
 class InMemoryFallback:
     """
     In-memory fallback when TimescaleDB is not available.
-    Uses efficient deque-based storage with automatic cleanup.
+    Uses columnar per-key ring buffers (TickBuffer) with a binary-searched
+    time index, so range queries cost O(log n + k).
     """
     
     def __init__(self, max_ticks_per_key: int = 100000, retention_hours: int = 24):
         self.max_ticks = max_ticks_per_key
         self.retention = timedelta(hours=retention_hours)
         
-        # Storage: (exchange, pair) -> deque of TickRecord
-        self.ticks: Dict[Tuple[str, str], deque] = {}
+        # Storage: (exchange, pair) -> columnar ring buffer (NaN size = not reported)
+        self.ticks: Dict[Tuple[str, str], TickBuffer] = {}
         
         self.ticks_stored = 0
         self.start_time: Optional[datetime] = None
+        # Set by a TickCompactor enforcing retention and the memory budget
+        self.compactor = None
     
     def store(
         self,
@@ -604,21 +907,18 @@ class InMemoryFallback:
         if self.start_time is None:
             self.start_time = timestamp
         
-        tick = TickRecord(
-            timestamp=timestamp,
-            exchange=exchange,
-            pair=pair,
-            bid=bid,
-            ask=ask,
-            bid_size=bid_size,
-            ask_size=ask_size
-        )
-        
         key = (exchange, pair)
-        if key not in self.ticks:
-            self.ticks[key] = deque(maxlen=self.max_ticks)
-        
-        self.ticks[key].append(tick)
+        buffer = self.ticks.get(key)
+        if buffer is None:
+            buffer = self.ticks[key] = TickBuffer(exchange, pair, self.max_ticks)
+        
+        buffer.append(
+            to_ns(timestamp),
+            bid,
+            ask,
+            math.nan if bid_size is None else bid_size,
+            math.nan if ask_size is None else ask_size
+        )
         self.ticks_stored += 1
     
     def flush(self):
@@ -631,26 +931,37 @@ class InMemoryFallback:
         pair: Optional[str] = None,
         start: Optional[datetime] = None,
         end: Optional[datetime] = None,
-        limit: int = 10000
+        limit: int = 10000,
+        ascending: bool = False
     ) -> List[Dict]:
-        result = []
+        """Ticks in [start, end], newest first unless `ascending` (like the database query)"""
+        start_ns = to_ns(start) if start else None
+        end_ns = to_ns(end) if end else None
         
-        for (ex, p), ticks in self.ticks.items():
+        result = []
+        for (ex, p), buffer in self.ticks.items():
             if exchange and ex != exchange:
                 continue
             if pair and p != pair:
                 continue
             
-            for tick in ticks:
-                if start and tick.timestamp < start:
-                    continue
-                if end and tick.timestamp > end:
-                    continue
-                result.append(tick.to_dict())
-                if len(result) >= limit:
-                    return result
-        
-        return result
+            # Each key contributes at most `limit` rows, located by binary search
+            result.extend(buffer.ticks(buffer.range(start_ns, end_ns, limit, ascending)))
+        
+        result.sort(key=lambda t: t.timestamp, reverse=not ascending)
+        return [self._record(tick).to_dict() for tick in result[:limit]]
+    
+    @staticmethod
+    def _record(tick: Tick) -> TickRecord:
+        return TickRecord(
+            timestamp=tick.timestamp,
+            exchange=tick.exchange,
+            pair=tick.pair,
+            bid=tick.bid,
+            ask=tick.ask,
+            bid_size=None if math.isnan(tick.bid_size) else tick.bid_size,
+            ask_size=None if math.isnan(tick.ask_size) else tick.ask_size
+        )
     
     def get_database_stats(self) -> Dict:
         total_ticks = sum(len(ticks) for ticks in self.ticks.values())
@@ -661,6 +972,7 @@ class InMemoryFallback:
             "total_ticks": total_ticks,
             "unique_keys": len(self.ticks),
             "ticks_stored": self.ticks_stored,
+            "memory_bytes": sum(buffer.nbytes for buffer in self.ticks.values()),
         }
     
     def get_state(self) -> dict:
@@ -669,17 +981,21 @@ class InMemoryFallback:
             "database_stats": self.get_database_stats(),
             "max_ticks_per_key": self.max_ticks,
             "retention_hours": self.retention.total_seconds() / 3600,
+            "compaction": self.compactor.get_state() if self.compactor else None,
         }
 
 
 def create_tick_storage(
     use_timescale: bool = True,
+    segment_dir: Optional[str] = None,
     **timescale_kwargs
 ) -> Any:
     """
     Factory function to create appropriate tick storage.
     
-    Returns TimescaleDBStorage if available, otherwise InMemoryFallback.
+    Returns TimescaleDBStorage if available, otherwise a SegmentTickStore
+    in `segment_dir` when one is given (persistent), otherwise
+    InMemoryFallback.
     """
     if use_timescale and HAS_PSYCOPG2:
         try:
@@ -689,5 +1005,10 @@ def create_tick_storage(
         except Exception as e:
             logger.warning(f"Failed to create TimescaleDB storage: {e}")
     
+    if segment_dir:
+        from engine_segments import SegmentTickStore  # Imports this module
+        logger.info(f"Using segment tick storage in {segment_dir}")
+        return SegmentTickStore(segment_dir)
+    
     logger.info("Using in-memory tick storage")
     return InMemoryFallback()
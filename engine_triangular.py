@@ -14,12 +14,14 @@ If the product of exchange rates yields more USDT than you started with, profit!
 """
 
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, List, Dict, Tuple
 from collections import defaultdict
 import itertools
 
+from engine_symbols import NO_CURRENCY, symbols
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,6 +32,7 @@ class TriangularPath:
     base_currency: str  # Starting currency (e.g., "USDT")
     pairs: List[str]    # Trading pairs in order (e.g., ["BTC/USDT", "ETH/BTC", "ETH/USDT"])
     sides: List[str]    # "buy" or "sell" for each pair
+    pair_ids: List[int] = field(default_factory=list)  # Interned ids of `pairs`
     
     def __str__(self):
         steps = []
@@ -85,11 +88,11 @@ class TriangularArbitrageEngine:
         self.min_profit_threshold = min_profit_threshold
         self.trading_fee = trading_fee
         
-        # Store latest prices: exchange -> pair -> (bid, ask)
-        self.prices: Dict[str, Dict[str, Tuple[float, float]]] = defaultdict(dict)
+        # Store latest prices: exchange id -> pair id -> (bid, ask) (ids from engine_symbols)
+        self.prices: Dict[int, Dict[int, Tuple[float, float]]] = defaultdict(dict)
         
-        # Pre-computed triangular paths for each exchange
-        self.triangular_paths: Dict[str, List[TriangularPath]] = {}
+        # Pre-computed triangular paths for each exchange id
+        self.triangular_paths: Dict[int, List[TriangularPath]] = {}
         
         # Current opportunities
         self.opportunities: List[TriangularOpportunity] = []
@@ -104,51 +107,72 @@ class TriangularArbitrageEngine:
         """Register callback for new triangular opportunities"""
         self._on_opportunity_callbacks.append(callback)
     
-    def update_price(self, exchange: str, pair: str, bid: float, ask: float):
-        """Update price for a pair and check for triangular opportunities"""
-        self.prices[exchange][pair] = (bid, ask)
+    def update_price(
+        self,
+        exchange: str,
+        pair: str,
+        bid: float,
+        ask: float,
+        exchange_id: Optional[int] = None,
+        pair_id: Optional[int] = None
+    ):
+        """
+        Update price for a pair and check for triangular opportunities.
+        
+        Pass the PriceUpdate's interned ids to skip resolving the names.
+        """
+        if exchange_id is None:
+            exchange_id = symbols.exchange_id(exchange)
+        if pair_id is None:
+            pair_id = symbols.pair_id(pair)
+        
+        quotes = self.prices[exchange_id]
+        new_pair = pair_id not in quotes
+        quotes[pair_id] = (bid, ask)
         
-        # If this exchange doesn't have paths computed yet, do it now
-        if exchange not in self.triangular_paths:
-            self._compute_triangular_paths(exchange)
+        # Paths depend only on which pairs the exchange lists; recompute when one is added
+        if new_pair or exchange_id not in self.triangular_paths:
+            self._compute_triangular_paths(exchange_id)
         
         # Check all paths on this exchange
-        self._check_triangular_opportunities(exchange)
+        self._check_triangular_opportunities(exchange_id)
     
-    def _compute_triangular_paths(self, exchange: str):
+    def _compute_triangular_paths(self, exchange_id: int):
         """
         Compute all possible triangular arbitrage paths for an exchange.
         
         A triangular path consists of 3 trades that form a cycle.
         For example: USDT → BTC → ETH → USDT
         """
-        pairs = list(self.prices[exchange].keys())
+        pair_ids = list(self.prices[exchange_id].keys())
         
-        if len(pairs) < 3:
-            self.triangular_paths[exchange] = []
+        if len(pair_ids) < 3:
+            self.triangular_paths[exchange_id] = []
             return
         
-        # Build currency graph
+        # Build currency graph from the precomputed base/quote ids
         currencies = set()
-        edges: Dict[str, List[Tuple[str, str, str]]] = defaultdict(list)  # from_currency -> [(to_currency, pair, side)]
+        edges: Dict[int, List[Tuple[int, int, str]]] = defaultdict(list)  # from_currency -> [(to_currency, pair, side)]
         
-        for pair in pairs:
-            if '/' not in pair:
+        for pair_id in pair_ids:
+            base, quote = symbols.pair_base[pair_id], symbols.pair_quote[pair_id]
+            if base == NO_CURRENCY:
                 continue
-            base, quote = pair.split('/')
             currencies.add(base)
             currencies.add(quote)
             
             # You can buy base with quote (ask price)
-            edges[quote].append((base, pair, 'buy'))
+            edges[quote].append((base, pair_id, 'buy'))
             # You can sell base for quote (bid price)
-            edges[base].append((quote, pair, 'sell'))
+            edges[base].append((quote, pair_id, 'sell'))
         
         # Find all 3-step cycles starting from USDT (or USD, USDC, etc.)
         base_currencies = ['USDT', 'USD', 'USDC', 'BUSD']
+        exchange = symbols.exchanges[exchange_id]
         paths = []
         
-        for start_currency in base_currencies:
+        for start_name in base_currencies:
+            start_currency = symbols.find_currency(start_name)
             if start_currency not in currencies:
                 continue
             
@@ -159,24 +183,26 @@ class TriangularArbitrageEngine:
                         if curr3 == start_currency:
                             path = TriangularPath(
                                 exchange=exchange,
-                                base_currency=start_currency,
-                                pairs=[pair1, pair2, pair3],
-                                sides=[side1, side2, side3]
+                                base_currency=start_name,
+                                pairs=[symbols.pairs[pair1], symbols.pairs[pair2], symbols.pairs[pair3]],
+                                sides=[side1, side2, side3],
+                                pair_ids=[pair1, pair2, pair3]
                             )
                             paths.append(path)
         
-        self.triangular_paths[exchange] = paths
+        self.triangular_paths[exchange_id] = paths
         logger.info(f"[{exchange}] Computed {len(paths)} triangular paths")
     
-    def _check_triangular_opportunities(self, exchange: str):
+    def _check_triangular_opportunities(self, exchange_id: int):
         """Check all triangular paths on an exchange for profit"""
-        if exchange not in self.triangular_paths:
+        if exchange_id not in self.triangular_paths:
             return
         
+        exchange = symbols.exchanges[exchange_id]
         new_opportunities = []
         
-        for path in self.triangular_paths[exchange]:
-            opportunity = self._calculate_triangular_profit(exchange, path)
+        for path in self.triangular_paths[exchange_id]:
+            opportunity = self._calculate_triangular_profit(exchange_id, path)
             if opportunity:
                 new_opportunities.append(opportunity)
         
@@ -204,7 +230,7 @@ class TriangularArbitrageEngine:
     
     def _calculate_triangular_profit(
         self, 
-        exchange: str, 
+        exchange_id: int, 
         path: TriangularPath,
         start_amount: float = 10000.0
     ) -> Optional[TriangularOpportunity]:
@@ -212,7 +238,7 @@ class TriangularArbitrageEngine:
         Calculate profit for a triangular path.
         
         Args:
-            exchange: Exchange name
+            exchange_id: Interned exchange id
             path: Triangular path to evaluate
             start_amount: Amount of base currency to start with
         
@@ -220,19 +246,15 @@ class TriangularArbitrageEngine:
             TriangularOpportunity if profitable, None otherwise
         """
         # Check if all required prices are available
-        prices_used = {}
-        for pair in path.pairs:
-            if pair not in self.prices[exchange]:
-                return None
-            prices_used[pair] = self.prices[exchange][pair]
+        quotes = self.prices[exchange_id]
+        prices_used = [quotes.get(pair_id) for pair_id in path.pair_ids]
+        if None in prices_used:
+            return None
         
         # Simulate the trades
         current_amount = start_amount
         
-        for pair, side in zip(path.pairs, path.sides):
-            bid, ask = self.prices[exchange][pair]
-            base, quote = pair.split('/')
-            
+        for (bid, ask), side in zip(prices_used, path.sides):
             if side == 'buy':
                 # Buying base with quote
                 # We pay the ask price + fee
@@ -253,13 +275,13 @@ class TriangularArbitrageEngine:
         # Only return if above threshold
         if profit_percent >= self.min_profit_threshold:
             return TriangularOpportunity(
-                exchange=exchange,
+                exchange=path.exchange,
                 path=path,
                 start_amount=start_amount,
                 end_amount=current_amount,
                 profit_amount=profit_amount,
                 profit_percent=profit_percent,
-                prices=prices_used,
+                prices=dict(zip(path.pairs, prices_used)),
                 timestamp=datetime.now()
             )
         
@@ -271,7 +293,7 @@ class TriangularArbitrageEngine:
             "triangular_opportunities": [o.to_dict() for o in self.opportunities],
             "triangular_history": [o.to_dict() for o in self.history[-20:]],
             "paths_computed": {
-                exchange: len(paths) 
-                for exchange, paths in self.triangular_paths.items()
+                symbols.exchanges[exchange_id]: len(paths) 
+                for exchange_id, paths in self.triangular_paths.items()
             }
         }
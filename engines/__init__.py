@@ -23,6 +23,7 @@ ML & Analytics:
 Data & Monitoring:
 - TickStorage: In-memory tick storage
 - TimescaleDBStorage: PostgreSQL/TimescaleDB integration
+- SegmentTickStore: Persistent memory-mapped tick segments
 - ReplayEngine: Historical data replay
 - MetricsEngine: Prometheus metrics export
 """
@@ -50,6 +51,7 @@ from engine_execution import ExecutionSimulator, SlippageModel, ArbitrageExecuti
 from engine_metrics import MetricsEngine, metrics_engine
 from engine_ml_advanced import AdvancedMLEngine, AdvancedFeatures, PredictionResult
 from engine_timescale import TimescaleDBStorage, InMemoryFallback, create_tick_storage
+from engine_segments import SegmentTickStore
 from engine_replay import ReplayEngine, ReplaySession, ReplayConfig
 
 __all__ = [
@@ -72,6 +74,7 @@ __all__ = [
     'MetricsEngine',
     'AdvancedMLEngine',
     'TimescaleDBStorage',
+    'SegmentTickStore',
     'ReplayEngine',
     
     # Data classes
@@ -12,6 +12,7 @@ import websockets
 from websockets.exceptions import ConnectionClosed
 
 from config import RECONNECT_DELAY, MAX_RECONNECT_ATTEMPTS, SKIP_SSL_VERIFY
+from engine_symbols import symbols
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +25,15 @@ class PriceUpdate:
     bid: float  # Best bid price
     ask: float  # Best ask price
     timestamp: datetime
+    exchange_id: int = -1  # Interned ids (engine_symbols), resolved at parse time
+    pair_id: int = -1
+    
+    def __post_init__(self):
+        # Updates built without ids (replay, tests, the C++ bridge) resolve them here
+        if self.exchange_id < 0:
+            self.exchange_id = symbols.exchange_id(self.exchange)
+        if self.pair_id < 0:
+            self.pair_id = symbols.pair_id(self.pair)
     
     @property
     def mid(self) -> float:
@@ -45,6 +55,9 @@ class BaseExchange(ABC):
         self.pairs = pairs
         self.pair_mapping = pair_mapping
         self.reverse_mapping = {v: k for k, v in pair_mapping.items()}
+        # Exchange symbol -> interned pair id, so parsing resolves ids with one lookup
+        self.exchange_id = symbols.exchange_id(name)
+        self.symbol_ids = {symbol: symbols.pair_id(pair) for pair, symbol in pair_mapping.items()}
         self.ws: Optional[websockets.WebSocketClientProtocol] = None
         self.running = False
         self.on_price_update: Optional[Callable[[PriceUpdate], None]] = None
@@ -64,6 +77,18 @@ class BaseExchange(ABC):
         """Parse exchange-specific message to PriceUpdate"""
         pass
     
+    def _price_update(self, pair_id: int, bid: float, ask: float) -> PriceUpdate:
+        """PriceUpdate for a pair resolved through `symbol_ids`"""
+        return PriceUpdate(
+            exchange=self.name,
+            pair=symbols.pairs[pair_id],
+            bid=bid,
+            ask=ask,
+            timestamp=datetime.now(),
+            exchange_id=self.exchange_id,
+            pair_id=pair_id
+        )
+    
     async def connect(self):
         """Connect to WebSocket and handle messages"""
         self.running = True
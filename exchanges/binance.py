@@ -1,7 +1,6 @@
 """Binance WebSocket client"""
 import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 from .base import BaseExchange, PriceUpdate
@@ -39,18 +38,12 @@ class BinanceExchange(BaseExchange):
                 return None
             
             symbol = data["s"].lower()
-            normalized_pair = self.reverse_mapping.get(symbol)
+            pair_id = self.symbol_ids.get(symbol)
             
-            if not normalized_pair:
+            if pair_id is None:
                 return None
             
-            return PriceUpdate(
-                exchange=self.name,
-                pair=normalized_pair,
-                bid=float(data["b"]),
-                ask=float(data["a"]),
-                timestamp=datetime.now()
-            )
+            return self._price_update(pair_id, float(data["b"]), float(data["a"]))
         except (KeyError, ValueError) as e:
             logger.debug(f"[{self.name}] Parse error: {e}")
             return None
@@ -1,7 +1,6 @@
 """Bybit WebSocket client"""
 import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 from .base import BaseExchange, PriceUpdate
@@ -61,8 +60,8 @@ class BybitExchange(BaseExchange):
             if not symbol:
                 return None
             
-            normalized_pair = self.reverse_mapping.get(symbol)
-            if not normalized_pair:
+            pair_id = self.symbol_ids.get(symbol)
+            if pair_id is None:
                 return None
             
             bid = ticker_data.get("bid1Price")
@@ -71,13 +70,7 @@ class BybitExchange(BaseExchange):
             if not bid or not ask:
                 return None
             
-            return PriceUpdate(
-                exchange=self.name,
-                pair=normalized_pair,
-                bid=float(bid),
-                ask=float(ask),
-                timestamp=datetime.now()
-            )
+            return self._price_update(pair_id, float(bid), float(ask))
         except (KeyError, ValueError, TypeError) as e:
             logger.debug(f"[{self.name}] Parse error: {e}")
             return None
@@ -1,7 +1,6 @@
 """Coinbase WebSocket client"""
 import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 from .base import BaseExchange, PriceUpdate
@@ -51,8 +50,8 @@ class CoinbaseExchange(BaseExchange):
                         if not product_id:
                             continue
                         
-                        normalized_pair = self.reverse_mapping.get(product_id)
-                        if not normalized_pair:
+                        pair_id = self.symbol_ids.get(product_id)
+                        if pair_id is None:
                             continue
                         
                         # Advanced Trade uses best_bid_quantity, best_ask_quantity, price
@@ -60,13 +59,7 @@ class CoinbaseExchange(BaseExchange):
                         ask = ticker.get("best_ask") or ticker.get("price")
                         
                         if bid and ask:
-                            return PriceUpdate(
-                                exchange=self.name,
-                                pair=normalized_pair,
-                                bid=float(bid),
-                                ask=float(ask),
-                                timestamp=datetime.now()
-                            )
+                            return self._price_update(pair_id, float(bid), float(ask))
             
             # Legacy Exchange API format (fallback)
             if data.get("type") == "ticker":
@@ -74,8 +67,8 @@ class CoinbaseExchange(BaseExchange):
                 if not product_id:
                     return None
                 
-                normalized_pair = self.reverse_mapping.get(product_id)
-                if not normalized_pair:
+                pair_id = self.symbol_ids.get(product_id)
+                if pair_id is None:
                     return None
                 
                 bid = data.get("best_bid")
@@ -84,13 +77,7 @@ class CoinbaseExchange(BaseExchange):
                 if not bid or not ask:
                     return None
                 
-                return PriceUpdate(
-                    exchange=self.name,
-                    pair=normalized_pair,
-                    bid=float(bid),
-                    ask=float(ask),
-                    timestamp=datetime.now()
-                )
+                return self._price_update(pair_id, float(bid), float(ask))
             
             return None
             
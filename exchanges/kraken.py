@@ -1,7 +1,6 @@
 """Kraken WebSocket client"""
 import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 from .base import BaseExchange, PriceUpdate
@@ -63,9 +62,9 @@ class KrakenExchange(BaseExchange):
                 if not symbol:
                     continue
                 
-                # Get normalized pair
-                normalized_pair = self.reverse_mapping.get(symbol)
-                if not normalized_pair:
+                # Get interned pair id
+                pair_id = self.symbol_ids.get(symbol)
+                if pair_id is None:
                     continue
                 
                 # v2 API: bid/ask are direct values
@@ -75,13 +74,7 @@ class KrakenExchange(BaseExchange):
                 if bid is None or ask is None:
                     continue
                 
-                return PriceUpdate(
-                    exchange=self.name,
-                    pair=normalized_pair,
-                    bid=float(bid),
-                    ask=float(ask),
-                    timestamp=datetime.now()
-                )
+                return self._price_update(pair_id, float(bid), float(ask))
             
             return None
             
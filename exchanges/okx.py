@@ -1,7 +1,6 @@
 """OKX WebSocket client"""
 import json
 import logging
-from datetime import datetime
 from typing import Optional
 
 from .base import BaseExchange, PriceUpdate
@@ -57,8 +56,8 @@ class OKXExchange(BaseExchange):
                 if not inst_id:
                     continue
                 
-                normalized_pair = self.reverse_mapping.get(inst_id)
-                if not normalized_pair:
+                pair_id = self.symbol_ids.get(inst_id)
+                if pair_id is None:
                     continue
                 
                 bid = ticker.get("bidPx")
@@ -67,13 +66,7 @@ class OKXExchange(BaseExchange):
                 if not bid or not ask:
                     continue
                 
-                return PriceUpdate(
-                    exchange=self.name,
-                    pair=normalized_pair,
-                    bid=float(bid),
-                    ask=float(ask),
-                    timestamp=datetime.now()
-                )
+                return self._price_update(pair_id, float(bid), float(ask))
             
             return None
             
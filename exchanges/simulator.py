@@ -7,6 +7,7 @@ from typing import Callable, Optional
 
 from .base import PriceUpdate
 from config import TRADING_PAIRS
+from engine_symbols import symbols
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +42,8 @@ class SimulatedExchange:
         self.running = False
         self.on_price_update: Optional[Callable[[PriceUpdate], None]] = None
         self.current_prices = {pair: price for pair, price in BASE_PRICES.items()}
+        self.exchange_id = symbols.exchange_id(name)
+        self.pair_ids = {pair: symbols.pair_id(pair) for pair in BASE_PRICES}
         
     def set_callback(self, callback: Callable[[PriceUpdate], None]):
         """Set callback for price updates"""
@@ -79,7 +82,9 @@ class SimulatedExchange:
                     pair=pair,
                     bid=bid,
                     ask=ask,
-                    timestamp=datetime.now()
+                    timestamp=datetime.now(),
+                    exchange_id=self.exchange_id,
+                    pair_id=self.pair_ids[pair]
                 )
                 
                 if self.on_price_update:
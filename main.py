@@ -21,7 +21,14 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import Response
 
-from config import WEB_HOST, WEB_PORT, TRADING_PAIRS, MODE, ENABLE_TRIANGULAR_ARBITRAGE
+from config import (
+    WEB_HOST, WEB_PORT, TRADING_PAIRS, MODE, ENABLE_TRIANGULAR_ARBITRAGE,
+    ML_PREDICTION_INTERVAL, ML_ACTIVE_PAIR_MAX_AGE, ML_INTRA_OP_THREADS, ML_INTER_OP_THREADS,
+    ML_INFERENCE_WORKERS, ML_INFERENCE_QUEUE_SIZE, ML_LATENCY_BUDGET_MS,
+    ML_MODEL_DIR, ML_MODEL_POLL_SECONDS, ML_SHADOW_FRACTION, ANOMALY_SWEEP_SECONDS,
+    TICK_RETENTION_HOURS, TICK_MEMORY_BUDGET_MB, TICK_COMPACTION_SECONDS, TICK_COMPRESS_BLOCK_TICKS,
+    TICK_ARCHIVE_ENABLED, TICK_SEGMENT_DIR
+)
 from exchanges import (
     BinanceExchange, KrakenExchange, CoinbaseExchange, 
     BybitExchange, OKXExchange, 
@@ -34,7 +41,8 @@ from engine_triangular import TriangularArbitrageEngine
 from engine_orderbook import OrderBookAggregator
 from engine_statistical import StatisticalArbitrageEngine
 from engine_ml import MLEngine
-from engine_storage import TickStorage
+from engine_storage import TickStorage, TickCompactor
+from engine_timescale import create_tick_storage
 
 # Advanced arbitrage engines
 from engine_cross_triangular import CrossExchangeTriangularEngine
@@ -46,6 +54,8 @@ from engine_latency import LatencyArbitrageEngine
 from engine_execution import ExecutionSimulator
 from engine_metrics import MetricsEngine, metrics_engine
 from engine_ml_advanced import AdvancedMLEngine
+from engine_inference import InferenceService
+from engine_model_manager import ModelManager
 
 # Dashboard
 from dashboard import app, manager
@@ -76,7 +86,17 @@ class ArbitrageBot:
         self.orderbook_engine = OrderBookAggregator()
         self.statistical_engine = StatisticalArbitrageEngine()
         self.ml_engine = MLEngine()
-        self.tick_storage = TickStorage(max_ticks_per_key=50000, retention_hours=1)
+        self.tick_storage = TickStorage(
+            max_ticks_per_key=50000,
+            retention_hours=TICK_RETENTION_HOURS,
+            compress_block_ticks=TICK_COMPRESS_BLOCK_TICKS
+        )
+        self.tick_compactor = TickCompactor(
+            self.tick_storage,
+            memory_budget_bytes=TICK_MEMORY_BUDGET_MB * 1024 * 1024,
+            interval_seconds=TICK_COMPACTION_SECONDS
+        )
+        self.tick_archive = create_tick_storage(segment_dir=TICK_SEGMENT_DIR) if TICK_ARCHIVE_ENABLED else None
         
         # New arbitrage engines (Tier 4 features)
         self.cross_triangular_engine = CrossExchangeTriangularEngine()
@@ -86,7 +106,33 @@ class ArbitrageBot:
         
         # Phase 1-3 engines
         self.execution_simulator = ExecutionSimulator()
-        self.advanced_ml_engine = AdvancedMLEngine()
+        self.advanced_ml_engine = AdvancedMLEngine(
+            intra_op_threads=ML_INTRA_OP_THREADS,
+            inter_op_threads=ML_INTER_OP_THREADS
+        )
+        
+        # ML extraction and scoring run on worker threads, not the event loop
+        self.inference = InferenceService(
+            self.advanced_ml_engine,
+            workers=ML_INFERENCE_WORKERS,
+            max_queue=ML_INFERENCE_QUEUE_SIZE,
+            latency_budget_ms=ML_LATENCY_BUDGET_MS
+        )
+        self.ml_engine.inference = self.inference
+        
+        # Detected opportunities label ML predictions once their horizon passes
+        self.engine.on_opportunity(lambda opp: self.advanced_ml_engine.record_opportunity(opp.pair, opp.timestamp))
+        
+        # Latency arb reads the ML extractor's cached lead-lag estimates
+        self.latency_engine.lead_lag = self.advanced_ml_engine.feature_extractor.lead_lag
+        
+        # Hot-reloads ONNX models from ML_MODEL_DIR without a restart
+        self.model_manager = ModelManager(
+            self.advanced_ml_engine,
+            ML_MODEL_DIR,
+            poll_seconds=ML_MODEL_POLL_SECONDS,
+            shadow_fraction=ML_SHADOW_FRACTION
+        )
         
         self.mode = mode
         
@@ -120,7 +166,8 @@ class ArbitrageBot:
             orderbook=self.orderbook_engine,
             statistical=self.statistical_engine,
             ml=self.ml_engine,
-            storage=self.tick_storage
+            storage=self.tick_storage,
+            archive=self.tick_archive
         )
         
         # Connect new arbitrage engines
@@ -157,7 +204,9 @@ class ArbitrageBot:
                 update.exchange,
                 update.pair,
                 update.bid,
-                update.ask
+                update.ask,
+                exchange_id=update.exchange_id,
+                pair_id=update.pair_id
             )
         
         # Order book aggregator
@@ -194,6 +243,14 @@ class ArbitrageBot:
             update.ask,
             update.timestamp
         )
+        if self.tick_archive is not None:
+            self.tick_archive.store(
+                update.exchange,
+                update.pair,
+                update.bid,
+                update.ask,
+                update.timestamp
+            )
         
         # ===== NEW ARBITRAGE ENGINES =====
         
@@ -202,7 +259,8 @@ class ArbitrageBot:
             update.exchange,
             update.pair,
             update.bid,
-            update.ask
+            update.ask,
+            pair_id=update.pair_id
         )
         
         # Futures-Spot Basis Arbitrage
@@ -255,6 +313,7 @@ class ArbitrageBot:
     async def start(self):
         """Start all exchange connections"""
         self.running = True
+        self.inference.loop = asyncio.get_running_loop()
         self.setup()
         
         logger.info("=" * 60)
@@ -273,11 +332,26 @@ class ArbitrageBot:
             self.tasks.append(task)
             logger.info(f"Started {exchange.name} connection task")
         
+        # Batched ML predictions on a fixed cadence
+        self.tasks.append(asyncio.create_task(self._prediction_loop()))
+        self.tasks.append(asyncio.create_task(self.ml_engine.run_stale_sweep(ANOMALY_SWEEP_SECONDS)))
+        self.tasks.append(asyncio.create_task(self.tick_compactor.run()))
+        self.model_manager.start()
+        
         logger.info(f"Dashboard available at http://localhost:{WEB_PORT}")
         logger.info(f"Advanced analytics at http://localhost:{WEB_PORT}/advanced")
         logger.info(f"Prometheus metrics at http://localhost:{WEB_PORT}/metrics")
         logger.info("=" * 60)
     
+    async def _prediction_loop(self):
+        """Predict for every active pair once per cycle in a single batch"""
+        while self.running:
+            try:
+                await self.inference.run_cycle(ML_ACTIVE_PAIR_MAX_AGE)
+            except Exception as e:
+                logger.error(f"ML prediction cycle error: {e}")
+            await asyncio.sleep(ML_PREDICTION_INTERVAL)
+    
     async def stop(self):
         """Stop all exchange connections"""
         self.running = False
@@ -291,6 +365,16 @@ class ArbitrageBot:
         for task in self.tasks:
             task.cancel()
         
+        # Stop background workers
+        self.statistical_engine.stop()
+        self.advanced_ml_engine.feature_extractor.lead_lag.stop()
+        self.inference.stop()
+        self.model_manager.stop()
+        
+        # Write out and close the tick archive (the in-memory fallback has nothing to close)
+        if hasattr(self.tick_archive, "close"):
+            self.tick_archive.close()
+        
         # Stop metrics engine
         metrics_engine.stop()
         
@@ -341,14 +425,18 @@ async def execution_stats():
 @app.get("/api/ml/advanced")
 async def advanced_ml():
     """Get advanced ML engine state"""
-    return bot.advanced_ml_engine.get_state()
+    return {
+        **bot.advanced_ml_engine.get_state(),
+        "inference": bot.inference.get_state(),
+        "models": bot.model_manager.get_state(),
+    }
 
 
 @app.get("/api/ml/predict/{pair}")
 async def ml_predict(pair: str):
     """Get ML prediction for a pair"""
     pair = pair.replace("-", "/")
-    prediction = bot.advanced_ml_engine.predict(pair)
+    prediction = await bot.inference.predict_async(pair)
     return prediction.to_dict()
 
 
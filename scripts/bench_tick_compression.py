@@ -0,0 +1,102 @@
+"""
+Benchmark cold tick block compression.
+
+Encodes ticks into TickBlocks and reports the compression ratio per column
+and overall, plus decode throughput for full-block and narrow range scans.
+
+Ticks are synthesized to look like exchange quotes (millisecond timestamps
+with bursty arrivals, prices on a 0.01 grid moving a tick at a time, sizes
+with a few decimals), or read from a tick export:
+
+    python scripts/bench_tick_compression.py
+    python scripts/bench_tick_compression.py --export exports/2024-01-15
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine_compression import TickBlock  # noqa: E402
+from engine_storage import TickBuffer, TickCompactor  # noqa: E402
+
+
+def synthetic_ticks(count: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    # Bursts of same-millisecond updates between quieter gaps
+    gaps = np.where(rng.random(count) < 0.3, 0, rng.geometric(0.05, count))
+    time_ns = 1_704_110_400_000 * 1_000_000 + np.cumsum(gaps) * 1_000_000
+    mid = np.round(42000 + np.cumsum(rng.choice([-0.01, 0.0, 0.01], count, p=[0.25, 0.5, 0.25])), 2)
+    spread = rng.choice([0.01, 0.02, 0.03], count, p=[0.7, 0.2, 0.1])
+    return {
+        "time_ns": time_ns.astype(np.int64),
+        "bid": np.round(mid - spread, 2),
+        "ask": np.round(mid + spread, 2),
+        "bid_size": np.round(rng.exponential(0.8, count), 5),
+        "ask_size": np.round(rng.exponential(0.8, count), 5),
+    }
+
+
+def export_ticks(directory: str, count: int) -> dict:
+    from engine_export import iter_export
+    
+    parts = {name: [] for name in TickBuffer.COLUMNS}
+    rows = 0
+    for _, _, chunk in iter_export(directory):
+        for name in TickBuffer.COLUMNS:
+            parts[name].append(chunk[name])
+        rows += len(chunk["time_ns"])
+        if rows >= count:
+            break
+    return {name: np.concatenate(values)[:count] for name, values in parts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=1_000_000, help="Ticks to encode")
+    parser.add_argument("--block", type=int, default=4096, help="Ticks per block")
+    parser.add_argument("--export", help="Read ticks from this export directory (first key first)")
+    args = parser.parse_args()
+    
+    columns = export_ticks(args.export, args.ticks) if args.export else synthetic_ticks(args.ticks)
+    count = len(columns["time_ns"])
+    
+    start = time.perf_counter()
+    blocks = [
+        TickBlock.encode({name: values[i:i + args.block] for name, values in columns.items()})
+        for i in range(0, count, args.block)
+    ]
+    encode_s = time.perf_counter() - start
+    
+    raw = count * TickCompactor.TICK_BYTES
+    compressed = sum(block.nbytes for block in blocks)
+    print(f"{count:,} ticks in {len(blocks)} blocks of {args.block}")
+    for name in TickBuffer.COLUMNS:
+        size = sum(block.columns[name].nbytes for block in blocks)
+        kinds = sorted({block.columns[name].kind for block in blocks})
+        print(f"  {name:<9} {8 * count / size:6.2f}x  ({size / count:5.2f} bytes/tick, {'/'.join(kinds)})")
+    print(f"  {'total':<9} {raw / compressed:6.2f}x  ({compressed / count:5.2f} bytes/tick)")
+    print(f"encode: {count / encode_s / 1e6:.2f}M ticks/s")
+    
+    start = time.perf_counter()
+    for block in blocks:
+        block.decode()
+    elapsed = time.perf_counter() - start
+    print(f"decode, full scan: {count / elapsed / 1e6:.2f}M ticks/s")
+    
+    # Narrow scans: 1% of each block, located after decoding its time column
+    start = time.perf_counter()
+    scanned = 0
+    for block in blocks:
+        window = (block.last_ns - block.first_ns) // 100
+        scanned += len(block.decode(block.first_ns, block.first_ns + window)["time_ns"])
+    elapsed = time.perf_counter() - start
+    print(f"decode, 1% range scans: {len(blocks) / elapsed:,.0f} blocks/s ({scanned:,} ticks returned)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ import pytest
 from datetime import datetime
 
 from engine import ArbitrageEngine
+from engine_symbols import SymbolRegistry, symbols
+from engine_triangular import TriangularArbitrageEngine
+from exchanges import BinanceExchange
 from exchanges.base import PriceUpdate
 
 
@@ -171,3 +174,43 @@ class TestArbitrageEngine:
         assert len(engine.prices) == 3
         for pair in pairs:
             assert pair in engine.prices
+
+
+class TestSymbolRegistry:
+    """Tests for interned exchange and pair ids"""
+    
+    def test_ids_are_dense_and_stable(self):
+        registry = SymbolRegistry()
+        assert [registry.pair_id(p) for p in ["BTC/USDT", "ETH/BTC", "BTC/USDT"]] == [0, 1, 0]
+        assert registry.exchange_id("binance") == 0
+        assert registry.split(registry.pair_id("ETH/BTC")) == ("ETH", "BTC")
+        assert registry.pair_base[0] == registry.pair_quote[1] == registry.find_currency("BTC")
+        assert registry.split(registry.pair_id("BTCPERP")) is None
+    
+    def test_parsers_resolve_ids(self):
+        update = BinanceExchange()._parse_message({"s": "BTCUSDT", "b": "50000.00", "a": "50001.00"})
+        assert update.pair == "BTC/USDT"
+        assert update.pair_id == symbols.pair_id("BTC/USDT")
+        assert update.exchange_id == symbols.exchange_id("Binance")
+        
+        # Updates built by name resolve the same ids
+        assert PriceUpdate("Binance", "BTC/USDT", 1.0, 1.0, datetime.now()).pair_id == update.pair_id
+
+
+class TestTriangularArbitrageEngine:
+    """Tests for id-keyed triangular detection"""
+    
+    def test_paths_follow_new_pairs(self):
+        engine = TriangularArbitrageEngine(min_profit_threshold=0.1, trading_fee=0.0)
+        engine.update_price("binance", "BTC/USDT", 50000.0, 50000.0)
+        engine.update_price("binance", "ETH/BTC", 0.05, 0.05)
+        assert engine.get_state()["paths_computed"]["binance"] == 0
+        
+        # ETH is worth 2600 USDT but only 2500 via BTC: buy BTC, buy ETH, sell ETH
+        engine.update_price("binance", "ETH/USDT", 2600.0, 2600.0)
+        assert engine.get_state()["paths_computed"]["binance"] == 2
+        best = engine.opportunities[0]
+        assert best.path.pairs == ["BTC/USDT", "ETH/BTC", "ETH/USDT"]
+        assert best.path.sides == ["buy", "buy", "sell"]
+        assert best.profit_percent == pytest.approx(4.0)
+        assert best.to_dict()["prices"]["ETH/USDT"] == {"bid": 2600.0, "ask": 2600.0}
@@ -0,0 +1,639 @@
+"""
+Tests for ML feature extraction and prediction.
+"""
+
+import asyncio
+import glob
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from engine_ringbuffer import RingBuffer, RollingMoments, PairRingBuffers
+from engine_ml import AnomalyDetector, FeatureExtractor, MLEngine, VenueConsensus, WINDOW_LONG
+from engine_ml_advanced import (
+    AdvancedFeatureExtractor, AdvancedMLEngine, RuleBasedPredictor, WilderRSI, FEATURE_COUNT
+)
+from engine_inference import InferenceService
+from engine_model_manager import ModelManager
+from engine_dataset import DatasetBuilder, iter_export_ticks, iter_timescale_ticks
+from engine_export import TickExporter
+from engine_leadlag import LeadLagAnalyzer
+from engine_outcomes import OutcomeTracker
+from engine_storage import TickStorage
+from engine_timescale import InMemoryFallback
+
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def feed_ticks(extractor, n: int = 500, seed: int = 3, pairs=("BTC/USDT", "ETH/USDT")):
+    """Random-walk quotes for a few pairs across three exchanges"""
+    rng = random.Random(seed)
+    mids = {pair: 100.0 for pair in pairs}
+    
+    for i in range(n):
+        exchange = rng.choice(["binance", "kraken", "coinbase"])
+        pair = rng.choice(pairs)
+        mids[pair] *= 1 + rng.gauss(0, 0.001)
+        extractor.update(exchange, pair, mids[pair] - 0.01, mids[pair] + 0.01, START + timedelta(milliseconds=20 * i))
+    
+    return extractor
+
+
+class TestRingBuffer:
+    """Tests for RingBuffer"""
+    
+    def test_windows_are_views_in_order(self):
+        buffer = RingBuffer(4)
+        for i in range(10):
+            buffer.append(float(i), 100.0 + i)
+        
+        window = buffer.values()
+        
+        assert window.tolist() == [6.0, 7.0, 8.0, 9.0]
+        assert buffer.times(2).tolist() == [108.0, 109.0]
+        assert np.shares_memory(window, buffer._values)
+        assert not window.flags.writeable
+    
+    def test_indexing_and_span(self):
+        buffer = RingBuffer(3)
+        buffer.append(1.0, 10.0)
+        buffer.append(2.0, 12.5)
+        
+        assert len(buffer) == 2
+        assert buffer[0] == 1.0 and buffer[-1] == 2.0
+        assert buffer.latest == 2.0
+        assert buffer.time_span() == 2.5
+        with pytest.raises(IndexError):
+            buffer[2]
+    
+    def test_pair_index(self):
+        buffers = PairRingBuffers(8)
+        buffers.append("binance", "BTC/USDT", 1.0)
+        buffers.append("kraken", "BTC/USDT", 2.0)
+        buffers.append("binance", "ETH/USDT", 3.0)
+        
+        assert list(buffers.for_pair("BTC/USDT")) == ["binance", "kraken"]
+        assert buffers.for_pair("SOL/USDT") == {}
+        assert ("binance", "ETH/USDT") in buffers
+        assert len(buffers) == 3
+
+
+class TestStreamingIndicators:
+    """Tests for O(1) indicator accumulators"""
+    
+    def test_rolling_moments_match_window(self):
+        rng = np.random.default_rng(5)
+        moments = RollingMoments(50)
+        data = 65000 + np.cumsum(rng.normal(size=1234))
+        for value in data:
+            moments.append(float(value))
+        
+        window = data[-50:]
+        deviations = window - window.mean()
+        std = window.std(ddof=1)
+        
+        assert moments.mean() == pytest.approx(window.mean(), rel=1e-12)
+        assert moments.std() == pytest.approx(std, rel=1e-6)
+        assert moments.skewness() == pytest.approx((deviations ** 3).sum() / (50 * std ** 3), rel=1e-4)
+    
+    def test_rolling_moments_constant_window(self):
+        moments = RollingMoments(5)
+        for value in [1.0, 7.0, 3.0] + [2.5] * 5:
+            moments.append(value)
+        
+        assert moments.std() == 0.0
+        assert moments.skewness() == 0.0
+    
+    def test_wilder_rsi(self):
+        changes = [1.0, -0.5, 2.0, -1.0] * 4
+        rsi = WilderRSI(period=14)
+        for change in changes[:13]:
+            rsi.update(change)
+        assert rsi.value == 50.0  # Not seeded yet
+        
+        for change in changes[13:]:
+            rsi.update(change)
+        
+        # Seed: simple averages of the first 14, then Wilder smoothing
+        gain = sum(max(c, 0) for c in changes[:14]) / 14
+        loss = sum(max(-c, 0) for c in changes[:14]) / 14
+        for change in changes[14:]:
+            gain = (gain * 13 + max(change, 0)) / 14
+            loss = (loss * 13 + max(-change, 0)) / 14
+        
+        assert rsi.value == pytest.approx(100 - 100 / (1 + gain / loss))
+
+
+class TestFeatureExtractors:
+    """Tests for the ring-buffer backed feature extractors"""
+    
+    def test_basic_extractor_windows(self):
+        extractor = feed_ticks(FeatureExtractor())
+        features = extractor.extract("BTC/USDT")
+        
+        assert features.exchange_count == 3
+        assert features.volatility_short > 0
+        assert features.updates_per_second > 0
+        assert all(len(buf) <= WINDOW_LONG for _, buf in extractor.prices.items())
+        assert extractor.extract("SOL/USDT").exchange_count == 0
+    
+    def test_advanced_extractor_matches_reference_math(self):
+        extractor = feed_ticks(AdvancedFeatureExtractor(), n=1000)
+        features = extractor.extract("ETH/USDT")
+        
+        spreads = extractor.spreads["ETH/USDT"].values()
+        first_exchange = next(iter(extractor.prices.for_pair("ETH/USDT")))
+        prices = extractor.prices[(first_exchange, "ETH/USDT")].values(60)
+        returns = np.diff(prices) / prices[:-1]
+        
+        assert features.exchange_count == 3
+        assert features.spread_mean == pytest.approx(float(np.mean(spreads)))
+        assert features.volatility_1m == pytest.approx(float(np.std(returns, ddof=1)))
+        
+        window = extractor.prices[(first_exchange, "ETH/USDT")].values(20)
+        lower = window.mean() - 2 * window.std(ddof=1)
+        assert features.bollinger_position == pytest.approx((window[-1] - lower) / (4 * window.std(ddof=1)))
+
+    
+    def test_snapshots_reused_until_next_tick(self):
+        extractor = feed_ticks(AdvancedFeatureExtractor(), n=200)
+        first = extractor.extract("BTC/USDT")
+        
+        assert extractor.extract("BTC/USDT") is first
+        assert extractor.cache_stats()["hits"] == 1
+        
+        extractor.update("binance", "ETH/USDT", 99.0, 99.1)  # Other pair: still current
+        assert extractor.extract("BTC/USDT") is first
+        
+        extractor.record_opportunity()
+        assert extractor.extract("BTC/USDT") is not first
+        
+        basic = feed_ticks(FeatureExtractor(), n=200)
+        snapshot = basic.extract("BTC/USDT")
+        assert basic.extract("BTC/USDT") is snapshot
+        basic.update("kraken", "BTC/USDT", 99.0, 99.1)
+        assert basic.extract("BTC/USDT") is not snapshot
+    
+    def test_cache_lookups_exported(self):
+        def exported(name, engine):
+            return REGISTRY.get_sample_value(name, {"engine": engine}) or 0.0
+        
+        hits, misses = exported("arb_ml_feature_cache_hits_total", "advanced"), exported("arb_ml_feature_cache_misses_total", "advanced")
+        extractor = feed_ticks(AdvancedFeatureExtractor(), n=50)
+        for _ in range(3):
+            extractor.extract("BTC/USDT")
+        assert exported("arb_ml_feature_cache_hits_total", "advanced") == hits + 2
+        assert exported("arb_ml_feature_cache_misses_total", "advanced") == misses + 1
+        
+        ml = MLEngine()
+        for i in range(30):
+            ml.process_update("binance", "BTC/USDT", 100.0 + i, 100.1 + i, START + timedelta(seconds=i))
+        hits = exported("arb_ml_prediction_cache_hits_total", "ml")
+        ml.opportunity_predictor.predict("BTC/USDT")  # No tick since the last prediction
+        assert exported("arb_ml_prediction_cache_hits_total", "ml") == hits + 1
+
+
+class TestAnomalyConsensus:
+    """Tests for the median/MAD venue consensus and the stale sweep"""
+    
+    def test_median_and_mad_track_updates(self):
+        rng = random.Random(5)
+        consensus = VenueConsensus()
+        for _ in range(500):
+            consensus.update(f"ex{rng.randrange(7)}", rng.uniform(90, 110))
+            if rng.random() < 0.1:
+                consensus.remove(f"ex{rng.randrange(7)}")
+            if not len(consensus):
+                continue
+            
+            prices = np.array(list(consensus.prices.values()))
+            median = float(np.median(prices))
+            assert consensus.median() == pytest.approx(median)
+            assert consensus.mad() == pytest.approx(float(np.median(np.abs(prices - median))))
+    
+    def test_one_bad_venue_does_not_desync_the_rest(self):
+        detector = AnomalyDetector()
+        now = datetime.now()
+        for exchange, price in [("binance", 100.0), ("kraken", 100.02), ("coinbase", 99.99), ("okx", 103.0)]:
+            detector.check(exchange, "BTC/USDT", price, now)
+        
+        # A mean consensus (100.75) would flag every healthy venue
+        assert [a.exchange for a in detector.anomalies] == ["okx"]
+        assert detector.check("binance", "BTC/USDT", 100.01, now) is None
+    
+    def test_sweep_reports_stale_once_and_drops_from_consensus(self):
+        engine = MLEngine()
+        seen = []
+        engine.on_anomaly(seen.append)
+        start = datetime.now()
+        
+        engine.process_update("binance", "BTC/USDT", 99.99, 100.01, start)
+        engine.process_update("kraken", "BTC/USDT", 99.99, 100.01, start)
+        engine.process_update("kraken", "BTC/USDT", 99.99, 100.01, start + timedelta(seconds=4))
+        
+        later = start + timedelta(seconds=5)
+        assert [(a.exchange, a.anomaly_type) for a in engine.sweep_stale(later)] == [("binance", "stale")]
+        assert engine.sweep_stale(later) == []
+        assert "binance" not in engine.anomaly_detector.consensus["BTC/USDT"]
+        assert seen[-1].anomaly_type == "stale"
+        
+        engine.process_update("binance", "BTC/USDT", 99.99, 100.01, later)
+        assert "binance" in engine.anomaly_detector.consensus["BTC/USDT"]
+
+
+class FakeSession:
+    """Stands in for an onnxruntime.InferenceSession"""
+    
+    def __init__(self, delay: float = 0.0, probability: float = 0.25):
+        self.calls = []
+        self.delay = delay
+        self.probability = probability
+    
+    def get_inputs(self):
+        return [SimpleNamespace(name="input")]
+    
+    def get_outputs(self):
+        return [SimpleNamespace(name="output")]
+    
+    def run(self, output_names, feeds):
+        batch = feeds["input"]
+        self.calls.append(batch.copy())
+        time.sleep(self.delay)
+        return [batch[:, :1] * 0 + self.probability]
+
+
+def install_session(engine, session):
+    engine.onnx_predictor.session = session
+    engine.onnx_predictor.input_name = "input"
+    engine.onnx_predictor.output_name = "output"
+
+
+class TestBatchedInference:
+    """Tests for AdvancedMLEngine.predict_batch"""
+    
+    PAIRS = ("BTC/USDT", "ETH/USDT", "SOL/USDT", "XRP/USDT")
+    
+    @pytest.fixture
+    def engine(self):
+        engine = AdvancedMLEngine(max_batch=3)
+        for pair in self.PAIRS:
+            feed_ticks(engine.feature_extractor, n=300, pairs=(pair,))
+        return engine
+    
+    def test_rule_based_batch_matches_scalar(self, engine):
+        predictor = RuleBasedPredictor()
+        features = [engine.feature_extractor.extract(pair) for pair in self.PAIRS]
+        batch = np.array([f.to_vector() for f in features], dtype=np.float32)
+        
+        expected = [predictor.predict(f) for f in features]
+        
+        assert predictor.predict_batch(batch) == pytest.approx(expected, abs=1e-6)
+    
+    def test_one_session_run_per_chunk(self, engine):
+        session = FakeSession()
+        install_session(engine, session)
+        
+        results = engine.predict_batch(list(self.PAIRS))
+        
+        assert [len(c) for c in session.calls] == [3, 1]  # max_batch=3
+        assert session.calls[0].dtype == np.float32
+        assert session.calls[0].shape[1] == FEATURE_COUNT
+        assert set(results) == set(self.PAIRS)
+        assert all(r.model_name == "onnx_lstm" and r.probability == 0.25 for r in results.values())
+        assert results["BTC/USDT"].details["batch_size"] == 3
+    
+    def test_predictions_memoized_per_data_version(self, engine):
+        session = FakeSession()
+        install_session(engine, session)
+        
+        first = engine.predict("BTC/USDT")
+        assert engine.predict("BTC/USDT") is first
+        assert engine.predict_batch(["BTC/USDT", "ETH/USDT"])["BTC/USDT"] is first
+        assert [len(c) for c in session.calls] == [1, 1]  # Only ETH was rescored
+        
+        engine.update("binance", "BTC/USDT", 100.0, 100.1)
+        assert engine.predict("BTC/USDT") is not first
+        
+        install_session(engine, FakeSession())  # New model invalidates the memo
+        assert engine.cached_prediction("ETH/USDT") is None
+        assert engine.get_state()["cache"]["predictions"]["hits"] == 2
+    
+    def test_run_cycle_predicts_active_pairs(self, engine):
+        assert engine.run_cycle(max_age_seconds=None).keys() == set(self.PAIRS)
+        assert engine.run_cycle(max_age_seconds=1.0) == {}  # Ticks are from 2024
+        assert engine.batches_run == 2
+
+
+class TestInferenceService:
+    """Tests for the off-loop inference service"""
+    
+    @pytest.fixture
+    def engine(self):
+        engine = AdvancedMLEngine()
+        feed_ticks(engine.feature_extractor, n=300)
+        return engine
+    
+    @pytest.fixture
+    def service(self, engine):
+        service = InferenceService(engine, max_queue=2, latency_budget_ms=1000)
+        yield service
+        service.stop()
+    
+    def test_model_answers_within_budget(self, engine, service):
+        install_session(engine, FakeSession())
+        
+        result = service.predict("BTC/USDT")
+        
+        assert result.model_name == "onnx_lstm"
+        assert result.probability == 0.25
+        assert result.details["budget_miss"] is False
+        assert service.get_state()["served"] == 1
+    
+    def test_slow_model_falls_back_to_rules(self, engine, service):
+        install_session(engine, FakeSession(delay=0.2))
+        expected = engine.rule_predictor.predict(engine.extract("ETH/USDT"))
+        
+        result = asyncio.run(service.predict_async("ETH/USDT", budget_ms=20))
+        
+        assert result.model_name == "rule_based"
+        assert result.probability == pytest.approx(expected)
+        assert result.details["fallback_reason"] == "timeout"
+        assert service.budget_misses == 1
+    
+    def test_fallback_never_waits_for_the_engine_lock(self, engine, service):
+        stale = engine.extract("ETH/USDT")
+        engine.update("binance", "ETH/USDT", 100.0, 100.1)  # The snapshot is now out of date
+        release = threading.Event()
+        
+        def slow_extraction():
+            with engine._lock:
+                release.wait()
+        
+        service.schedule("busy", slow_extraction)  # Occupies the only worker
+        time.sleep(0.05)
+        
+        start = time.perf_counter()
+        result = asyncio.run(service.predict_async("ETH/USDT", budget_ms=20))
+        unseen = asyncio.run(service.predict_async("DOGE/USDT", budget_ms=20))
+        elapsed = time.perf_counter() - start
+        release.set()
+        
+        assert elapsed < 0.5
+        assert result.details["fallback_reason"] == "timeout"
+        assert result.probability == pytest.approx(engine.rule_predictor.predict(stale))
+        assert unseen.model_name == "rule_based" and unseen.details["exchange_count"] == 0
+    
+    def test_full_queue_sheds_and_coalesces(self, service):
+        release = threading.Event()
+        service.schedule("busy", release.wait)  # Occupies the only worker
+        time.sleep(0.05)
+        
+        ml = MLEngine(inference=service)
+        for i in range(20):
+            ml.process_update("binance", "BTC/USDT", 100.0 + i, 100.1 + i, START + timedelta(seconds=i))
+        service.schedule("other", lambda: None)  # Fills the queue (max_queue=2)
+        
+        result = service.predict("BTC/USDT")
+        release.set()
+        
+        assert service.coalesced == 19  # One queued prediction for 20 ticks
+        assert service.shed == 1
+        assert result.details["fallback_reason"] == "shed"
+
+
+class TestModelManager:
+    """Tests for ONNX hot reload and shadow scoring"""
+    
+    @pytest.fixture
+    def engine(self):
+        engine = AdvancedMLEngine()
+        feed_ticks(engine.feature_extractor, n=300)
+        return engine
+    
+    @staticmethod
+    def write_model(path, probability, age=10.0):
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(str(probability))
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+    
+    @staticmethod
+    def factory(path):
+        """Model files hold the probability the fake session returns"""
+        with open(path) as f:
+            return FakeSession(probability=float(f.read()))
+    
+    def test_newest_model_swapped_in_without_losing_state(self, engine, tmp_path):
+        manager = ModelManager(engine, str(tmp_path), session_factory=self.factory)
+        self.write_model(tmp_path / "v1.onnx", 0.25, age=20)
+        
+        assert manager.poll()
+        assert engine.predict("BTC/USDT").probability == 0.25
+        
+        self.write_model(tmp_path / "v2.onnx", 0.75)
+        self.write_model(tmp_path / "v3.onnx", 0.9, age=0)  # Still being written
+        extractor = engine.feature_extractor
+        
+        assert manager.poll()
+        assert not manager.poll()  # Nothing new
+        assert engine.onnx_predictor.model_path.endswith("v2.onnx")
+        assert engine.predict("BTC/USDT").probability == pytest.approx(0.75)  # Memo invalidated by the swap
+        assert engine.feature_extractor is extractor
+        assert manager.swaps == 2
+    
+    def test_failed_load_keeps_serving(self, engine, tmp_path):
+        manager = ModelManager(engine, str(tmp_path), session_factory=self.factory)
+        self.write_model(tmp_path / "good.onnx", 0.25, age=20)
+        manager.poll()
+        
+        (tmp_path / "broken.onnx").write_text("not a model")
+        os.utime(tmp_path / "broken.onnx", (time.time() - 10, time.time() - 10))
+        
+        assert not manager.poll()
+        assert manager.failures == 1
+        assert engine.predict("ETH/USDT").probability == 0.25
+    
+    def test_shadow_scored_separately(self, engine, tmp_path):
+        manager = ModelManager(engine, str(tmp_path), shadow_fraction=1.0, session_factory=self.factory)
+        self.write_model(tmp_path / "live.onnx", 0.9)
+        self.write_model(tmp_path / "shadow" / "candidate.onnx", 0.1)
+        manager.poll()
+        
+        live = engine.predict("BTC/USDT")
+        manager._shadow_executor.submit(lambda: None).result()  # Drain shadow runs
+        engine.record_outcome("BTC/USDT", had_opportunity=False)
+        engine.outcomes.expire(time.time() + 1)  # No opportunity within the horizon
+        
+        state = manager.get_state()
+        assert live.probability == pytest.approx(0.9)
+        assert state["shadow"]["predictions"] == 1
+        assert state["shadow"]["accuracy"] == 1.0
+        assert state["live"]["accuracy"] == 0.0
+        
+        assert manager.promote_shadow()
+        assert engine.predict("BTC/USDT").probability == pytest.approx(0.1)
+        manager.stop()
+    
+    def test_each_label_scores_its_own_prediction(self, tmp_path):
+        engine = AdvancedMLEngine(time_horizon_ms=100)
+        feed_ticks(engine.feature_extractor, n=300)
+        manager = ModelManager(engine, str(tmp_path), shadow_fraction=1.0, session_factory=self.factory)
+        self.write_model(tmp_path / "live.onnx", 0.9)
+        self.write_model(tmp_path / "shadow" / "candidate.onnx", 0.1)
+        manager.poll()
+        
+        # Three predictions inside one horizon; only the first is followed by an opportunity
+        for i in range(3):
+            engine.feature_extractor.update("binance", "BTC/USDT", 99.0 + i, 99.1 + i, START + timedelta(seconds=60 + i))
+            engine.predict("BTC/USDT")
+            manager._shadow_executor.submit(lambda: None).result()
+            time.sleep(0.002)
+            if i == 0:
+                engine.record_opportunity("BTC/USDT")
+                time.sleep(0.002)
+        time.sleep(0.11)
+        engine.outcomes.expire()
+        
+        state = manager.get_state()
+        assert engine.outcomes.labelled == 3
+        assert state["live"]["outcomes"] == state["shadow"]["outcomes"] == 3
+        assert state["live"]["accuracy"] == round(1 / 3, 4)
+        assert state["shadow"]["accuracy"] == round(2 / 3, 4)
+        manager.stop()
+
+
+class TestOutcomeTracker:
+    """Tests for horizon-based prediction labelling"""
+    
+    def test_labels_after_horizon(self):
+        tracker = OutcomeTracker(time_horizon_ms=500, threshold=0.6)
+        tracker.record_prediction("BTC/USDT", "onnx_lstm", 0.9, 100.0)
+        tracker.record_prediction("BTC/USDT", "onnx_lstm", 0.2, 100.1)
+        tracker.record_prediction("ETH/USDT", "onnx_lstm", 0.8, 100.2)
+        tracker.record_opportunity("BTC/USDT", 100.4)
+        
+        assert tracker.labelled == 0  # Horizons still open
+        assert tracker.expire(100.55) == 1
+        tracker.record_opportunity("ETH/USDT", 100.75)  # Too late for ETH's prediction
+        tracker.expire(101.0)
+        
+        card = tracker.scorecards["onnx_lstm"]
+        assert card.to_dict()["confusion_matrix"] == {"tp": 1, "fp": 1, "tn": 0, "fn": 1}
+        assert card.accuracy == pytest.approx(1 / 3)
+        assert [b["count"] for b in card.calibration()] == [1, 1, 1]
+        assert card.brier_sum / card.total == pytest.approx((0.1 ** 2 + 0.8 ** 2 + 0.8 ** 2) / 3)
+    
+    def test_rolling_accuracy_is_windowed(self):
+        tracker = OutcomeTracker(time_horizon_ms=100, rolling_window=10)
+        for i in range(30):
+            t = 1000.0 + i
+            tracker.record_prediction("BTC/USDT", "rule_based", 0.9 if i < 20 else 0.1, t)
+        tracker.expire(2000.0)
+        
+        card = tracker.scorecards["rule_based"]
+        assert card.total == 30
+        assert card.accuracy == pytest.approx(10 / 30)
+        assert card.rolling_accuracy == 1.0  # Last 10 all correctly negative
+    
+    def test_engine_labels_its_predictions(self):
+        engine = AdvancedMLEngine(time_horizon_ms=50)
+        feed_ticks(engine.feature_extractor, n=200)
+        engine.predict("BTC/USDT")
+        engine.record_opportunity("BTC/USDT")
+        time.sleep(0.06)
+        
+        metrics = engine.get_accuracy_metrics()
+        assert metrics["insufficient_data"] and metrics["pending"] == 0
+        assert engine.outcomes.scorecards["rule_based"].total == 1
+
+
+class TestDatasetBuilder:
+    """Tests for the offline training dataset builder"""
+    
+    OPPORTUNITY_TICK = 300  # 30s after START
+    
+    @pytest.fixture
+    def export(self, tmp_path):
+        """Two exchanges quoting BTC every 100ms, crossed once at OPPORTUNITY_AT"""
+        storage = TickStorage()
+        rng = random.Random(4)
+        mid = 100.0
+        for i in range(600):
+            t = START + timedelta(milliseconds=100 * i)
+            mid *= 1 + rng.gauss(0, 0.00001)
+            storage.store("binance", "BTC/USDT", mid - 0.01, mid + 0.01, t)
+            skew = 1.0 if i == self.OPPORTUNITY_TICK else 0.0  # Kraken bid above Binance ask
+            storage.store("kraken", "BTC/USDT", mid - 0.01 + skew, mid + 0.01 + skew, t + timedelta(milliseconds=5))
+        
+        path = str(tmp_path / "export")
+        TickExporter(storage, fmt="npz").export(path)
+        return path
+    
+    def test_labels_and_chunks(self, export, tmp_path):
+        out = str(tmp_path / "dataset")
+        builder = DatasetBuilder(out, time_horizon_ms=500, sample_ms=100, chunk_rows=100)
+        manifest = builder.build(iter_export_ticks([export]))
+        
+        chunks = [np.load(path) for path in sorted(glob.glob(os.path.join(out, "part-*.npz")))]
+        times = np.concatenate([c["times"] for c in chunks])
+        labels = np.concatenate([c["labels"] for c in chunks])
+        
+        assert manifest["rows"] == len(times) == 600
+        assert manifest["chunks"] == len(chunks) > 1
+        assert all(c["features"].shape[1] == FEATURE_COUNT for c in chunks)
+        assert np.all(np.diff(times) > 0)
+        
+        # Rows in the 500ms before the crossed quote are positive, nothing else
+        opportunity = START.timestamp() + self.OPPORTUNITY_TICK * 0.1 + 0.005
+        expected = (times < opportunity) & (times >= opportunity - 0.5)
+        assert labels.tolist() == expected.astype(np.uint8).tolist()
+        assert json.load(open(os.path.join(out, "manifest.json")))["positives"] == 5
+    
+    def test_rows_match_live_extractor(self, export, tmp_path):
+        builder = DatasetBuilder(str(tmp_path / "dataset"), chunk_rows=1000)
+        live = AdvancedFeatureExtractor(lead_lag=LeadLagAnalyzer(background=False))
+        for tick in list(iter_export_ticks([export]))[:251]:
+            rows = builder._size
+            builder.add_tick(*tick)
+            epoch, exchange, pair, bid, ask, bid_size, ask_size = tick
+            live.update(exchange, pair, bid, ask, datetime.fromtimestamp(epoch), bid_size, ask_size)
+        
+        assert builder._size == rows + 1  # The last tick was sampled
+        expected = live.extract("BTC/USDT", now=datetime.fromtimestamp(epoch)).to_vector()
+        assert builder._features[rows].tolist() == np.float32(expected).tolist()
+    
+    def test_in_memory_source_ascending(self):
+        source = InMemoryFallback()
+        source.store("kraken", "BTC/USDT", 1.0, 2.0, START + timedelta(seconds=2))
+        source.store("binance", "BTC/USDT", 1.0, 2.0, START + timedelta(seconds=1))
+        
+        rows = source.query_ticks(ascending=True)
+        
+        assert [r["exchange"] for r in rows] == ["binance", "kraken"]
+    
+    def test_timescale_window_grows_back_after_burst(self):
+        source = InMemoryFallback()
+        for i in range(50):  # Burst in the first five seconds
+            source.store("binance", "BTC/USDT", 1.0, 2.0, START + timedelta(milliseconds=100 * i))
+        for i in range(1, 48):  # Then one tick a minute
+            source.store("binance", "BTC/USDT", 1.0, 2.0, START + timedelta(minutes=i))
+        
+        queries = []
+        query_ticks = source.query_ticks
+        source.query_ticks = lambda **kwargs: queries.append(kwargs) or query_ticks(**kwargs)
+        
+        ticks = list(iter_timescale_ticks(source, START, START + timedelta(hours=1), window=timedelta(minutes=10), page_limit=20))
+        
+        assert len(ticks) == 97
+        assert [t[0] for t in ticks] == sorted(t[0] for t in ticks)
+        assert len(queries) < 40  # Not one query a second for the rest of the hour
+        assert max(q["end"] - q["start"] for q in queries[-5:]) >= timedelta(minutes=10) - timedelta(microseconds=1)
@@ -0,0 +1,331 @@
+"""
+Tests for statistical arbitrage engine.
+"""
+
+import math
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from engine_leadlag import LeadLagAnalyzer
+from engine_resampler import MidPriceResampler
+from engine_statistical import (
+    StatisticalArbitrageEngine, PairDiscovery, CointegrationTester, KalmanHedge
+)
+
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def feed_prices(target, n: int = 2000, seed: int = 7):
+    """BTC and ETH share a common driver; DOGE is an independent walk"""
+    rng = random.Random(seed)
+    common = 0.0
+    spread = 0.0
+    doge = 0.0
+    
+    for i in range(n):
+        common += rng.gauss(0, 0.001)
+        spread = 0.95 * spread + rng.gauss(0, 0.0003)  # Mean-reverting residual
+        doge += rng.gauss(0, 0.001)
+        t = START + timedelta(milliseconds=100 * i + 7)
+        
+        target.update("binance", "BTC/USDT", 65000 * math.exp(common), t)
+        target.update("binance", "ETH/USDT", 3500 * math.exp(common + spread), t)
+        target.update("binance", "DOGE/USDT", 0.1 * math.exp(doge), t)
+    
+    return target
+
+
+class TestMidPriceResampler:
+    """Tests for MidPriceResampler"""
+    
+    def test_as_of_join_on_fixed_grid(self):
+        """Rows hold the last value seen before each grid time"""
+        resampler = MidPriceResampler(interval_ms=100)
+        resampler.update("binance", "BTC/USDT", 100.0, 10.05)
+        resampler.update("kraken", "BTC/USDT", 200.0, 10.08)
+        resampler.update("binance", "BTC/USDT", 101.0, 10.25)  # Crosses 10.1 and 10.2
+        
+        times, values = resampler.window([("binance", "BTC/USDT"), ("kraken", "BTC/USDT")])
+        
+        assert np.allclose(times, [10.1, 10.2])
+        assert values.tolist() == [[100.0, 200.0], [100.0, 200.0]]
+    
+    def test_sample_callback_fires_once_per_batch(self):
+        resampler = MidPriceResampler(interval_ms=100)
+        fired = []
+        resampler.on_sample(fired.append)
+        
+        resampler.update("binance", "BTC/USDT", 100.0, 10.0)
+        resampler.update("binance", "BTC/USDT", 100.0, 10.55)
+        
+        assert len(fired) == 1
+        assert fired[0] == pytest.approx(10.5)
+        assert len(resampler) == 5
+    
+    def test_ring_buffer_and_column_growth(self):
+        resampler = MidPriceResampler(interval_ms=100, capacity=10, initial_columns=1)
+        for i in range(30):
+            resampler.update("binance", f"P{i % 3}/USDT", float(i), 1.0 + i * 0.1)
+        
+        keys, times, values = resampler.snapshot()
+        
+        assert len(keys) == 3
+        assert values.shape == (10, 3)
+        assert np.all(np.diff(times) > 0)
+        assert resampler.latest("binance", "P2/USDT") == 26.0
+
+
+class TestPairDiscovery:
+    """Tests for PairDiscovery"""
+    
+    @pytest.fixture
+    def discovery(self):
+        return PairDiscovery(top_k=2, min_points=50, demote_after=2)
+    
+    @pytest.fixture
+    def resampler(self):
+        return feed_prices(MidPriceResampler(interval_ms=100))
+    
+    def test_screen_ranks_cointegrated_pair_first(self, discovery, resampler):
+        """The co-moving pair should rank above the unrelated ones"""
+        candidates = discovery.screen(resampler.snapshot(), resampler.interval_ms)
+        
+        assert len(candidates) == 3
+        best = candidates[0]
+        assert best.key == ("BTC/USDT", "ETH/USDT")
+        assert best.correlation > 0.9
+        assert best.half_life is not None
+    
+    def test_apply_promotes_with_hysteresis(self, discovery, resampler):
+        """Promoted pairs survive a single failed screen"""
+        candidates = discovery.screen(resampler.snapshot(), resampler.interval_ms)
+        promoted = discovery.apply(candidates)
+        assert ("BTC/USDT", "ETH/USDT") in promoted
+        
+        # One empty run: still tracked
+        assert ("BTC/USDT", "ETH/USDT") in discovery.apply([])
+        
+        # Second consecutive miss: demoted
+        assert ("BTC/USDT", "ETH/USDT") not in discovery.apply([])
+
+
+class TestCointegrationTester:
+    """Tests for CointegrationTester"""
+    
+    @pytest.fixture
+    def tester(self):
+        return CointegrationTester(min_points=100)
+    
+    @pytest.fixture
+    def resampler(self):
+        return feed_prices(MidPriceResampler(interval_ms=100), n=3000)
+    
+    def test_engle_granger_separates_pairs(self, tester, resampler):
+        """Shared driver is cointegrated; independent walks are not"""
+        candidates = [
+            ("binance", "ETH/USDT", "BTC/USDT"),
+            ("binance", "DOGE/USDT", "BTC/USDT"),
+            ("kraken", "ETH/USDT", "BTC/USDT"),  # No data: skipped
+        ]
+        results = {
+            r.key: r for r in tester.test_pairs(resampler.snapshot(), resampler.interval_ms, candidates)
+        }
+        
+        assert len(results) == 2
+        
+        hedged = results[("binance", "ETH/USDT", "BTC/USDT")]
+        assert hedged.cointegrated
+        assert hedged.hedge_ratio == pytest.approx(1.0, abs=0.2)
+        assert hedged.observations == 300
+        
+        assert not results[("binance", "DOGE/USDT", "BTC/USDT")].cointegrated
+    
+    def test_batch_matches_single_pair_regression(self):
+        """Batched ADF t-statistic equals a per-pair least squares fit"""
+        rng = np.random.default_rng(3)
+        x = np.cumsum(rng.normal(size=(3, 400)), axis=1)
+        y = 0.5 * x + rng.normal(size=(3, 400))
+        
+        beta, alpha, adf, _ = CointegrationTester.engle_granger(y, x, lags=1)
+        
+        slope, intercept = np.polyfit(x[1], y[1], 1)
+        resid = y[1] - intercept - slope * x[1]
+        diff = np.diff(resid)
+        design = np.column_stack([resid[1:-1], diff[:-1]])
+        coef, *_ = np.linalg.lstsq(design, diff[1:], rcond=None)
+        errors = diff[1:] - design @ coef
+        variance = errors @ errors / (len(errors) - 2)
+        se = np.sqrt(variance * np.linalg.inv(design.T @ design)[0, 0])
+        
+        assert beta[1] == pytest.approx(slope)
+        assert alpha[1] == pytest.approx(intercept)
+        assert adf[1] == pytest.approx(coef[0] / se)
+    
+    def test_results_expire(self, tester, resampler):
+        candidates = [("binance", "ETH/USDT", "BTC/USDT")]
+        tester.apply(tester.test_pairs(resampler.snapshot(), resampler.interval_ms, candidates))
+        result = tester.results[candidates[0]]
+        
+        assert tester.get(*candidates[0], now=result.tested_at + 1) is result
+        assert tester.get(*candidates[0], now=result.tested_at + tester.max_age_seconds + 1) is None
+
+
+class TestKalmanHedge:
+    """Tests for KalmanHedge"""
+    
+    def test_tracks_hedge_ratio_and_normalizes_innovations(self):
+        rng = random.Random(1)
+        kalman = KalmanHedge()
+        common = spread = 0.0
+        z_scores = []
+        
+        for i in range(6000):
+            common += rng.gauss(0, 0.001)
+            spread = 0.95 * spread + rng.gauss(0, 0.0003)
+            kalman.update(3500 * math.exp(common + spread), 65000 * math.exp(common))
+            if i >= 1000:
+                z_scores.append(kalman.z_score)
+        
+        assert kalman.beta == pytest.approx(1.0, abs=0.05)
+        assert kalman.count == 6000
+        assert 0.7 < np.std(z_scores) < 1.3
+    
+    def test_fixed_observation_noise(self):
+        kalman = KalmanHedge(observation_var=1e-4)
+        for _ in range(10):
+            kalman.update(110.0, 100.0)
+        
+        assert kalman.observation_var == 1e-4
+        assert abs(kalman.spread) < 1e-3
+
+
+class TestStatisticalArbitrageEngine:
+    """Tests for StatisticalArbitrageEngine"""
+    
+    @pytest.fixture
+    def engine(self):
+        engine = StatisticalArbitrageEngine(discovery=PairDiscovery(min_points=50))
+        yield engine
+        engine.stop()
+    
+    def test_spreads_evaluated_on_sample_clock(self, engine):
+        """Bursts of ticks inside one interval produce a single spread sample"""
+        for i in range(150):
+            t = START + timedelta(milliseconds=100 * i)
+            for j in range(5):
+                jitter = timedelta(milliseconds=10 * j)
+                engine.update_price("binance", "BTC/USDT", 65000 + i, t + jitter)
+                engine.update_price("binance", "ETH/USDT", 3500 + i * 0.05, t + jitter)
+        
+        history = engine.spread_history[("binance", "BTC/USDT", "ETH/USDT")]
+        assert len(history.spreads) == 149
+        assert len(set(history.timestamps)) == 149
+    
+    def test_engine_merges_discovered_pairs(self, engine):
+        """Discovered pairs are tracked alongside the seed pairs"""
+        feed_prices(engine.resampler)
+        
+        engine.discovery.submit(engine.resampler, now=0.0)
+        engine.discovery._future.result()
+        engine._run_discovery()
+        
+        assert engine.tracked_pairs[:3] == engine.seed_pairs
+        assert ("BTC/USDT", "ETH/USDT") in engine.tracked_pairs
+        assert len(engine.tracked_pairs) == len(set(engine.tracked_pairs))
+    
+    def test_cointegrated_pair_uses_hedged_spread(self, engine):
+        """A fresh cointegration result switches the spread to the EG residual"""
+        engine.seed_pairs = engine.tracked_pairs = [("ETH/USDT", "BTC/USDT")]
+        feed_prices(engine.resampler, n=3000)
+        
+        engine.cointegration.submit(engine.resampler, [("binance", "ETH/USDT", "BTC/USDT")], now=0.0)
+        engine.cointegration._future.result()
+        engine._run_cointegration()
+        
+        # Next sample rebuilds the history under the hedge ratio
+        engine.update_price("binance", "ETH/USDT", 3500.0, START + timedelta(seconds=301))
+        
+        key = ("binance", "ETH/USDT", "BTC/USDT")
+        model = engine.hedge_fits[key]
+        assert model is not None and model.cointegrated
+        
+        _, prices = engine._aligned_prices(*key)
+        expected = math.log(prices[-1, 0]) - model.hedge_ratio * math.log(prices[-1, 1]) - model.intercept
+        history = engine.spread_history[key]
+        assert history.spreads[-1] == pytest.approx(expected)
+        assert len(history.spreads) == history.max_size
+    
+    def test_kalman_spread_model_per_pair(self):
+        """Pairs configured for the Kalman model use the filter's z-score"""
+        engine = StatisticalArbitrageEngine(
+            enable_discovery=False,
+            enable_cointegration=False,
+            spread_models={("ETH/USDT", "BTC/USDT"): "kalman"},
+        )
+        engine.seed_pairs = engine.tracked_pairs = [("ETH/USDT", "BTC/USDT"), ("BTC/USDT", "DOGE/USDT")]
+        engine.exchanges.add("binance")
+        feed_prices(engine.resampler, n=1000)
+        
+        kalman_key = ("binance", "ETH/USDT", "BTC/USDT")
+        kalman = engine.kalman_filters[kalman_key]
+        analysis = engine.get_pair_analysis(*kalman_key)
+        
+        assert kalman.count == 999  # Warm-up on history, then one update per sample
+        assert analysis["spread_model"] == "kalman"
+        assert analysis["z_score"] == kalman.z_score
+        assert engine.get_pair_analysis("binance", "BTC/USDT", "DOGE/USDT")["spread_model"] == "ratio"
+        
+        engine.set_spread_model("ETH/USDT", "BTC/USDT", "ratio")
+        assert kalman_key not in engine.kalman_filters
+        
+        with pytest.raises(ValueError):
+            engine.set_spread_model("ETH/USDT", "BTC/USDT", "bogus")
+
+
+class TestLeadLagAnalyzer:
+    """Tests for FFT lead-lag estimation"""
+    
+    @staticmethod
+    def feed_lagged(analyzer, n: int = 2400, seed: int = 3):
+        """Binance leads; Kraken follows 6 ticks (300ms) behind, Coinbase 3 (150ms)"""
+        rng = random.Random(seed)
+        path = [0.0]
+        for _ in range(n):
+            path.append(path[-1] + rng.gauss(0, 0.0005))
+        
+        for i in range(10, n):
+            t = START.timestamp() + 0.05 * i + 0.01
+            analyzer.update("binance", "BTC/USDT", 65000 * math.exp(path[i]), t)
+            analyzer.update("kraken", "BTC/USDT", 65000 * math.exp(path[i - 6]), t)
+            analyzer.update("coinbase", "BTC/USDT", 65000 * math.exp(path[i - 3]), t)
+        return analyzer
+    
+    def test_recovers_leader_and_lags(self):
+        analyzer = self.feed_lagged(LeadLagAnalyzer(interval_ms=50, background=False))
+        estimate = analyzer.estimate("BTC/USDT")
+        
+        assert estimate.leader == "binance"
+        assert [ex for ex, _ in estimate.ranking] == ["binance", "coinbase", "kraken"]
+        assert estimate.lag_between("binance", "kraken") == pytest.approx(300, abs=10)
+        assert estimate.lag_between("kraken", "coinbase") == pytest.approx(-150, abs=10)
+    
+    def test_fft_matches_direct_correlation(self):
+        analyzer = self.feed_lagged(LeadLagAnalyzer(interval_ms=50, max_lag_ms=500, background=False))
+        keys, _, values = analyzer.resampler.snapshot()
+        returns = np.diff(np.log(values), axis=0)
+        z = (returns - returns.mean(axis=0)) / returns.std(axis=0)
+        a, b = keys.index(("binance", "BTC/USDT")), keys.index(("kraken", "BTC/USDT"))
+        
+        n = len(z)
+        direct = [
+            float(np.dot(z[max(0, -k):n - max(0, k), a], z[max(0, k):n - max(0, -k), b])) / n
+            for k in range(-10, 11)
+        ]
+        
+        lag_ms, correlation = analyzer.compute(analyzer.resampler.snapshot(), 50)["BTC/USDT"].lags[("binance", "kraken")]
+        assert correlation == pytest.approx(max(direct))
+        assert round(lag_ms / 50) == int(np.argmax(direct)) - 10
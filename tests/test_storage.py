@@ -0,0 +1,736 @@
+"""
+Tests for tick storage.
+"""
+
+import asyncio
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from engine_storage import CandleSeries, ReplayEngine, TickBuffer, TickCompactor, TickStorage, fair_share, from_ns, to_ns
+from engine_compression import TickBlock
+from engine_export import TickExporter, import_export, iter_export
+from engine_replay import ReplayConfig, ReplaySession
+from engine_segments import SegmentTickStore
+from engine_timescale import CopyEncoder, InMemoryFallback, TimescaleDBStorage
+
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def fill(storage: TickStorage, n: int, exchange: str = "binance", pair: str = "BTC/USDT"):
+    for i in range(n):
+        storage.store(exchange, pair, 100.0 + i, 100.5 + i, START + timedelta(milliseconds=10 * i, microseconds=7), i, 2 * i)
+    return storage
+
+
+class TestTickBuffer:
+    """Tests for the columnar tick ring"""
+    
+    def test_timestamps_round_trip_exactly(self):
+        stamp = datetime(2024, 6, 30, 23, 59, 59, 999999)
+        assert from_ns(to_ns(stamp)) == stamp
+    
+    def test_grows_then_wraps(self):
+        buffer = TickBuffer("binance", "BTC/USDT", capacity=10, initial_capacity=4)
+        for i in range(25):
+            buffer.append(i, float(i), float(i) + 0.5)
+        
+        assert len(buffer) == 10
+        assert len(buffer.time_ns) == 10
+        assert buffer.column("bid").tolist() == [float(i) for i in range(15, 25)]
+        assert buffer.tick(0).bid == 15.0
+        assert buffer.latest().ask == 24.5
+        assert [t.bid for t in buffer] == [float(i) for i in range(15, 25)]
+        with pytest.raises(IndexError):
+            buffer.tick(10)
+    
+    def test_range_matches_scan_across_wrap(self):
+        buffer = TickBuffer("binance", "BTC/USDT", capacity=16, initial_capacity=4)
+        for i in range(40):
+            buffer.append(10 * (i // 3), float(i), float(i))  # Runs of equal timestamps
+        
+        times = buffer.column("time_ns")
+        for start, end in [(None, None), (80, 80), (85, 105), (0, 79), (130, 500), (95, 90)]:
+            expected = [
+                i for i, t in enumerate(times)
+                if (start is None or t >= start) and (end is None or t <= end)
+            ]
+            assert list(buffer.range(start, end)) == expected
+            assert list(buffer.range(start, end, limit=2)) == expected[:2]
+            assert list(buffer.range(start, end, limit=2, ascending=False)) == expected[::-1][:2]
+    
+    def test_extend_matches_append(self):
+        appended = TickBuffer("binance", "BTC/USDT", capacity=10, initial_capacity=2)
+        extended = TickBuffer("binance", "BTC/USDT", capacity=10, initial_capacity=2)
+        times = [0, 10, 5, 20, 30, 40, 50]
+        for batch in ([0, 10], [5, 20, 30, 40, 50], times * 2):
+            for t in batch:
+                appended.append(t, float(t), float(t))
+            values = np.array(batch, dtype=float)
+            extended.extend(batch, values, values, values, values)
+            
+            for name in TickBuffer.COLUMNS[:3]:
+                assert extended.column(name).tolist() == appended.column(name).tolist()
+            assert extended.clamped == appended.clamped
+    
+    def test_out_of_order_ticks_are_clamped(self):
+        buffer = TickBuffer("binance", "BTC/USDT", capacity=10)
+        for t in [100, 200, 150, 300]:
+            buffer.append(t, 1.0, 1.0)
+        
+        assert buffer.column("time_ns").tolist() == [100, 200, 200, 300]
+        assert buffer.clamped == 1
+
+
+class TestTickStorage:
+    """Tests for TickStorage"""
+    
+    def test_ticks_materialized_on_read(self):
+        storage = fill(TickStorage(max_ticks_per_key=1000), 500)
+        ticks = storage.get_ticks("binance", "BTC/USDT", start=START + timedelta(seconds=1), limit=5)
+        
+        assert [t.bid for t in ticks] == [200.0, 201.0, 202.0, 203.0, 204.0]
+        assert ticks[0].timestamp == START + timedelta(seconds=1, microseconds=7)
+        assert ticks[0].ask_size == 200.0
+        assert len(storage.get_ticks("binance", "BTC/USDT", end=START + timedelta(milliseconds=95), limit=1000)) == 10
+    
+    def test_newest_first(self):
+        storage = fill(TickStorage(max_ticks_per_key=1000), 500)
+        fill(storage, 500, exchange="kraken")
+        
+        ticks = storage.get_ticks("binance", "BTC/USDT", limit=3, ascending=False)
+        assert [t.bid for t in ticks] == [599.0, 598.0, 597.0]
+        
+        merged = storage.get_all_ticks("BTC/USDT", end=START + timedelta(seconds=1), limit=4, ascending=False)
+        assert [t.bid for t in merged] == [199.0, 199.0, 198.0, 198.0]
+        assert {t.exchange for t in merged} == {"binance", "kraken"}
+    
+    def test_iter_ticks_merges_lazily(self):
+        storage = TickStorage(max_ticks_per_key=100)
+        for i in range(300):
+            exchange = ("binance", "kraken", "okx")[i % 7 % 3]
+            storage.store(exchange, "BTC/USDT", float(i), float(i), START + timedelta(seconds=i))
+        storage.store("binance", "ETH/USDT", 0.0, 0.0, START)
+        
+        everything = sorted(
+            (t for buffer in storage.ticks.values() if buffer.pair == "BTC/USDT" for t in buffer),
+            key=lambda t: t.timestamp
+        )
+        assert [t.bid for t in storage.iter_ticks("BTC/USDT")] == [t.bid for t in everything]
+        assert [t.bid for t in storage.get_all_ticks("BTC/USDT", limit=5, ascending=False)] == [t.bid for t in everything[::-1][:5]]
+        assert {t.exchange for t in storage.iter_ticks("BTC/USDT", exchanges=["okx"])} == {"okx"}
+        
+        # Stores and evictions mid-iteration neither shift nor extend the stream
+        kraken_buffer = storage.ticks[("kraken", "BTC/USDT")]
+        stream = kraken_buffer.iter_range(chunk=1)
+        head = [next(stream).bid for _ in range(3)]
+        kraken_buffer.drop_oldest(10)
+        for i in range(300, 310):
+            storage.store("kraken", "BTC/USDT", float(i), float(i), START + timedelta(seconds=i))
+        rest = [t.bid for t in stream]
+        kraken = [t.bid for t in everything if t.exchange == "kraken"]
+        assert head + rest == kraken[:3] + kraken[10:]
+    
+    def test_replay_is_chronological(self):
+        storage = fill(TickStorage(), 50)
+        fill(storage, 50, exchange="kraken")
+        
+        ticks = list(ReplayEngine(storage).replay("BTC/USDT", speed=1000))
+        assert len(ticks) == 100
+        assert all(a.timestamp <= b.timestamp for a, b in zip(ticks, ticks[1:]))
+    
+    def test_statistics_report_column_bytes(self):
+        storage = fill(TickStorage(max_ticks_per_key=2048), 2048)
+        stats = storage.get_statistics()
+        
+        assert stats["memory_bytes"] == 2048 * 40
+        assert stats["bytes_per_tick"] == 40.0
+        assert stats["ticks_per_key"] == {"binance/BTC/USDT": 2048}
+
+
+class TestCandles:
+    """Tests for ingest-time OHLCV candles"""
+    
+    @staticmethod
+    def brute_force(storage: TickStorage, interval_seconds: int):
+        """Candles bucketed from raw ticks: (start, open, high, low, close, volume)"""
+        buckets = {}
+        for tick in storage.ticks[("binance", "BTC/USDT")]:
+            ns = to_ns(tick.timestamp)
+            buckets.setdefault(ns - ns % (interval_seconds * 10 ** 9), []).append(tick.mid)
+        return [
+            (from_ns(start), mids[0], max(mids), min(mids), mids[-1], len(mids))
+            for start, mids in sorted(buckets.items())
+        ]
+    
+    @staticmethod
+    def summary(candles):
+        return [(c.timestamp, c.open, c.high, c.low, c.close, c.volume) for c in candles]
+    
+    def random_ticks(self, storage: TickStorage, n: int = 3000):
+        rng = np.random.default_rng(7)
+        offsets = np.cumsum(rng.integers(1, 400, size=n))  # Milliseconds
+        mids = 100 + np.cumsum(rng.normal(0, 0.1, size=n))
+        for offset, mid in zip(offsets.tolist(), mids.tolist()):
+            storage.store("binance", "BTC/USDT", mid - 0.01, mid + 0.01, START + timedelta(milliseconds=offset))
+        return storage
+    
+    @pytest.mark.parametrize("interval", [1, 5, 7, 60, 90])
+    def test_matches_ticks(self, interval):
+        storage = self.random_ticks(TickStorage(max_ticks_per_key=5000, candle_capacity=5000))
+        candles = storage.get_candles("binance", "BTC/USDT", interval_seconds=interval)
+        
+        assert self.summary(candles) == self.brute_force(storage, interval)
+        assert self.summary(storage.aggregate_ohlcv("binance", "BTC/USDT", interval)) == self.summary(candles)
+    
+    def test_range_limit_and_ring(self):
+        storage = self.random_ticks(TickStorage(max_ticks_per_key=5000, candle_intervals=(5, 60), candle_capacity=20))
+        expected = self.brute_force(storage, 5)
+        
+        # Only 20 closed candles plus the forming one are kept
+        assert self.summary(storage.get_candles("binance", "BTC/USDT", 5)) == expected[-21:]
+        assert self.summary(storage.get_candles("binance", "BTC/USDT", 5, limit=3)) == expected[-3:]
+        
+        start, end = expected[-10][0] + timedelta(seconds=2), expected[-6][0]
+        window = storage.get_candles("binance", "BTC/USDT", 5, start=start, end=end)
+        assert self.summary(window) == expected[-10:-5]
+        
+        # No maintained resolution divides 7s: rolled up from ticks
+        assert self.summary(storage.get_candles("binance", "BTC/USDT", 7)) == self.brute_force(storage, 7)
+    
+    def test_rollup_reads_only_the_candles_it_returns(self, monkeypatch):
+        storage = self.random_ticks(TickStorage(max_ticks_per_key=5000, candle_intervals=(5, 60), candle_capacity=5000))
+        expected = self.brute_force(storage, 90)
+        columns, read = CandleSeries.columns, []
+        
+        def counting_columns(series, *args):
+            result = columns(series, *args)
+            read.append(len(result["start_ns"]))
+            return result
+        
+        monkeypatch.setattr(CandleSeries, "columns", counting_columns)
+        assert self.summary(storage.get_candles("binance", "BTC/USDT", 90, limit=4)) == expected[-4:]
+        assert read == [4 * 18 + 1]
+    
+    @pytest.mark.parametrize("interval", [0, -5])
+    def test_rejects_non_positive_intervals(self, interval):
+        storage = self.random_ticks(TickStorage(max_ticks_per_key=5000), n=10)
+        with pytest.raises(ValueError):
+            storage.get_candles("binance", "BTC/USDT", interval)
+    
+    def test_batch_import_builds_same_candles(self):
+        storage = self.random_ticks(TickStorage(max_ticks_per_key=5000))
+        restored = TickStorage(max_ticks_per_key=5000)
+        buffer = storage.ticks[("binance", "BTC/USDT")]
+        restored.store_batch("binance", "BTC/USDT", buffer.snapshot())
+        
+        for interval in restored.candle_intervals:
+            assert self.summary(restored.get_candles("binance", "BTC/USDT", interval)) == self.summary(
+                storage.get_candles("binance", "BTC/USDT", interval)
+            )
+
+
+class TestTickCompactor:
+    """Tests for retention and the global memory budget"""
+    
+    def test_fair_share(self):
+        assert fair_share([10, 500, 2000], 1000) == 495
+        assert fair_share([10, 20], 1000) == 20
+        assert fair_share([], 1000) == 0
+    
+    def test_ring_stays_consistent_through_evictions(self):
+        buffer = TickBuffer("binance", "BTC/USDT", capacity=64, initial_capacity=4)
+        model = []
+        rng = np.random.default_rng(3)
+        for step in range(2000):
+            action = rng.integers(0, 10)
+            if action < 7:
+                buffer.append(step, float(step), float(step))
+                model = (model + [step])[-64:]
+            elif action < 9:
+                count = int(rng.integers(0, 10))
+                assert buffer.drop_oldest(count) == min(count, len(model))
+                model = model[count:]
+            else:
+                buffer.shrink(min_allocated=4)
+            assert buffer.column("time_ns").tolist() == model
+        assert list(buffer.range(model[0] + 1, model[-1] - 1)) == list(range(1, len(model) - 1))
+    
+    def test_age_then_fair_budget(self):
+        now = START + timedelta(hours=2)
+        storage = TickStorage(max_ticks_per_key=10000, retention_hours=1)
+        for i in range(3000):
+            storage.store("binance", "BTC/USDT", 1.0, 1.1, START + timedelta(seconds=2.4 * i))  # Spans 2h
+        for exchange in ("kraken", "okx"):
+            for i in range(1000):
+                storage.store(exchange, "BTC/USDT", 1.0, 1.1, now - timedelta(seconds=i))
+        storage.store("bybit", "BTC/USDT", 1.0, 1.1, now)  # Slow key
+        
+        compactor = TickCompactor(storage, memory_budget_bytes=2000 * TickCompactor.TICK_BYTES)
+        by_age, by_budget = compactor.compact(now=now)
+        
+        assert by_age == 1500
+        sizes = {ex: len(buffer) for (ex, _), buffer in storage.ticks.items()}
+        assert sizes["bybit"] == 1
+        assert sizes["binance"] == sizes["kraken"] == sizes["okx"] == 666
+        assert by_budget == 1500 + 2 * 1000 - 3 * 666
+        
+        # The newest ticks survive and the candles still cover evicted history
+        assert storage.ticks[("kraken", "BTC/USDT")].latest().timestamp == now
+        assert storage.get_candles("binance", "BTC/USDT", 3600)[0].timestamp == START
+        assert storage.get_state()["compaction"]["evicted_budget"] == by_budget
+    
+    def test_compacts_fallback(self):
+        storage = InMemoryFallback(retention_hours=1)
+        for i in range(5000):
+            storage.store("binance", "ETH/USDT", 1.0, 1.1, START + timedelta(seconds=i))
+        
+        TickCompactor(storage, name="fallback").compact(now=START + timedelta(seconds=5000))
+        
+        rows = storage.query_ticks(ascending=True)
+        assert len(rows) == 3600
+        assert rows[0]["timestamp"] == (START + timedelta(seconds=1400)).isoformat()
+        assert storage.ticks[("binance", "ETH/USDT")].nbytes < 8192 * 40
+
+
+class TestInMemoryFallback:
+    """Tests for the TimescaleDB in-memory fallback"""
+    
+    def test_query_orders_and_limits(self):
+        storage = InMemoryFallback(max_ticks_per_key=100)
+        for i in range(300):
+            exchange = "binance" if i % 2 else "kraken"
+            storage.store(exchange, "ETH/USDT", 10.0 + i, 10.1 + i, START + timedelta(seconds=i), bid_size=1.0 if i % 3 else None)
+        
+        newest = storage.query_ticks(pair="ETH/USDT", limit=3)
+        assert [row["bid"] for row in newest] == [309.0, 308.0, 307.0]
+        assert newest[1]["bid_size"] == 1.0
+        assert newest[2]["bid_size"] is None
+        
+        window = storage.query_ticks(
+            exchange="binance",
+            start=START + timedelta(seconds=250),
+            end=START + timedelta(seconds=255),
+            ascending=True
+        )
+        assert [row["bid"] for row in window] == [261.0, 263.0, 265.0]
+        assert storage.get_database_stats()["total_ticks"] == 200
+    
+    def test_replay_loads_oldest_first(self):
+        storage = InMemoryFallback()
+        for i in range(10):
+            storage.store("binance" if i % 2 else "kraken", "ETH/USDT", 10.0 + i, 10.1 + i, START + timedelta(seconds=i))
+        
+        session = ReplaySession(storage, ReplayConfig())
+        ticks = list(session._load_ticks(START, START + timedelta(minutes=1)))
+        assert [tick.bid for tick in ticks] == [10.0 + i for i in range(10)]
+
+
+class TestSegmentTickStore:
+    """Tests for the persistent segment store"""
+    
+    def store_ticks(self, store: SegmentTickStore, n: int, exchange: str = "binance"):
+        for i in range(n):
+            store.store(exchange, "BTC/USDT", 100.0 + i, 100.5 + i, START + timedelta(seconds=i), bid_size=float(i))
+    
+    def test_rotates_and_queries_across_segments(self, tmp_path):
+        store = SegmentTickStore(str(tmp_path), segment_seconds=60, index_every=8, write_batch=16)
+        self.store_ticks(store, 500)
+        
+        stats = store.get_database_stats()
+        assert stats["total_ticks"] == 500
+        assert stats["segments"] > 5
+        
+        window = store.query_ticks(start=START + timedelta(seconds=55), end=START + timedelta(seconds=130), ascending=True)
+        assert [row["bid"] for row in window] == [100.0 + i for i in range(55, 131)]
+        assert window[0]["bid_size"] == 55.0
+        assert window[0]["ask_size"] is None
+        
+        newest = store.query_ticks(pair="BTC/USDT", end=START + timedelta(seconds=200), limit=3)
+        assert [row["bid"] for row in newest] == [300.0, 299.0, 298.0]
+    
+    def test_reopens_after_restart(self, tmp_path):
+        store = SegmentTickStore(str(tmp_path), segment_seconds=60, index_every=8, write_batch=16)
+        self.store_ticks(store, 150)
+        self.store_ticks(store, 10, exchange="kraken")
+        store.close()
+        
+        # A crash mid-write leaves a partial record behind
+        active = store.segments[("binance", "BTC/USDT")][-1].path
+        with open(active, "ab") as f:
+            f.write(b"\x00" * 13)
+        
+        reopened = SegmentTickStore(str(tmp_path), segment_seconds=60, index_every=8, write_batch=16)
+        assert reopened.get_database_stats()["total_ticks"] == 160
+        
+        rows = reopened.query_ticks(exchange="binance", limit=200, ascending=True)
+        assert [row["bid"] for row in rows] == [100.0 + i for i in range(150)]
+        assert rows[-1]["timestamp"] == (START + timedelta(seconds=149)).isoformat()
+        
+        reopened.store("binance", "BTC/USDT", 1.0, 1.1, START + timedelta(seconds=150))
+        assert reopened.query_ticks(exchange="binance", limit=1)[0]["bid"] == 1.0
+    
+    def test_expires_old_segments(self, tmp_path):
+        store = SegmentTickStore(str(tmp_path), segment_seconds=600, write_batch=1, retention_hours=1)
+        for minutes in range(0, 180, 5):
+            store.store("binance", "BTC/USDT", 1.0, 1.1, START + timedelta(minutes=minutes))
+        
+        oldest = store.query_ticks(limit=1, ascending=True)[0]
+        assert oldest["timestamp"] >= (START + timedelta(minutes=100)).isoformat()
+        assert store.get_database_stats()["segments_expired"] > 0
+
+
+class TestTickExport:
+    """Tests for streaming export and import"""
+    
+    @pytest.mark.parametrize("fmt", ["npz", "csv"])
+    def test_round_trip(self, tmp_path, fmt):
+        storage = fill(TickStorage(max_ticks_per_key=300), 450)
+        fill(storage, 20, exchange="kraken")
+        
+        exporter = TickExporter(storage, fmt=fmt, chunk_rows=64).start(str(tmp_path / "export"))
+        exporter.join(timeout=10)
+        state = storage.get_state()["export"]
+        assert state["finished"] and state["error"] is None
+        assert state["rows_written"] == 320 and state["keys_done"] == 2
+        
+        chunks = list(iter_export(str(tmp_path / "export"), chunk_rows=64))
+        assert max(len(chunk["time_ns"]) for _, _, chunk in chunks) == 64
+        
+        restored = import_export(str(tmp_path / "export"))
+        for key, buffer in storage.ticks.items():
+            for name in TickBuffer.COLUMNS:
+                assert restored.ticks[key].column(name).tolist() == buffer.column(name).tolist()
+        assert restored.get_ticks("binance", "BTC/USDT", limit=1)[0].timestamp == START + timedelta(milliseconds=1500, microseconds=7)
+    
+    def test_export_while_the_loop_stores(self, tmp_path):
+        storage = TickStorage(max_ticks_per_key=300, compress_block_ticks=100)
+        loop = asyncio.new_event_loop()
+        done = threading.Event()
+        capture, copied_on = storage.capture, []
+        
+        def recording_capture(*key):
+            copied_on.append(threading.current_thread())
+            return capture(*key)
+        
+        storage.capture = recording_capture
+        
+        async def feed():
+            i = 0
+            while not done.is_set():
+                for _ in range(50):  # Grows, wraps and seals the buffer
+                    storage.store("binance", "BTC/USDT", float(i), i + 0.5, START + timedelta(milliseconds=i))
+                    i += 1
+                await asyncio.sleep(0)
+        
+        thread = threading.Thread(target=loop.run_until_complete, args=(feed(),))
+        thread.start()
+        try:
+            time.sleep(0.05)
+            for n in range(5):
+                TickExporter(storage, fmt="npz", loop=loop).export(str(tmp_path / str(n)))
+        finally:
+            done.set()
+            thread.join(timeout=10)
+            loop.close()
+        
+        assert len(copied_on) == 5 and all(copied is thread for copied in copied_on)
+        for n in range(5):
+            for _, _, chunk in iter_export(str(tmp_path / str(n))):
+                assert np.all(chunk["ask"] - chunk["bid"] == 0.5)
+                assert np.array_equal(chunk["time_ns"], to_ns(START) + chunk["bid"].astype(np.int64) * 1_000_000)
+
+
+class TestTickCompression:
+    """Tests for compressed cold tick blocks"""
+    
+    @staticmethod
+    def columns(n: int, seed: int = 0) -> dict:
+        rng = np.random.default_rng(seed)
+        time_ns = to_ns(START) + np.cumsum(rng.integers(0, 40, n)) * 1_000_000 + 7_000
+        mid = np.round(42000 + np.cumsum(rng.choice([-0.01, 0.0, 0.01], n)), 2)
+        return {
+            "time_ns": time_ns,
+            "bid": np.round(mid - 0.01, 2),
+            "ask": np.round(mid + 0.01, 2),
+            "bid_size": np.round(rng.exponential(0.5, n), 6),
+            "ask_size": rng.random(n),  # Not decimal: XOR encoded
+        }
+    
+    def test_block_round_trip(self):
+        columns = self.columns(3000)
+        columns["ask_size"][[5, 9]] = [np.nan, np.inf]
+        block = TickBlock.encode(columns)
+        
+        assert block.columns["bid"].kind == "decimal"
+        assert block.columns["ask_size"].kind == "xor"
+        decoded = block.decode()
+        for name, values in columns.items():
+            assert np.array_equal(decoded[name], values, equal_nan=True)
+        
+        start, end = int(columns["time_ns"][100]), int(columns["time_ns"][200])
+        window = block.decode(start, end, names=["time_ns", "bid"])
+        assert window["bid"].tolist() == [b for t, b in zip(columns["time_ns"], columns["bid"]) if start <= t <= end]
+        assert block.nbytes * 2 < 3000 * TickCompactor.TICK_BYTES
+    
+    def test_queries_span_cold_and_hot(self):
+        plain = fill(TickStorage(max_ticks_per_key=1000), 700)
+        storage = fill(TickStorage(max_ticks_per_key=300, compress_block_ticks=128), 700)
+        
+        assert len(storage.cold[("binance", "BTC/USDT")]) == 4
+        assert len(storage.ticks[("binance", "BTC/USDT")]) == 700 - 4 * 128
+        stats = storage.get_statistics()
+        assert stats["cold_ticks"] == 512 and stats["ticks_per_key"]["binance/BTC/USDT"] == 700
+        
+        start, end = START + timedelta(seconds=1), START + timedelta(seconds=6)
+        for kwargs in [{}, {"start": start, "end": end}, {"start": start, "limit": 50}, {"end": end, "ascending": False}]:
+            assert storage.get_ticks("binance", "BTC/USDT", **kwargs) == plain.get_ticks("binance", "BTC/USDT", **kwargs)
+        assert list(storage.iter_ticks(ascending=False)) == list(plain.iter_ticks(ascending=False))
+        for name in TickBuffer.COLUMNS:
+            assert storage.snapshot("binance", "BTC/USDT")[name].tolist() == plain.ticks[("binance", "BTC/USDT")].column(name).tolist()
+    
+    def test_batch_seals_and_cold_blocks_expire(self):
+        storage = TickStorage(max_ticks_per_key=1000, compress_block_ticks=500)
+        columns = self.columns(4000, seed=1)
+        storage.store_batch("binance", "BTC/USDT", columns)
+        
+        assert [block.count for block in storage.cold[("binance", "BTC/USDT")]] == [500] * 6
+        assert storage.get_ticks("binance", "BTC/USDT", limit=None)[2345].bid == columns["bid"][2345]
+        
+        compactor = TickCompactor(storage)
+        by_age, _ = compactor.compact(now=from_ns(int(columns["time_ns"][1200])) + storage.retention)
+        assert by_age == 1000  # The two blocks ending before the cutoff
+        assert storage.get_statistics()["cold_ticks"] == 2000
+    
+    def test_budget_evicts_cold_before_hot(self):
+        storage = fill(TickStorage(max_ticks_per_key=100, compress_block_ticks=50), 400)
+        fill(storage, 10, exchange="kraken")
+        budget = 2400
+        
+        _, by_budget = TickCompactor(storage, memory_budget_bytes=budget).compact(now=START)
+        
+        bids = [tick.bid for tick in storage.get_ticks("binance", "BTC/USDT", limit=None, ascending=True)]
+        assert bids == [100.0 + i for i in range(400 - len(bids), 400)]  # A contiguous newest suffix
+        assert len(bids) == (budget - 10 * TickCompactor.TICK_BYTES) // TickCompactor.TICK_BYTES
+        assert by_budget == 400 - len(bids)
+        assert len(storage.ticks[("kraken", "BTC/USDT")]) == 10
+        held = sum(len(buffer) for buffer in storage.ticks.values()) * TickCompactor.TICK_BYTES + storage.cold_bytes
+        assert held <= budget
+
+
+class FakePool:
+    """Connection pool, connection and cursor in one; records COPY payloads"""
+    
+    def __init__(self):
+        self.checkouts = 0
+        self.copies = []
+        self.failing = False  # Database down: COPY raises
+        self.refusing = False  # Pool exhausted or database unreachable: getconn raises
+    
+    def getconn(self):
+        if self.refusing:
+            raise ConnectionError("connection refused")
+        self.checkouts += 1
+        return self
+    
+    def putconn(self, conn, close=False):
+        pass
+    
+    def cursor(self):
+        return self
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def copy_expert(self, sql, file):
+        if self.failing:
+            raise ConnectionError("database is down")
+        self.copies.append((sql, file.read()))
+    
+    def commit(self):
+        pass
+    
+    def rollback(self):
+        pass
+    
+    def closeall(self):
+        pass
+
+
+class RecordingStorage(TimescaleDBStorage):
+    """TimescaleDBStorage writing batches to a list instead of a database"""
+    
+    def __init__(self, write_delay: float = 0.0, **kwargs):
+        super().__init__(host="127.0.0.1", port=1, **kwargs)  # Refused: stays disconnected
+        self.pool, self.connected = FakePool(), True
+        self.batches = []
+        self.write_delay = write_delay
+        self.gate = threading.Event()
+        self.gate.set()
+        self.start_writer()
+    
+    def _write_rows(self, conn, rows):
+        self.gate.wait()
+        time.sleep(self.write_delay)
+        self.batches.append(rows)
+        super()._write_rows(conn, rows)
+
+
+class TestTimescaleWriter:
+    """Tests for the background TimescaleDB writer"""
+    
+    def test_store_never_waits_for_the_database(self):
+        storage = RecordingStorage(write_delay=0.2, batch_size=500, adaptive_batching=False)
+        start = time.perf_counter()
+        for i in range(3000):
+            storage.store("binance", "BTC/USDT", 100.0 + i, 100.5 + i, START + timedelta(milliseconds=i))
+        assert time.perf_counter() - start < 0.15  # Less than one batch write
+        
+        assert storage.flush(timeout=10)
+        rows = [row for batch in storage.batches for row in batch]
+        assert [row[3] for row in rows] == [100.0 + i for i in range(3000)]
+        assert max(len(batch) for batch in storage.batches) == 500
+        state = storage.get_writer_state()
+        assert state["queue_depth"] == 0 and state["flush_p50_ms"] >= 200
+        storage.close()
+    
+    def test_flushes_on_interval(self):
+        storage = RecordingStorage(flush_interval_ms=20)
+        storage.store("binance", "BTC/USDT", 1.0, 2.0)
+        deadline = time.time() + 2
+        while not storage.batches and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(storage.batches) == 1 and storage.ticks_written == 1
+        storage.close()
+    
+    def test_drops_oldest_when_queue_is_full(self):
+        storage = RecordingStorage(batch_size=10, max_queue_rows=100)
+        storage.gate.clear()  # Database stalls
+        storage.store("binance", "BTC/USDT", -1.0, -1.0)
+        deadline = time.time() + 2
+        while storage.write_queue and time.time() < deadline:
+            time.sleep(0.01)  # Writer takes the first row, then blocks on it
+        
+        for i in range(150):
+            storage.store("binance", "BTC/USDT", float(i), float(i))
+        assert storage.ticks_dropped == 50
+        
+        storage.gate.set()
+        storage.close()
+        rows = [row for batch in storage.batches for row in batch]
+        assert [row[3] for row in rows] == [-1.0] + [float(i) for i in range(50, 150)]
+    
+    def test_copies_on_one_connection(self):
+        storage = RecordingStorage(flush_interval_ms=20)
+        for i in range(3):
+            storage.store("binance", "BTC/USDT", 100.0 + i, 101.0 + i, START + timedelta(seconds=i), bid_size=0.5)
+            storage.flush()
+        pool = storage.pool
+        storage.close()
+        
+        assert pool.checkouts == 1 and len(pool.copies) == 3
+        assert pool.copies[0][0] == "COPY ticks (time, exchange, pair, bid, ask, bid_size, ask_size) FROM STDIN WITH (FORMAT text)"
+        stamp = (START + timedelta(seconds=1)).astimezone(timezone.utc).isoformat(" ")
+        assert stamp.endswith("+00:00")
+        assert pool.copies[1][1] == f"{stamp}\tbinance\tBTC/USDT\t101.0\t102.0\t0.5\t\\N\n".encode()
+    
+    def test_binary_copy_encoding(self):
+        rows = [(START, "binance", "BTC/USDT", 100.5, 101.0, None, 2.0)]
+        data = CopyEncoder("binary").encode(rows).getvalue()
+        
+        assert data.startswith(b"PGCOPY\n\xff\r\n\x00") and data.endswith(b"\xff\xff")
+        fields, _, micros = struct.unpack_from("!hiq", data, 19)
+        assert fields == 7
+        assert micros == round((START.timestamp() - datetime(2000, 1, 1, tzinfo=timezone.utc).timestamp()) * 1e6)
+        assert data.count(b"\xff\xff\xff\xff") == 1  # The NULL bid_size
+        assert struct.pack("!id", 8, 101.0) in data
+    
+    def test_text_and_binary_copy_agree_on_time(self):
+        stamps = [START, START.replace(tzinfo=timezone(timedelta(hours=-5)))]  # Naive (local) and aware
+        rows = [(stamp, "binance", "BTC/USDT", 1.0, 2.0, None, None) for stamp in stamps]
+        lines = CopyEncoder("text").encode(rows).getvalue().decode().splitlines()
+        data = CopyEncoder("binary").encode(rows).getvalue()
+        row_bytes = (len(data) - 19 - 2) // len(rows)
+        
+        for i, (line, stamp) in enumerate(zip(lines, stamps)):
+            micros = struct.unpack_from("!hiq", data, 19 + i * row_bytes)[2]
+            text_time = datetime.fromisoformat(line.split("\t")[0])
+            assert text_time.utcoffset() == timedelta(0)
+            assert text_time == datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=micros)
+            assert text_time.timestamp() == stamp.timestamp()
+    
+    def test_batch_size_adapts_to_latency(self):
+        storage = RecordingStorage(batch_size=1000, min_batch_size=250, max_batch_size=4000, target_flush_ms=100)
+        for _ in range(3):
+            storage._adapt_batch_size(storage.batch_size, 10.0)
+        assert storage.batch_size == 4000
+        
+        storage._adapt_batch_size(100, 10.0)  # Partial batch: no signal
+        storage._adapt_batch_size(4000, 80.0)  # Under target but not by half
+        assert storage.batch_size == 4000
+        
+        for _ in range(5):
+            storage._adapt_batch_size(storage.batch_size, 500.0)
+        assert storage.batch_size == 250
+        storage.close()
+    
+    def test_retries_failed_batches(self):
+        storage = RecordingStorage(batch_size=100, flush_interval_ms=20)
+        storage.pool.refusing = True
+        for i in range(500):
+            storage.store("binance", "BTC/USDT", float(i), float(i))
+        
+        assert not storage.flush(timeout=0.3)
+        assert storage._writer.is_alive() and storage.ticks_written == 0
+        assert len(storage.write_queue) == 500 and storage.flush_failures > 0
+        
+        storage.pool.refusing = False
+        storage.pool.failing = True  # Connects, then the COPY fails
+        assert not storage.flush(timeout=0.3)
+        storage.pool.failing = False
+        assert storage.flush(timeout=10)
+        lines = b"".join(payload for _, payload in storage.pool.copies).decode().splitlines()
+        assert [float(line.split("\t")[3]) for line in lines] == [float(i) for i in range(500)]
+        assert storage.ticks_written == 500 and storage.ticks_dropped == 0
+        storage.close()
+    
+    def test_requeue_keeps_the_newest_rows(self):
+        storage = RecordingStorage(batch_size=10, max_queue_rows=25)
+        storage.close()  # Drive batches by hand
+        storage.connected = storage.pool.failing = True
+        for i in range(20):
+            storage.store("binance", "BTC/USDT", float(i), float(i))
+        
+        rows = storage._drain()  # Rows 0-9 are being written...
+        for i in range(20, 30):
+            storage.store("binance", "BTC/USDT", float(i), float(i))
+        assert not storage._write_batch(rows)  # ...and fail, with room left for only 5 of them
+        assert storage.ticks_dropped == 5
+        assert [row[3] for row in storage.write_queue] == [float(i) for i in range(5, 30)]
+    
+    def test_writer_restarts_after_dying(self):
+        storage = RecordingStorage(flush_interval_ms=20)
+        storage._stop.set()
+        storage._wake.set()
+        storage._writer.join(timeout=2)
+        storage._stop.clear()  # Died without close()
+        
+        storage.store("binance", "BTC/USDT", 1.0, 2.0)
+        assert storage.flush(timeout=2) and storage.ticks_written == 1
+        assert storage._writer.is_alive()
+        storage.close()
+    
+    def test_failed_flushes_do_not_resize_batches(self):
+        storage = RecordingStorage(batch_size=1000, target_flush_ms=100)
+        storage.pool.failing = True
+        storage._write_batch([(START, "binance", "BTC/USDT", 1.0, 2.0, None, None)] * 1000)
+        assert storage.flush_failures == 1 and storage.batch_size == 1000
+        storage.close()